@@ -8,30 +8,65 @@ from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
-from flask import Flask, g, request, jsonify, send_from_directory
+from flask import Flask, g, request, jsonify
 
 from .extensions import db, jwt, cors, logger
 from .payment_service import PaymentService
 from .models import User
+from .database import init_database, is_timeout_error
+from .sql_instrumentation import init_sql_instrumentation
+from .metrics import init_metrics
+from .compression import init_compression
+from .json_provider import init_json
+from .replica import init_replica
+from .file_serving import init_file_serving, serve_upload
+from .storage import init_storage
+from .password_hasher import PasswordHasherBusy
+from .startup import BootTimer, start_deployment_tasks
 
 from sqlalchemy.engine import URL
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+
+def register_blueprints(app: Flask) -> None:
+    """
+    Importa e registra as rotas. Fica fora do topo do módulo: workers e scripts
+    (``create_app(role="worker"/"script")``) não atendem HTTP e não pagam o
+    import das rotas e do que elas puxam.
+    """
+    from .auth.routes import auth_bp
+    from .fundraisers.routes import fundraisers_bp
+    from .contributions.routes import contributions_bp
+    from .public.routes import public_bp
+    from .profile.routes import profile_bp
+    from .explore.routes import explore_bp
+    from .withdrawals.routes import withdrawals_bp
+    from .reports.routes import reports_bp
+    from .invoices.routes import invoices_bp
+    from .uploads.routes import uploads_bp
+    from .legal.routes import legal_bp
 
-# Blueprints
-from .auth.routes import auth_bp
-from .fundraisers.routes import fundraisers_bp
-from .contributions.routes import contributions_bp
-from .public.routes import public_bp
-from .profile.routes import profile_bp
-from .explore.routes import explore_bp
-from .withdrawals.routes import withdrawals_bp
-from .reports.routes import reports_bp
-from .invoices.routes import invoices_bp
-from .uploads.routes import uploads_bp 
-from .legal.routes import legal_bp
-
-
-def create_app() -> Flask:
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(fundraisers_bp, url_prefix="/api/fundraisers")
+    app.register_blueprint(contributions_bp, url_prefix="/api")
+    app.register_blueprint(public_bp, url_prefix="/api")
+    app.register_blueprint(profile_bp, url_prefix="/api")
+    app.register_blueprint(explore_bp, url_prefix="/api")
+    app.register_blueprint(withdrawals_bp, url_prefix="/api/withdrawals")
+    app.register_blueprint(reports_bp, url_prefix="/api")
+    app.register_blueprint(invoices_bp, url_prefix="/api")
+    app.register_blueprint(uploads_bp)
+    app.register_blueprint(legal_bp, url_prefix="/api")
+
+
+def create_app(role: str | None = None) -> Flask:
+    """
+    ``role``: "web" (padrão, ou APP_ROLE) dispara as tarefas de deploy em segundo
+    plano (ver app/startup.py); workers e scripts passam "worker"/"script".
+    """
+    timer = BootTimer()
     load_dotenv()
+    role = role or os.getenv("APP_ROLE", "web")
     app = Flask(__name__)
 
     def _getenv_file(key: str, default: str | None = None) -> str | None:
@@ -65,22 +100,25 @@ def create_app() -> Flask:
     # Uploads
     app.config.setdefault("UPLOAD_DIR", os.environ.get("UPLOAD_DIR", "/app/uploads"))
     app.config.setdefault("UPLOAD_PUBLIC_BASE", os.environ.get("UPLOAD_PUBLIC_BASE", "/files"))
-
-    # Extensões
+    app.config.setdefault("INVOICE_PDF_DIR", os.environ.get("INVOICE_PDF_DIR", "/app/private"))
+    app.config["APP_ROLE"] = role
+    timer.mark("config")
+
+    # Extensões (pool/timeouts, métricas e réplica antes do banco: entram nas opções das engines)
+    init_json(app)
+    init_database(app)
+    init_metrics(app)
+    init_compression(app)
+    init_replica(app)
     db.init_app(app)
+    init_sql_instrumentation(app)
     jwt.init_app(app)
     cors.init_app(app, resources={r"/api/*": {"origins": app.config["CORS_ORIGINS"]}}, supports_credentials=True)
 
-    # Service
-    app.payment_service = PaymentService()
+    timer.mark("extensions")
 
-    try:
-        if os.getenv("PIX_REGISTER_WEBHOOK_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
-            resp = app.payment_service.register_psp_webhook()
-            logger.info("Webhook PSP registrado via PIX-Module: %s", resp.get("status", "ok"))
-    
-    except Exception as exc:
-        logger.warning("Falha ao registrar webhook no PSP via PIX-Module: %s", exc)
+    # Service (o registro do webhook no PSP roda em segundo plano, ver o fim do create_app)
+    app.payment_service = PaymentService()
 
     # Tenant
     @app.before_request
@@ -91,18 +129,33 @@ def create_app() -> Flask:
     def bad_request(error):
         return jsonify({"error": "bad_request", "message": str(error)}), 400
 
-    # Blueprints
-    app.register_blueprint(auth_bp, url_prefix="/api/auth")
-    app.register_blueprint(fundraisers_bp, url_prefix="/api/fundraisers")
-    app.register_blueprint(contributions_bp, url_prefix="/api")
-    app.register_blueprint(public_bp, url_prefix="/api")
-    app.register_blueprint(profile_bp, url_prefix="/api")
-    app.register_blueprint(explore_bp, url_prefix="/api")
-    app.register_blueprint(withdrawals_bp, url_prefix="/api/withdrawals")
-    app.register_blueprint(reports_bp, url_prefix="/api")
-    app.register_blueprint(invoices_bp, url_prefix="/api")
-    app.register_blueprint(uploads_bp)  
-    app.register_blueprint(legal_bp, url_prefix="/api")
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(error):
+        resp = jsonify({"error": "service_busy", "message": "Muitas tentativas simultâneas, tente novamente em instantes"})
+        resp.headers["Retry-After"] = str(error.retry_after)
+        return resp, 503
+
+    # Pool esgotado (DB_POOL_TIMEOUT_SECONDS) ou banco fora/lento: 503 rápido em vez de fila
+    @app.errorhandler(PoolTimeoutError)
+    def database_pool_exhausted(error):
+        logger.warning("Pool do banco esgotado: %s %s", request.method, request.path)
+        resp = jsonify({"error": "service_busy", "message": "Servidor ocupado, tente novamente em instantes"})
+        resp.headers["Retry-After"] = "1"
+        return resp, 503
+
+    @app.errorhandler(OperationalError)
+    def database_unavailable(error):
+        db.session.rollback()
+        code = "database_timeout" if is_timeout_error(error) else "database_unavailable"
+        logger.warning("Erro do banco (%s) em %s %s: %s", code, request.method, request.path, error.orig)
+        resp = jsonify({"error": code, "message": "Banco de dados indisponível no momento, tente novamente"})
+        resp.headers["Retry-After"] = "1"
+        return resp, 503
+
+    # Blueprints (só quem atende HTTP)
+    if role == "web":
+        register_blueprints(app)
+    timer.mark("blueprints")
 
     def _ensure_upload_dir():
         upload_dir = app.config["UPLOAD_DIR"]
@@ -111,10 +164,20 @@ def create_app() -> Flask:
 
     _ensure_upload_dir()
 
+    init_file_serving(app)
+    init_storage(app)
+    timer.mark("storage")
+
     @app.get("/files/<path:filename>")
     def public_files(filename: str):
         upload_dir = app.config["UPLOAD_DIR"]
-        return send_from_directory(upload_dir, filename)
+        return serve_upload(upload_dir, filename)
+
+    # Compila os templates (páginas/e-mails) uma vez, antes de atender requisições
+    if os.environ.get("TEMPLATE_PRELOAD", "true").lower() == "true":
+        from .templating import preload_templates
+        preload_templates()
+    timer.mark("templates")
 
     # Healthcheck
     @app.get("/api/healthz")
@@ -128,5 +191,11 @@ def create_app() -> Flask:
                 db.create_all()
             except Exception as exc:
                 logger.warning("db.create_all() falhou (ok em prod com Alembic): %s", exc)
+        timer.mark("create_all")
+
+    if role == "web":
+        start_deployment_tasks(app)
+    timer.report(role)
+    app.boot_timings = timer.as_dict()
 
     return app
@@ -6,32 +6,25 @@ from datetime import datetime, timedelta
 from urllib.parse import urlencode
 from werkzeug.exceptions import BadRequest, NotFound, Forbidden
 
-from flask import Blueprint, request, jsonify, current_app, make_response, redirect
+from flask import Blueprint, request, jsonify, current_app, redirect, g
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
-    jwt_required,
-    get_jwt_identity,
 )
 
 from ..extensions import db
 from ..models import User, EmailVerification, PasswordReset, Fundraiser, Contribution, BankAccount, PaymentStatus
 from ..utils import hash_password, verify_password, notify_admin_webhook
-from ..email_sender import send_email_html_mailgun, build_verification_email_html
-from ..decorators import tenant_required
+from ..password_hasher import password_hasher
+from ..email_sender import build_verification_email_html
+from ..email_queue import enqueue_email
+from ..decorators import auth_required, get_current_user, tenant_required
+from ..rate_limit import rate_limit
 
 from decimal import Decimal
 from sqlalchemy import func, or_
 
-from ..email_sender import (
-    send_email_html_mailgun,
-    build_verification_email_html,
-    _css_vars,
-    _email_shell,
-    _as_str_amount,
-    _mask,
-    _fmt_dt_br,
-)
+from ..templating import bank_view, message_page, render
 
 
 auth_bp = Blueprint("auth", __name__)
@@ -59,113 +52,19 @@ def _build_delete_account_email_html_admin(
     bank: BankAccount,
     deleted_at: datetime,
 ) -> str:
-    c = _css_vars()
-
-    bank_name = (getattr(bank, "bank_name", "") or "").strip() or "-"
-    bank_code = (getattr(bank, "bank_code", "") or "").strip() or "-"
-    agency = (getattr(bank, "agency", "") or "").strip() or "-"
-    account_number = (getattr(bank, "account_number", "") or "").strip() or "-"
-    account_type = getattr(bank, "account_type", None)
-    account_holder_name = (getattr(bank, "account_holder_name", "") or "").strip() or "-"
-    document_number = (getattr(bank, "document_number", "") or "").strip() or "-"
-
-    agency_masked = _mask(str(agency), keep_last=2) if agency != "-" else "-"
-    account_masked = _mask(str(account_number), keep_last=4) if account_number != "-" else "-"
-    doc_masked = _mask(str(document_number), keep_last=3) if document_number != "-" else "-"
-
-    full_copy_block = "\n".join([
-        f"Banco: {bank_name} ({bank_code})",
-        f"Agência: {agency}",
-        f"Conta: {account_number}",
-        f"Tipo: {str(account_type).title() if account_type else '-'}",
-        f"Titular: {account_holder_name}",
-        f"Documento: {document_number}",
-    ])
-
-    body = f"""
-<p style="margin:0 0 12px 0">Um usuário solicitou a <strong>exclusão da conta</strong>.</p>
-
-<div style="border:1px solid {c['border']};border-radius:12px;padding:12px;background:#fff;margin:12px 0">
-  <div style="display:flex;justify-content:space-between;margin:6px 0">
-    <span style="color:{c['muted']}">Usuário</span>
-    <strong>{(user.name or '-').strip()}</strong>
-  </div>
-  <div style="display:flex;justify-content:space-between;margin:6px 0">
-    <span style="color:{c['muted']}">E-mail</span>
-    <a href="mailto:{user.email}" style="color:{c['brand']};text-decoration:none">{user.email}</a>
-  </div>
-  <div style="display:flex;justify-content:space-between;margin:6px 0">
-    <span style="color:{c['muted']}">ID</span>
-    <span>{user.id}</span>
-  </div>
-  <div style="display:flex;justify-content:space-between;margin:6px 0">
-    <span style="color:{c['muted']}">Excluído em</span>
-    <span>{_fmt_dt_br(deleted_at)} (UTC)</span>
-  </div>
-</div>
-
-<h3 style="margin:18px 0 8px 0;font-size:16px">Valor a depositar</h3>
-<div style="border:1px solid {c['border']};border-radius:12px;padding:12px;background:#fff;margin:12px 0">
-  <div style="display:flex;justify-content:space-between;margin:6px 0">
-    <span style="color:{c['muted']}">Total das arrecadações do usuário</span>
-    <strong style="color:{c['brand_dark']}">{_as_str_amount(total_amount)}</strong>
-  </div>
-</div>
-
-<h3 style="margin:18px 0 8px 0;font-size:16px">Dados bancários para depósito (copiar/colar)</h3>
-<pre style="white-space:pre-wrap;background:#f8fafc;border:1px solid {c['border']};border-radius:10px;padding:12px;margin:8px 0">
-{full_copy_block}
-</pre>
-
-<h3 style="margin:18px 0 8px 0;font-size:16px">Resumo dos dados (mascarado)</h3>
-<table style="width:100%;border-collapse:separate;border-spacing:0 8px">
-  <tr>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;">Banco</td>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;text-align:right;">
-      {bank_name} {f"({bank_code})" if bank_code and bank_code != "-" else ""}
-    </td>
-  </tr>
-  <tr>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;">Agência</td>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;text-align:right;">
-      {agency_masked}
-    </td>
-  </tr>
-  <tr>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;">Conta</td>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;text-align:right;">
-      {account_masked}
-    </td>
-  </tr>
-  <tr>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;">Tipo</td>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;text-align:right;">
-      {str(account_type).title() if account_type else "-"}
-    </td>
-  </tr>
-  <tr>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;">Titular</td>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;text-align:right;">
-      {account_holder_name}
-    </td>
-  </tr>
-  <tr>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;">Documento</td>
-    <td style="padding:10px 12px;border:1px solid {c['border']};border-radius:10px;background:#fff;text-align:right;">
-      {doc_masked}
-    </td>
-  </tr>
-</table>
-
-<p style="margin:16px 0 0 0;color:{c['muted']};font-size:12px">
-  Observação: o bloco acima contém os dados <strong>completos</strong> para depósito; a tabela apresenta uma visão mascarada.
-</p>
-"""
-    return _email_shell("Conta excluída — Ação administrativa necessária", body)
-
+    return render(
+        "emails/account_deleted_admin.html",
+        user_name=(user.name or "-").strip(),
+        user_email=user.email,
+        user_id=user.id,
+        deleted_at=deleted_at,
+        total_amount=total_amount,
+        bank=bank_view(bank),
+    )
 
 
 @auth_bp.route("/register", methods=["POST"])
+@rate_limit("register", ip="10/hour", account="3/hour")
 def register():
     data = request.get_json() or {}
     name = (data.get("name") or "").strip()
@@ -193,20 +92,12 @@ def register():
         used=False,
     )
     db.session.add(ev)
-    db.session.commit()
 
     confirm_url = _confirm_url(token)
     subject = "Confirme seu e-mail — Velório Solidário"
     html = build_verification_email_html(name, confirm_url)
-
-    try:
-        send_email_html_mailgun(email, subject, html)
-    except Exception:
-        current_app.logger.exception("Falha ao enviar e-mail de confirmação")
-        return jsonify({
-            "message": "Cadastro iniciado, mas houve falha no envio do e-mail.",
-            "dev_confirm_url": confirm_url
-        }), 202
+    enqueue_email(email, subject, html, tag="verification")
+    db.session.commit()
 
     return jsonify({"message": "Enviamos um e-mail para confirmar seu cadastro."}), 201
 
@@ -263,25 +154,11 @@ def confirm_email(token):
 
 
 def _simple_html(msg: str, ok: bool = True):
-    color = "#1e90a3" if ok else "#c0392b"
-    body = f"""
-    <!doctype html><html lang="pt-BR"><meta charset="utf-8">
-    <title>Confirmação</title>
-    <body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,'Helvetica Neue',Arial,'Noto Sans',sans-serif;
-                 background:hsl(214 19% 94%);color:hsl(0 0% 11%);">
-      <div style="max-width:560px;margin:56px auto;background:white;padding:28px;border-radius:12px;
-                  border:1px solid hsl(214 19% 85%);box-shadow:0 8px 30px hsl(200 14% 31% / .15);">
-        <h2 style="margin:0 0 12px 0;color:{color}">Velório Solidário</h2>
-        <p style="font-size:16px;line-height:1.6;margin:0;">{msg}</p>
-      </div>
-    </body></html>
-    """
-    resp = make_response(body)
-    resp.headers["Content-Type"] = "text/html; charset=utf-8"
-    return resp
+    return message_page(msg, ok=ok, title="Confirmação")
 
 
 @auth_bp.route("/resend-confirmation", methods=["POST"])
+@rate_limit("resend_confirmation", ip="10/hour", account="3/hour")
 def resend_confirmation():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
@@ -306,17 +183,14 @@ def resend_confirmation():
     confirm_url = _confirm_url(ev.token)
     subject = "Confirme seu e-mail — Velório Solidário"
     html = build_verification_email_html(ev.name or name or "Usuário", confirm_url)
-
-    try:
-        send_email_html_mailgun(email, subject, html)
-    except Exception:
-        current_app.logger.exception("Falha ao reenviar e-mail de confirmação")
-        return jsonify({"message": "Falha ao reenviar o e-mail de confirmação."}), 500
+    enqueue_email(email, subject, html, tag="verification")
+    db.session.commit()
 
     return jsonify({"message": "Reenviamos o e-mail de confirmação."}), 200
 
 
 @auth_bp.route("/login", methods=["POST"])
+@rate_limit("login", ip="30/minute", account="5/minute")
 def login():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
@@ -335,8 +209,13 @@ def login():
             return jsonify({"error": "email_unconfirmed", "message": "Confirme seu e-mail para concluir o cadastro."}), 403
         return jsonify({"error": "invalid_credentials", "message": "Credenciais inválidas"}), 401
 
-    if not verify_password(password, user.password_hash):
+    ok, new_hash = password_hasher.verify_and_update(password, user.password_hash)
+    if not ok:
         return jsonify({"error": "invalid_credentials", "message": "Credenciais inválidas"}), 401
+    if new_hash:
+        # BCRYPT_ROUNDS mudou desde o último hash: atualiza com o custo atual
+        user.password_hash = new_hash
+        db.session.commit()
 
     access_token = create_access_token(identity=str(user.id))
     refresh_token = create_refresh_token(identity=str(user.id))
@@ -344,20 +223,16 @@ def login():
 
 
 @auth_bp.route("/refresh", methods=["POST"])
-@jwt_required(refresh=True)
-@tenant_required
+@auth_required(refresh=True)
 def refresh():
-    identity = get_jwt_identity()
-    access_token = create_access_token(identity=identity)
+    access_token = create_access_token(identity=str(g.user_id))
     return jsonify({"access": access_token}), 200
 
 
 @auth_bp.route("/me", methods=["GET"])
-@jwt_required()
-@tenant_required
+@tenant_required(user_columns=("id", "name", "email"))
 def me():
-    user_id = uuid.UUID(str(get_jwt_identity()))
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({"error": "not_found", "message": "Usuário não encontrado"}), 404
     payload = {"id": str(user.id), "name": user.name, "email": user.email}
@@ -370,6 +245,7 @@ def _reset_url(token: str) -> str:
 
 
 @auth_bp.route("/forgot-password", methods=["POST"])
+@rate_limit("forgot_password", ip="10/hour", account="3/hour")
 def forgot_password():
     data = request.get_json() or {}
     email = (data.get("email") or "").strip().lower()
@@ -382,7 +258,6 @@ def forgot_password():
             PasswordReset.user_id == user.id,
             PasswordReset.used.is_(False)
         ).delete(synchronize_session=False)
-        db.session.commit()
 
         token = secrets.token_urlsafe(32)
         pr = PasswordReset(
@@ -392,19 +267,11 @@ def forgot_password():
             used=False,
         )
         db.session.add(pr)
-        db.session.commit()
 
-        try:
-            url = _reset_url(token)
-            html = f"""
-                <p>Olá, {user.name}!</p>
-                <p>Para redefinir sua senha, clique no link abaixo (válido por {RESET_EXP_HOURS} horas):</p>
-                <p><a href="{url}">{url}</a></p>
-                <p>Se você não solicitou, ignore este e-mail.</p>
-            """
-            send_email_html_mailgun(user.email, "Redefinição de senha — Velório Solidário", html)
-        except Exception:
-            current_app.logger.exception("Falha ao enviar e-mail de reset de senha")
+        url = _reset_url(token)
+        html = render("emails/password_reset.html", name=user.name, reset_url=url, expires_hours=RESET_EXP_HOURS)
+        enqueue_email(user.email, "Redefinição de senha — Velório Solidário", html, tag="password_reset")
+        db.session.commit()
 
     return jsonify({"status": "ok"}), 200
 
@@ -471,7 +338,6 @@ def reset_password_with_token():
 
 
 @auth_bp.route("/change-password", methods=["PATCH"])
-@jwt_required()
 @tenant_required
 def change_password_authenticated():
     data = request.get_json(silent=True) or {}
@@ -484,12 +350,7 @@ def change_password_authenticated():
             "message": "current_password e new_password são obrigatórios"
         }), 400
 
-    try:
-        user_id = uuid.UUID(str(get_jwt_identity()))
-    except Exception:
-        return jsonify({"error": "unauthorized"}), 401
-
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({"error": "not_found", "message": "Usuário não encontrado"}), 404
 
@@ -508,7 +369,6 @@ def change_password_authenticated():
 
 
 @auth_bp.route("/delete-account", methods=["POST"])
-@jwt_required()
 @tenant_required
 def delete_account():
     data = request.get_json(silent=True) or {}
@@ -522,12 +382,7 @@ def delete_account():
     if confirmation.upper() != "EXCLUIR CONTA":
         return jsonify({"error": "confirmation_mismatch", "message": "Texto de confirmação inválido"}), 400
 
-    try:
-        user_id = uuid.UUID(str(get_jwt_identity()))
-    except Exception:
-        return jsonify({"error": "unauthorized"}), 401
-
-    user = User.query.get(user_id)
+    user = get_current_user()
     if not user:
         return jsonify({"error": "not_found", "message": "Usuário não encontrado"}), 404
 
@@ -549,22 +404,17 @@ def delete_account():
         .scalar()
     ) or 0
 
+    admin_html = None
     if ADMIN_REPORT_EMAILS:
         try:
-            html = _build_delete_account_email_html_admin(
+            admin_html = _build_delete_account_email_html_admin(
                 user=user,
                 total_amount=Decimal(total_amount),
                 bank=bank,
                 deleted_at=datetime.utcnow(),
             )
-            for admin_email in ADMIN_REPORT_EMAILS:
-                send_email_html_mailgun(
-                    to_email=admin_email,
-                    subject="Conta excluída — valor a depositar",
-                    html=html,
-                )
         except Exception as exc:
-            current_app.logger.exception("Falha ao enviar e-mail de exclusão de conta: %s", exc)
+            current_app.logger.exception("Falha ao montar e-mail de exclusão de conta: %s", exc)
 
     try:
         try:
@@ -589,12 +439,9 @@ def delete_account():
             user.name = "Conta excluída"
 
         db.session.add(user)
-        db.session.commit()
-    except Exception as exc:
-        current_app.logger.exception("Falha ao efetuar soft delete: %s", exc)
-        return jsonify({"error": "delete_failed", "message": "Não foi possível excluir a conta agora"}), 500
-
-    try:
+        if admin_html:
+            # um único envio em lote para todos os administradores
+            enqueue_email(ADMIN_REPORT_EMAILS, "Conta excluída — valor a depositar", admin_html, tag="account_deleted")
         notify_admin_webhook(
             "/webhooks/user-deleted",
             {
@@ -603,9 +450,10 @@ def delete_account():
                 "reason": "Solicitado pelo usuário",
             },
         )
-    except Exception:
-        # não quebra o fluxo para o usuário
-        pass
+        db.session.commit()
+    except Exception as exc:
+        current_app.logger.exception("Falha ao efetuar soft delete: %s", exc)
+        return jsonify({"error": "delete_failed", "message": "Não foi possível excluir a conta agora"}), 500
 
     return jsonify({"status": "ok"}), 200
 
@@ -0,0 +1,258 @@
+"""
+Avisos em massa aos contribuintes de uma vaquinha (meta atingida, encerrada, agradecimento).
+
+- a rota chama ``create_broadcast``: o e-mail é renderizado UMA vez, com os
+  placeholders do Mailgun (``%recipient.name%``) no lugar dos dados pessoais;
+- ``drain_broadcasts`` (thread do ``email_worker.py``) reivindica o aviso como
+  uma linha de outbox e lê os destinatários de ``contributions`` x ``users`` com
+  cursor no servidor (``stream_results``), já deduplicados por e-mail;
+- a cada ``BROADCAST_BATCH_SIZE`` endereços grava linhas em ``email_outbox``
+  (até MAILGUN_BATCH_MAX destinatários cada, com ``recipient_variables``) e
+  o progresso/cursor do aviso na mesma transação — se o worker cair, a
+  retomada continua de ``last_recipient`` sem repetir ninguém.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from html import escape
+from typing import Iterator, Optional
+
+from sqlalchemy import func, select
+
+from .email_queue import enqueue_email
+from .email_sender import MAILGUN_BATCH_MAX
+from .extensions import db, logger
+from .models import (
+    Broadcast,
+    BroadcastKind,
+    Contribution,
+    EmailOutbox,
+    Fundraiser,
+    FundraiserStatus,
+    OutboxStatus,
+    PaymentStatus,
+    User,
+)
+from .outbox import claim_due, mark_sent, schedule_retry
+from .templating import APP_FRONTEND_URL, render_email
+
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", str(MAILGUN_BATCH_MAX)))
+BROADCAST_FETCH_SIZE = int(os.getenv("BROADCAST_FETCH_SIZE", "500"))
+BROADCAST_MESSAGE_MAX = 4000
+
+# Contas excluídas são anonimizadas com este domínio (ver auth.delete_account)
+_ANONYMIZED_DOMAIN = "%@example.invalid"
+
+DEFAULT_SUBJECTS = {
+    BroadcastKind.GOAL_REACHED: "A vaquinha \"{title}\" atingiu a meta!",
+    BroadcastKind.FINISHED: "A vaquinha \"{title}\" foi encerrada",
+    BroadcastKind.THANK_YOU: "Obrigado por apoiar \"{title}\"",
+}
+
+
+class BroadcastError(Exception):
+    """Aviso não pode ser criado (``code`` vai na resposta da API)."""
+
+    def __init__(self, code: str, message: str, status: int = 422):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def _public_url(fundraiser: Fundraiser) -> Optional[str]:
+    if fundraiser.is_public and fundraiser.public_slug:
+        return f"{APP_FRONTEND_URL}/p/{fundraiser.public_slug}"
+    return None
+
+
+def create_broadcast(
+    fundraiser: Fundraiser,
+    kind: BroadcastKind,
+    *,
+    user_id,
+    subject: Optional[str] = None,
+    message: Optional[str] = None,
+) -> Broadcast:
+    """
+    Valida e adiciona o aviso à sessão (sem commit — quem chama faz o commit).
+    Meta atingida/encerrada só uma vez por vaquinha; um aviso por vez em andamento.
+    """
+    if kind == BroadcastKind.GOAL_REACHED and (fundraiser.current_amount or 0) < fundraiser.goal_amount:
+        raise BroadcastError("goal_not_reached", "A meta desta vaquinha ainda não foi atingida.")
+    if kind == BroadcastKind.FINISHED and fundraiser.status != FundraiserStatus.FINISHED:
+        raise BroadcastError("fundraiser_not_finished", "Encerre a vaquinha antes de enviar este aviso.")
+
+    existing = (
+        db.session.query(Broadcast.kind, Broadcast.status)
+        .filter(Broadcast.fundraiser_id == fundraiser.id, Broadcast.status != OutboxStatus.FAILED)
+        .all()
+    )
+    if any(s in (OutboxStatus.PENDING, OutboxStatus.SENDING) for _, s in existing):
+        raise BroadcastError("broadcast_in_progress", "Já existe um aviso sendo enviado para esta vaquinha.", 409)
+    if kind != BroadcastKind.THANK_YOU and any(k == kind for k, _ in existing):
+        raise BroadcastError("broadcast_already_sent", "Este aviso já foi enviado aos contribuintes.", 409)
+
+    subject = (subject or "").strip()[:255] or DEFAULT_SUBJECTS[kind].format(title=fundraiser.title)[:255]
+    message = (message or "").strip()[:BROADCAST_MESSAGE_MAX] or None
+    html, text = render_email(
+        "emails/fundraiser_broadcast.html",
+        kind=kind.value,
+        fundraiser_title=fundraiser.title,
+        goal_amount=fundraiser.goal_amount,
+        current_amount=fundraiser.current_amount,
+        message=message,
+        public_url=_public_url(fundraiser),
+    )
+    bc = Broadcast(
+        fundraiser_id=fundraiser.id,
+        created_by_user_id=user_id,
+        kind=kind,
+        subject=subject,
+        message=message,
+        html=html,
+        text=text,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(bc)
+    return bc
+
+
+def recipients_query(fundraiser_id, after: Optional[str] = None):
+    """
+    Contribuintes não anônimos com pagamento confirmado, um por e-mail (minúsculo),
+    em ordem de e-mail — a ordem estável é o que permite retomar de ``after``.
+    """
+    email = func.lower(User.email)
+    stmt = (
+        select(email.label("email"), func.min(User.name).label("name"))
+        .join(Contribution, Contribution.contributor_user_id == User.id)
+        .where(
+            Contribution.fundraiser_id == fundraiser_id,
+            Contribution.payment_status == PaymentStatus.PAID,
+            Contribution.is_anonymous.is_(False),
+            ~User.email.like(_ANONYMIZED_DOMAIN),
+        )
+        .group_by(email)
+        .order_by(email)
+    )
+    if after:
+        stmt = stmt.having(email > after)
+    return stmt
+
+
+def stream_recipients(fundraiser_id, after: Optional[str] = None) -> Iterator[tuple[str, str]]:
+    """
+    (email, nome) lidos com cursor no servidor, ``BROADCAST_FETCH_SIZE`` por vez.
+    Usa uma conexão própria: os commits de progresso da sessão não fecham o cursor.
+    """
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(recipients_query(fundraiser_id, after))
+        for rows in result.yield_per(BROADCAST_FETCH_SIZE).partitions():
+            for row in rows:
+                yield row.email, row.name
+
+
+def _first_name(name: Optional[str]) -> str:
+    parts = (name or "").split()
+    return escape(parts[0]) if parts else ""
+
+
+def _enqueue_chunk(bc: Broadcast, chunk: list[tuple[str, str]]) -> None:
+    variables = {email: {"name": _first_name(name)} for email, name in chunk}
+    rows = enqueue_email(
+        [email for email, _ in chunk],
+        bc.subject,
+        bc.html,
+        text=bc.text,
+        recipient_variables=variables,
+        tag=f"broadcast_{bc.kind.value}",
+    )
+    for row in rows:
+        row.broadcast_id = bc.id
+    bc.enqueued_recipients = (bc.enqueued_recipients or 0) + len(chunk)
+    bc.batches = (bc.batches or 0) + len(rows)
+    bc.last_recipient = chunk[-1][0]
+    bc.locked_at = datetime.utcnow()  # renova o lease enquanto expande
+    db.session.commit()
+
+
+def expand_broadcast(bc: Broadcast) -> int:
+    """Enfileira os lotes restantes do aviso. Retorna quantos destinatários entraram agora."""
+    added = 0
+    chunk: list[tuple[str, str]] = []
+    for item in stream_recipients(bc.fundraiser_id, after=bc.last_recipient):
+        chunk.append(item)
+        if len(chunk) >= BROADCAST_BATCH_SIZE:
+            _enqueue_chunk(bc, chunk)
+            added += len(chunk)
+            chunk = []
+    if chunk:
+        _enqueue_chunk(bc, chunk)
+        added += len(chunk)
+    return added
+
+
+def drain_broadcasts(limit: int = 1) -> int:
+    """Reivindica e expande avisos pendentes. Retorna quantos foram processados."""
+    rows = claim_due(Broadcast, limit)
+    for bc in rows:
+        started = datetime.utcnow()
+        try:
+            added = expand_broadcast(bc)
+        except Exception as exc:
+            logger.exception("Falha ao expandir aviso %s", bc.id)
+            db.session.rollback()
+            schedule_retry(bc, exc)
+        else:
+            bc.total_recipients = bc.enqueued_recipients
+            mark_sent(bc, finished_at=datetime.utcnow())
+            logger.info(
+                "Aviso %s: %s destinatário(s) em %s lote(s) (+%s nesta rodada, %.1fs)",
+                bc.id, bc.total_recipients, bc.batches, added, (datetime.utcnow() - started).total_seconds(),
+            )
+        db.session.commit()
+    return len(rows)
+
+
+def delivery_stats(broadcast_ids) -> dict:
+    """{broadcast_id: {status: {"batches", "recipients"}}} dos lotes na outbox, numa consulta só."""
+    stats = {bid: {st.value.lower(): {"batches": 0, "recipients": 0} for st in OutboxStatus} for bid in broadcast_ids}
+    if not stats:
+        return stats
+    rows = (
+        db.session.query(
+            EmailOutbox.broadcast_id,
+            EmailOutbox.status,
+            func.count(EmailOutbox.id),
+            func.coalesce(func.sum(func.jsonb_array_length(EmailOutbox.recipients)), 0),
+        )
+        .filter(EmailOutbox.broadcast_id.in_(list(stats)))
+        .group_by(EmailOutbox.broadcast_id, EmailOutbox.status)
+        .all()
+    )
+    for bid, status, batches, recipients in rows:
+        stats[bid][status.value.lower()] = {"batches": int(batches), "recipients": int(recipients)}
+    return stats
+
+
+def broadcast_progress(bc: Broadcast, delivery: Optional[dict] = None) -> dict:
+    """Estado do aviso + entrega dos lotes (pendentes/enviados/falhos) na outbox."""
+    if delivery is None:
+        delivery = delivery_stats([bc.id])[bc.id]
+    return {
+        "id": str(bc.id),
+        "fundraiser_id": str(bc.fundraiser_id),
+        "kind": bc.kind.value,
+        "subject": bc.subject,
+        "status": bc.status.value,
+        "attempts": bc.attempts,
+        "last_error": bc.last_error if bc.status == OutboxStatus.FAILED else None,
+        "enqueued_recipients": bc.enqueued_recipients,
+        "total_recipients": bc.total_recipients,
+        "batches": bc.batches,
+        "delivery": delivery,
+        "created_at": bc.created_at.isoformat() if bc.created_at else None,
+        "finished_at": bc.finished_at.isoformat() if bc.finished_at else None,
+    }
@@ -0,0 +1,180 @@
+"""
+Compressão das respostas (gzip e brotli) no próprio app.
+
+- só tipos da allowlist (JSON, HTML, texto, CSV, SVG...) e corpos a partir de
+  COMPRESSION_MIN_BYTES — abaixo disso o ganho não paga a CPU nem o cabeçalho;
+- nunca mexe em: respostas em streaming (SSE, ``send_file`` com passthrough),
+  corpos já comprimidos (``Content-Encoding`` definido, imagens, PDFs), Range/206,
+  e status sem corpo (204/304);
+- brotli quando o cliente aceita e o pacote ``Brotli`` está instalado, senão gzip.
+  ``Vary: Accept-Encoding`` sempre que o tipo seria comprimido, para caches/CDN;
+- respostas cacheáveis (``Cache-Control: public``) têm os bytes comprimidos
+  guardados em memória por (codificação, ETag ou hash do corpo) — payloads quentes
+  como os documentos legais são comprimidos uma vez por worker, em nível maior.
+
+Um ETag forte vira fraco na versão comprimida (os bytes mudam; é o que o Nginx
+faz): rotas que respondem 304 devem comparar com ``if_none_match.contains_weak``.
+
+Variáveis: COMPRESSION_ENABLED, COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL,
+COMPRESSION_BROTLI_QUALITY, COMPRESSION_CACHE_MAX_BYTES (0 = sem cache).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from flask import request
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Comprimidos uma vez e reaproveitados: vale gastar mais CPU
+CACHED_GZIP_LEVEL = 9
+CACHED_BROTLI_QUALITY = 9
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    "application/json",
+    "application/problem+json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+})
+
+
+@lru_cache(maxsize=1)
+def _brotli():
+    try:  # brotli é opcional: sem o pacote, só gzip
+        import brotli
+    except ImportError:  # pragma: no cover
+        return None
+    return brotli
+
+
+class _CompressedCache:
+    """LRU limitado pelo total de bytes comprimidos guardados (por processo)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple[str, str], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data: bytes) -> None:
+        if len(data) > self.max_bytes // 8:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+compressed_cache = _CompressedCache(COMPRESSION_CACHE_MAX_BYTES)
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    if _brotli() is not None and accept_encodings["br"] > 0:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str, cached: bool = False) -> bytes:
+    if encoding == "br":
+        quality = CACHED_BROTLI_QUALITY if cached else COMPRESSION_BROTLI_QUALITY
+        return _brotli().compress(data, quality=quality)
+    level = CACHED_GZIP_LEVEL if cached else COMPRESSION_GZIP_LEVEL
+    # mtime=0: mesma entrada, mesmos bytes (cacheável por proxies/CDN)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _is_cacheable(response) -> bool:
+    cc = response.cache_control
+    return bool(cc.public) and not cc.no_store and not cc.private
+
+
+def _compress_response(response):
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or "Content-Encoding" in response.headers
+        or "Content-Range" in response.headers
+    ):
+        return response
+
+    # A partir daqui a representação depende do Accept-Encoding
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    etag, weak = response.get_etag()
+    cacheable = compressed_cache.max_bytes > 0 and _is_cacheable(response)
+    compressed = None
+    if cacheable:
+        digest = etag if etag and not weak else hashlib.blake2b(data, digest_size=16).hexdigest()
+        key = (encoding, digest)
+        compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = compress(data, encoding, cached=True)
+            compressed_cache.put(key, compressed)
+    else:
+        compressed = compress(data, encoding)
+
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app) -> None:
+    """Registre logo depois do ``init_metrics``: o ``after_request`` roda depois dos demais."""
+    app.config.setdefault("COMPRESSION_ENABLED", COMPRESSION_ENABLED)
+    if not app.config["COMPRESSION_ENABLED"]:
+        return
+
+    @app.after_request
+    def _compress(response):
+        return _compress_response(response)
@@ -1,15 +1,18 @@
 # app/contributions/routes.py
 import uuid
 from decimal import Decimal, InvalidOperation
-from flask import Blueprint, request, jsonify, abort, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, abort, current_app, g
 from sqlalchemy.orm import joinedload
 
 import json, hmac, hashlib, time
 
 from ..extensions import db
+from ..database import db_timeouts
 from ..models import Contribution, Fundraiser, PaymentStatus, FundraiserStatus, User
-from ..decorators import tenant_required
+from ..decorators import auth_required, get_current_user, tenant_required
+from ..metrics import CHARGES_CREATED, PAYMENT_WEBHOOKS
+from ..rate_limit import rate_limit
+from ..replica import read_only
 
 contributions_bp = Blueprint("contributions", __name__)
 
@@ -22,7 +25,8 @@ def _get_fundraiser_or_404(fundraiser_id: str) -> Fundraiser:
 
 
 @contributions_bp.route("/fundraisers/<fundraiser_id>/contributions", methods=["POST"])
-@jwt_required(optional=True)
+@rate_limit("contribution", ip="10/minute", account="10/minute", target="120/minute")
+@auth_required(optional=True, user_columns=("id", "name", "email", "document_number"))
 def create_contribution(fundraiser_id):
     """Cria uma contribuição para uma vaquinha.
 
@@ -56,9 +60,7 @@ def create_contribution(fundraiser_id):
     is_anonymous = bool(data.get("is_anonymous", False))
 
     # se autenticado, armazena o user
-    contributor_user_id = get_jwt_identity()
-    if contributor_user_id:
-        contributor_user_id = uuid.UUID(str(contributor_user_id))
+    contributor_user_id = g.get("user_id")
 
     # Coletar payer do payload (se enviado) - vamos usá-lo como override,
     # senão tentamos pegar do usuário logado; se nada houver, PaymentService usa fallback.
@@ -73,7 +75,7 @@ def create_contribution(fundraiser_id):
 
     # Se há usuário logado, use os dados dele para preencher cpf/name/email quando ausentes
     if contributor_user_id:
-        u: User | None = User.query.get(contributor_user_id)
+        u: User | None = get_current_user()
         if u:
             # document_number deve conter o CPF do usuário (se você armazena assim)
             if not cpf and u.document_number:
@@ -105,6 +107,7 @@ def create_contribution(fundraiser_id):
     )
     db.session.add(contribution)
     db.session.commit()
+    CHARGES_CREATED.inc()
 
     return jsonify({
         "payment_intent_id": payment_data["payment_intent_id"],
@@ -114,14 +117,11 @@ def create_contribution(fundraiser_id):
 
 
 @contributions_bp.route("/contributions/mine", methods=["GET"])
-@jwt_required()
 @tenant_required
+@read_only
 def list_my_contributions():
     """Lista contribuições feitas pelo usuário autenticado, com dados da arrecadação embutidos."""
-    try:
-        user_id = uuid.UUID(str(get_jwt_identity()))
-    except Exception:
-        return jsonify({"error": "invalid_identity"}), 401
+    user_id = g.user_id
 
     q = (
         db.session.query(Contribution)
@@ -151,6 +151,7 @@ def list_my_contributions():
 
 
 @contributions_bp.route("/payments/pix/webhook", methods=["POST"])
+@db_timeouts("webhook")
 def pix_forwarded_webhook():
     """
     Endpoint chamado pelo PIX-Module quando o PSP notifica um pagamento.
@@ -162,6 +163,7 @@ def pix_forwarded_webhook():
     ts = request.headers.get("X-Timestamp", "")
 
     if not current_app.payment_service.verify_webhook(raw, sig, ts):
+        PAYMENT_WEBHOOKS.labels("bad_signature").inc()
         return jsonify({"error": "signature_verification_failed"}), 401
 
     try:
@@ -183,6 +185,7 @@ def pix_forwarded_webhook():
 
     c = Contribution.query.filter_by(payment_intent_id=txid).with_for_update(nowait=False).first()
     if not c:
+        PAYMENT_WEBHOOKS.labels("not_found").inc()
         return jsonify({"error": "not_found"}), 404
 
     prev = c.payment_status
@@ -196,11 +199,14 @@ def pix_forwarded_webhook():
             db.session.add(f)
 
         db.session.commit()
+    PAYMENT_WEBHOOKS.labels("applied" if prev != mapped else "unchanged").inc()
 
     return jsonify({"status": "ok", "txid": txid, "new_status": mapped.value})
 
 
 @contributions_bp.route("/payments/<txid>/refresh", methods=["POST"])
+@rate_limit("payment_refresh", ip="120/minute", target="30/minute")
+@db_timeouts("webhook")
 def refresh_payment(txid: str):
     try:
         data = current_app.payment_service.fetch_status(txid)
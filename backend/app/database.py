@@ -0,0 +1,132 @@
+"""
+Configuração da engine e timeouts do banco por classe de rota.
+
+- pool (Postgres): DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE_SECONDS,
+  DB_POOL_PRE_PING e DB_POOL_TIMEOUT_SECONDS — curto de propósito: com o pool
+  esgotado a requisição falha rápido com 503 (handler no ``create_app``) em vez
+  de ficar na fila até o Gunicorn matar o worker;
+- ``statement_timeout``/``lock_timeout`` por classe de rota (``public``,
+  ``webhook``, ``export``, ``default``), aplicados com ``set_config(..., true)``
+  no início de cada transação da sessão. São locais à transação: nada fica
+  "grudado" na conexão, o que mantém o app compatível com o PgBouncer em modo
+  transaction (não usamos ``SET`` de sessão nem parâmetros de startup). A
+  consulta aparece na instrumentação de SQL, fora do orçamento da rota.
+
+A classe vem de ``@db_timeouts("webhook")`` na rota ou, na falta dele, do
+blueprint (``public``/``explore`` => ``public``). Fora de requisição (workers,
+scripts) nada é aplicado — quem precisa (ex.: app/retention.py) define os seus.
+
+Variáveis por classe: DB_STATEMENT_TIMEOUT_<CLASSE>_MS e DB_LOCK_TIMEOUT_<CLASSE>_MS
+(0 = sem limite).
+"""
+from __future__ import annotations
+
+import os
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .sql_instrumentation import BUDGET_EXEMPT
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "3"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+
+
+def _timeouts(name: str, statement_ms: int, lock_ms: int) -> tuple[int, int]:
+    key = name.upper()
+    return (
+        int(os.getenv(f"DB_STATEMENT_TIMEOUT_{key}_MS", str(statement_ms))),
+        int(os.getenv(f"DB_LOCK_TIMEOUT_{key}_MS", str(lock_ms))),
+    )
+
+
+# (statement_timeout, lock_timeout) em ms
+ROUTE_TIMEOUTS = {
+    "default": _timeouts("default", 5000, 2000),
+    # leituras anônimas: devem ser rápidas e nunca esperar lock
+    "public": _timeouts("public", 2000, 500),
+    # PIX-Module reenvia o webhook: melhor falhar (503) do que ficar no FOR UPDATE
+    "webhook": _timeouts("webhook", 5000, 1000),
+    # comprovantes, auditoria e estatísticas percorrem muitas linhas
+    "export": _timeouts("export", 30000, 2000),
+}
+BLUEPRINT_TIMEOUTS = {"public": "public", "explore": "public"}
+
+# SQLSTATE de query_canceled (statement_timeout) e lock_not_available (lock_timeout)
+TIMEOUT_SQLSTATES = ("57014", "55P03")
+
+_ATTR = "_db_timeout_class"
+_installed = False
+
+
+def db_timeouts(route_class: str):
+    """Classe de timeouts da rota (ver ROUTE_TIMEOUTS). Use abaixo dos outros decorators."""
+    if route_class not in ROUTE_TIMEOUTS:
+        raise ValueError(f"Classe de timeout desconhecida: {route_class}")
+
+    def decorator(fn):
+        setattr(fn, _ATTR, route_class)
+        return fn
+    return decorator
+
+
+def engine_options(uri) -> dict:
+    """Opções da engine a partir do ambiente (só Postgres; sqlite usa as do driver)."""
+    if not uri or make_url(uri).get_backend_name() != "postgresql":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS},
+    }
+
+
+def is_timeout_error(exc: DBAPIError) -> bool:
+    return getattr(exc.orig, "pgcode", None) in TIMEOUT_SQLSTATES
+
+
+def _request_timeouts() -> tuple[int, int] | None:
+    if not has_request_context():
+        return None
+    route_class = g.get(_ATTR)
+    if route_class is None:
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        route_class = getattr(view, _ATTR, None) or BLUEPRINT_TIMEOUTS.get(request.blueprint, "default")
+        g._db_timeout_class = route_class
+    return ROUTE_TIMEOUTS[route_class]
+
+
+def _after_begin(session, transaction, connection):
+    if connection.dialect.name != "postgresql":
+        return
+    timeouts = _request_timeouts()
+    if timeouts is None:
+        return
+    # Conta em X-DB-Queries/Server-Timing, mas não no orçamento da rota: é da infraestrutura
+    connection.exec_driver_sql(
+        "SELECT set_config('statement_timeout', %s, true), set_config('lock_timeout', %s, true)",
+        (f"{timeouts[0]}ms", f"{timeouts[1]}ms"),
+        execution_options={BUDGET_EXEMPT: True},
+    )
+
+
+def init_database(app) -> None:
+    """Chame antes do ``db.init_app`` (as opções são lidas na criação da engine)."""
+    global _installed
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for key, value in engine_options(app.config.get("SQLALCHEMY_DATABASE_URI")).items():
+        options.setdefault(key, value)
+
+    if not _installed:
+        event.listen(Session, "after_begin", _after_begin)
+        _installed = True
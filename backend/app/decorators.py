@@ -1,15 +1,78 @@
+"""
+Autenticação por requisição.
+
+- o JWT é verificado uma única vez por requisição (mesmo com decorators
+  empilhados ou chamadas de ``verify_identity`` em helpers como o rate limit);
+- ``g.user_id``/``g.tenant_id`` recebem o UUID do token;
+- ``get_current_user()`` carrega o ``User`` só quando alguém pede, uma vez por
+  requisição; a rota pode declarar as colunas de que precisa
+  (``@tenant_required(user_columns=("id", "name", "email"))``) e o SELECT traz só elas.
+"""
 from functools import wraps
-from flask import jsonify, g
+from typing import Iterable, Optional
+from flask import g
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from sqlalchemy.orm import load_only
+from werkzeug.local import LocalProxy
 import uuid
 
-def tenant_required(fn):
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        verify_jwt_in_request()
-        g.user_id = uuid.UUID(str(get_jwt_identity()))
-        g.tenant_id = g.user_id
-        return fn(*args, **kwargs)
-    return wrapper
+from .extensions import db
+from .models import User
+
+
+def verify_identity(*, optional: bool = False, refresh: bool = False) -> Optional[uuid.UUID]:
+    """Verifica o JWT (se ainda não verificado nesta requisição) e devolve o user_id."""
+    kind = "refresh" if refresh else "access"
+    verified = g.setdefault("_jwt_verified", {})
+    if kind in verified and (optional or verified[kind] is not None):
+        return verified[kind]
+
+    verify_jwt_in_request(optional=optional, refresh=refresh)
+    identity = get_jwt_identity()
+    user_id = uuid.UUID(str(identity)) if identity else None
+    verified[kind] = user_id
+    if user_id is not None:
+        g.user_id = user_id
+        g.tenant_id = user_id
+    return user_id
+
+
+def auth_required(fn=None, *, optional: bool = False, refresh: bool = False,
+                  user_columns: Optional[Iterable[str]] = None):
+    """
+    Substitui ``@jwt_required`` + ``@tenant_required`` empilhados. Aceita uso
+    direto (``@auth_required``) ou com opções (``@auth_required(optional=True)``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_identity(optional=optional, refresh=refresh)
+            if user_columns:
+                g._user_columns = tuple(user_columns)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator(fn) if fn is not None else decorator
+
+
+def tenant_required(fn=None, *, user_columns: Optional[Iterable[str]] = None):
+    """JWT obrigatório; o tenant é o próprio usuário do token."""
+    return auth_required(fn, user_columns=user_columns)
+
+
+def get_current_user(*columns: str):
+    """
+    ``User`` autenticado (ou None), carregado na primeira chamada e reaproveitado
+    no resto da requisição. Sem ``columns``, usa as declaradas na rota (ou todas).
+    """
+    if "_current_user" in g:
+        return g._current_user
+    user_id = g.get("user_id")
+    if user_id is None:
+        return None
+    columns = columns or g.get("_user_columns") or ()
+    options = [load_only(*[getattr(User, c) for c in columns])] if columns else []
+    g._current_user = db.session.get(User, user_id, options=options)
+    return g._current_user
 
 
+current_user = LocalProxy(get_current_user)
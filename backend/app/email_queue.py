@@ -0,0 +1,95 @@
+"""
+Fila de e-mails (tabela ``email_outbox``).
+
+As rotas chamam ``enqueue_email`` ANTES do ``db.session.commit()``: o e-mail só
+passa a existir se a transação de negócio for confirmada, e a requisição não
+espera pelo Mailgun. O envio fica com ``email_worker.py`` (``drain_email_outbox``).
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from .email_sender import MAILGUN_BATCH_MAX, MailgunError, send_email_html_mailgun
+from .extensions import db, logger
+from .models import EmailOutbox
+from .outbox import claim_due, mark_sent, schedule_retry
+from .templating import html_to_text
+
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+EMAIL_CLAIM_BATCH = int(os.getenv("EMAIL_CLAIM_BATCH", "20"))
+
+
+def _normalize_recipients(to: str | Iterable[str]) -> list[str]:
+    items = [to] if isinstance(to, str) else list(to or [])
+    seen: dict[str, None] = {}
+    for addr in items:
+        a = (addr or "").strip()
+        if a and a.lower() not in seen:
+            seen[a.lower()] = None
+    return list(seen.keys())
+
+
+def enqueue_email(
+    to: str | Iterable[str],
+    subject: str,
+    html: str,
+    *,
+    text: Optional[str] = None,
+    recipient_variables: Optional[Dict[str, Dict[str, Any]]] = None,
+    tag: Optional[str] = None,
+) -> list[EmailOutbox]:
+    """
+    Adiciona a mensagem à sessão atual (sem commit — quem chama faz o commit).
+    Vários destinatários viram um único envio em lote (até MAILGUN_BATCH_MAX por linha).
+    """
+    recipients = _normalize_recipients(to)
+    if not recipients:
+        return []
+
+    plain = text if text is not None else html_to_text(html)
+    rows = []
+    for i in range(0, len(recipients), MAILGUN_BATCH_MAX):
+        chunk = recipients[i:i + MAILGUN_BATCH_MAX]
+        variables = None
+        if recipient_variables:
+            variables = {r: recipient_variables.get(r, {}) for r in chunk}
+        row = EmailOutbox(
+            recipients=chunk,
+            recipient_variables=variables,
+            subject=subject[:255],
+            html=html,
+            text=plain,
+            tag=tag,
+            max_attempts=EMAIL_MAX_ATTEMPTS,
+            next_attempt_at=datetime.utcnow(),
+        )
+        db.session.add(row)
+        rows.append(row)
+    return rows
+
+
+def drain_email_outbox(limit: int = EMAIL_CLAIM_BATCH) -> int:
+    """Reivindica e envia um lote da fila. Retorna quantas mensagens foram processadas."""
+    rows = claim_due(EmailOutbox, limit)
+    for row in rows:
+        try:
+            message_id = send_email_html_mailgun(
+                row.recipients,
+                row.subject,
+                row.html,
+                text=row.text,
+                recipient_variables=row.recipient_variables,
+                tag=row.tag,
+            )
+        except MailgunError as exc:
+            logger.warning("Falha ao enviar e-mail %s (tentativa %s): %s", row.id, row.attempts, exc)
+            schedule_retry(row, exc, permanent=exc.permanent)
+        except Exception as exc:
+            logger.exception("Erro inesperado ao enviar e-mail %s", row.id)
+            schedule_retry(row, exc)
+        else:
+            mark_sent(row, sent_at=datetime.utcnow(), provider_message_id=message_id)
+        db.session.commit()
+    return len(rows)
@@ -1,28 +1,37 @@
+from decimal import Decimal
+
 from flask import Blueprint, jsonify, request
 from sqlalchemy import or_, func
+from sqlalchemy.orm import joinedload
 from ..models import Fundraiser, FundraiserStatus
 from ..extensions import db
+from ..image_variants import cover_image_variants, cover_images_variants
+from ..replica import read_only
 
 explore_bp = Blueprint("explore", __name__)
 
-def _serialize_public_item(f: Fundraiser):
+def _serialize_public_item(f: Fundraiser, variants: dict):
+    # Valores crus: Decimal/UUID/datetime/enum são convertidos pelo provider JSON (app/json_provider.py);
+    # ``variants`` vem de cover_images_variants (uma consulta para a página toda)
     return {
-        "id": str(f.id),
+        "id": f.id,
         "title": f.title,
         "description": f.description,
-        "goal_amount": float(f.goal_amount),
-        "current_amount": float(f.current_amount or 0),
+        "goal_amount": f.goal_amount,
+        "current_amount": f.current_amount or Decimal("0"),
         "cover_image_url": f.cover_image_url,
+        "cover_image_variants": variants.get(f.cover_image_url),
         "city": f.city,
         "state": f.state,
         "public_slug": f.public_slug,
-        "created_at": f.created_at.isoformat(),
-        "status": f.status.value,
+        "created_at": f.created_at,
+        "status": f.status,
         "is_public": f.is_public,
         "can_contribute": f.status == FundraiserStatus.ACTIVE,
     }
 
 @explore_bp.route("/explore/fundraisers", methods=["GET"])
+@read_only
 def list_public_fundraisers():
     page = max(int(request.args.get("page", 1)), 1)
     limit = min(max(int(request.args.get("limit", 12)), 1), 100)
@@ -32,6 +41,7 @@ def list_public_fundraisers():
 
     q = Fundraiser.query.filter(
         Fundraiser.is_public.is_(True),
+        Fundraiser.moderation_hidden_at.is_(None),
         Fundraiser.status.in_([FundraiserStatus.ACTIVE, FundraiserStatus.FINISHED]),
     )
 
@@ -47,8 +57,9 @@ def list_public_fundraisers():
     total = q.count()
     items = q.order_by(Fundraiser.created_at.desc()).offset((page-1)*limit).limit(limit).all()
 
+    variants = cover_images_variants(f.cover_image_url for f in items)
     return jsonify({
-        "fundraisers": [_serialize_public_item(f) for f in items],
+        "fundraisers": [_serialize_public_item(f, variants) for f in items],
         "total": total,
         "page": page,
         "limit": limit,
@@ -57,9 +68,10 @@ def list_public_fundraisers():
 
 @explore_bp.route("/explore/fundraisers/<slug>", methods=["GET"])
 def get_public_by_slug(slug):
-    f = Fundraiser.query.filter(
+    f = Fundraiser.query.options(joinedload(Fundraiser.owner)).filter(
         Fundraiser.public_slug == slug,
-        Fundraiser.is_public.is_(True)
+        Fundraiser.is_public.is_(True),
+        Fundraiser.moderation_hidden_at.is_(None),
     ).first()
     if not f:
         return jsonify({"error":"not_found"}), 404
@@ -76,6 +88,7 @@ def get_public_by_slug(slug):
         "city": f.city,
         "state": f.state,
         "cover_image_url": f.cover_image_url,
+        "cover_image_variants": cover_image_variants(f.cover_image_url),
         "owner_name": f.owner.name,
         "public_slug": f.public_slug,
         "created_at": f.created_at.isoformat(),
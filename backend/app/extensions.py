@@ -3,7 +3,10 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from structlog import get_logger
 
-db = SQLAlchemy()
+from .replica import RoutingSession
+
+# RoutingSession: leituras das rotas @read_only vão para a réplica (app/replica.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 jwt = JWTManager()
 cors = CORS()
 
@@ -0,0 +1,88 @@
+"""
+Entrega dos arquivos enviados (``/files/<nome>`` e ``/api/uploads/file/<nome>``).
+
+FILES_SERVE_MODE:
+    python      o próprio Flask envia os bytes (dev). Suporta Range e 304.
+    x-accel     responde vazio com ``X-Accel-Redirect`` e o Nginx entrega o arquivo
+                (sendfile, Range, keep-alive) — o worker Python não toca nos bytes.
+    x-sendfile  idem para Apache/lighttpd (``X-Sendfile`` com o caminho absoluto).
+
+Arquivos com nome endereçado por conteúdo (``<sha256>.<ext>`` e suas variantes
+``<sha256>.card.webp`` etc.) nunca mudam: recebem ``Cache-Control: immutable`` de
+1 ano e ETag forte derivado do nome. Os demais ficam com FILES_MAX_AGE.
+"""
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+
+from flask import abort, current_app, make_response, request, send_from_directory
+from werkzeug.security import safe_join
+
+FILES_SERVE_MODE = os.getenv("FILES_SERVE_MODE", "python").lower()
+FILES_ACCEL_PREFIX = os.getenv("FILES_ACCEL_PREFIX", "/_protected_files/")
+FILES_MAX_AGE = int(os.getenv("FILES_MAX_AGE", "3600"))
+IMMUTABLE_MAX_AGE = 31536000
+
+_HASHED_NAME = re.compile(r"^(?P<sha>[0-9a-f]{64})(?P<variant>\.[a-z]+)?\.[a-z0-9]+$")
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+def init_file_serving(app) -> None:
+    app.config.setdefault("FILES_SERVE_MODE", FILES_SERVE_MODE)
+    app.config.setdefault("FILES_ACCEL_PREFIX", FILES_ACCEL_PREFIX)
+    app.config.setdefault("FILES_MAX_AGE", FILES_MAX_AGE)
+    if app.config["FILES_SERVE_MODE"] == "x-sendfile":
+        app.config["USE_X_SENDFILE"] = True
+
+
+def _strong_etag(filename: str) -> str | None:
+    m = _HASHED_NAME.match(filename)
+    if not m:
+        return None
+    return m.group("sha") + (m.group("variant") or "").replace(".", "-")
+
+
+def _cache_headers(resp, immutable: bool):
+    if immutable:
+        resp.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        resp.headers["Cache-Control"] = f"public, max-age={current_app.config['FILES_MAX_AGE']}"
+    return resp
+
+
+def serve_upload(directory: str, filename: str):
+    # Nada de arquivos ocultos/temporários (ex.: .tmp/ dos uploads em andamento)
+    if any(part.startswith(".") for part in filename.split("/")):
+        abort(404)
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    basename = os.path.basename(filename)
+    etag = _strong_etag(basename)
+    mode = current_app.config["FILES_SERVE_MODE"]
+
+    if mode == "x-accel":
+        if etag and request.if_none_match.contains(etag):
+            resp = make_response("", 304)
+        else:
+            resp = make_response("", 200)
+            resp.headers["X-Accel-Redirect"] = current_app.config["FILES_ACCEL_PREFIX"].rstrip("/") + "/" + filename
+            resp.headers["Content-Type"] = mimetypes.guess_type(basename)[0] or "application/octet-stream"
+        if etag:
+            resp.set_etag(etag)
+        return _cache_headers(resp, immutable=bool(etag))
+
+    # python / x-sendfile: o send_file do Flask cuida de Range, 304 e X-Sendfile (USE_X_SENDFILE)
+    resp = send_from_directory(
+        directory,
+        filename,
+        conditional=True,
+        etag=etag if etag else True,
+        max_age=IMMUTABLE_MAX_AGE if etag else current_app.config["FILES_MAX_AGE"],
+    )
+    return _cache_headers(resp, immutable=bool(etag))
@@ -5,21 +5,27 @@ import datetime
 from decimal import Decimal, ROUND_HALF_UP
 
 from flask import Blueprint, request, jsonify, g, abort
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
 
 from ..extensions import db
-from ..decorators import tenant_required
+from ..broadcasts import BroadcastError, broadcast_progress, create_broadcast, delivery_stats
+from ..decorators import get_current_user, tenant_required
+from ..rate_limit import rate_limit
+from ..sql_instrumentation import query_budget
+from ..database import db_timeouts
+from ..replica import read_only
+from ..legal_docs import missing_acceptances
 from ..models import (
     User,
+    Broadcast,
+    BroadcastKind,
     Fundraiser,
     FundraiserStatus,
     Contribution,
     PaymentStatus,
     Withdrawal,
     WithdrawalStatus,
-    LegalDoc, 
-    LegalAcceptance
 )
 from ..utils import (
     generate_slug,
@@ -61,79 +67,21 @@ def _get_fundraiser_or_404(fundraiser_id: str) -> Fundraiser:
         abort(404)
     return f
 
-REQUIRED_DOC_KEYS = ("terms", "privacy", "fees")
-
 def _client_locale() -> str:
     lang = (request.args.get("lang") or "").strip()
     if not lang:
         lang = (request.headers.get("Accept-Language") or "").split(",")[0].strip()
     return lang or "pt-BR"
 
-def _latest_legal_by_key(keys: tuple[str, ...], locale: str) -> dict:
-    """
-    Retorna {key: {title, version, updated_at}} para a última versão ativa por key/locale.
-    Se não houver doc para uma key, ela não aparece no dict (logo não é exigida).
-    """
-    rows = db.session.execute(
-        text("""
-            SELECT DISTINCT ON (key)
-                   key, title, version, updated_at
-              FROM legal_docs
-             WHERE key = ANY(:keys)
-               AND locale = :locale
-               AND is_active = TRUE
-             ORDER BY key, updated_at DESC
-        """),
-        {"keys": list(keys), "locale": locale},
-    ).mappings().all()
-
-    result = {}
-    for r in rows:
-        result[r["key"]] = {
-            "title": r["title"],
-            "version": r["version"],
-            "updated_at": r["updated_at"].isoformat() if r["updated_at"] else None,
-        }
-    return result
-
-def _user_latest_acceptances(user_id, keys: tuple[str, ...]) -> dict:
-    """
-    Retorna {doc_key: version_aceita} considerando o aceite mais recente por key.
-    """
-    rows = db.session.execute(
-        text("""
-            SELECT DISTINCT ON (doc_key)
-                   doc_key, version
-              FROM legal_acceptances
-             WHERE user_id = :uid
-               AND doc_key = ANY(:keys)
-             ORDER BY doc_key, accepted_at DESC
-        """),
-        {"uid": str(user_id), "keys": list(keys)},
-    ).mappings().all()
-    return {r["doc_key"]: r["version"] for r in rows}
-
 def _check_legal_acceptance_or_412(user_id) -> tuple[bool, dict | None]:
     """
     Compara últimas versões ativas com o que o usuário aceitou.
     Retorna (ok, payload_erro_ou_None).
     """
     locale = _client_locale()
-    latest = _latest_legal_by_key(REQUIRED_DOC_KEYS, locale)
+    # Versões vigentes vêm do cache do worker; o aceite do usuário é uma leitura pela PK
+    latest, missing = missing_acceptances(user_id, locale)
     required_keys = tuple(latest.keys())
-    user_ok = _user_latest_acceptances(user_id, required_keys)
-
-    missing = []
-    for k in required_keys:
-        latest_ver = latest[k]["version"]
-        accepted_ver = user_ok.get(k)
-        if accepted_ver != latest_ver:
-            missing.append({
-                "key": k,
-                "title": latest[k]["title"],
-                "required_version": latest_ver,
-                "accepted_version": accepted_ver,
-            })
 
     if missing:
         return False, {
@@ -151,7 +99,6 @@ def _check_legal_acceptance_or_412(user_id) -> tuple[bool, dict | None]:
 
 @fundraisers_bp.route("", methods=["POST"])
 @tenant_required
-@jwt_required()
 def create_fundraiser():
     data = request.get_json() or {}
     title = data.get("title")
@@ -161,7 +108,7 @@ def create_fundraiser():
         return jsonify({"error": "invalid_request", "message": "Título e meta são obrigatórios"}), 400
 
     user_id = g.user_id
-    u: User = db.session.get(User, user_id)
+    u: User = get_current_user()
 
     if not is_profile_complete(u):
         return jsonify({
@@ -208,7 +155,7 @@ def create_fundraiser():
 
 @fundraisers_bp.route("", methods=["GET"])
 @tenant_required
-@jwt_required()
+@read_only
 def list_fundraisers():
     user_id = g.user_id
     items = Fundraiser.query.filter_by(owner_user_id=user_id).all()
@@ -231,15 +178,13 @@ def list_fundraisers():
 
 @fundraisers_bp.route("/<fundraiser_id>", methods=["GET"])
 @tenant_required
-@jwt_required(optional=True)
 def get_fundraiser(fundraiser_id):
     """Retorna detalhes se o usuário for dono (escopo) ou se for pública."""
     f = Fundraiser.query.get(fundraiser_id)
     if not f or str(f.owner_user_id) != str(g.tenant_id):
         return jsonify({"error": "not_found", "message": "Arrecadação não encontrada"}), 404
 
-    current_user_id = get_jwt_identity()
-    is_owner = current_user_id and (str(uuid.UUID(str(current_user_id))) == str(f.owner_user_id))
+    is_owner = str(g.user_id) == str(f.owner_user_id)
     if not is_owner and not f.is_public:
         return jsonify({"error": "forbidden", "message": "Acesso negado"}), 403
 
@@ -260,7 +205,6 @@ def get_fundraiser(fundraiser_id):
 
 @fundraisers_bp.route("/<fundraiser_id>", methods=["PATCH"])
 @tenant_required
-@jwt_required()
 def update_fundraiser(fundraiser_id):
     f = _get_fundraiser_or_404(fundraiser_id)
 
@@ -281,7 +225,6 @@ def update_fundraiser(fundraiser_id):
 
 @fundraisers_bp.route("/<fundraiser_id>", methods=["DELETE"])
 @tenant_required
-@jwt_required()
 def delete_fundraiser(fundraiser_id):
     f = _get_fundraiser_or_404(fundraiser_id)
     if str(f.owner_user_id) != str(g.user_id):
@@ -294,7 +237,6 @@ def delete_fundraiser(fundraiser_id):
 
 @fundraisers_bp.route("/<fundraiser_id>/share/public", methods=["POST"])
 @tenant_required
-@jwt_required()
 def share_public(fundraiser_id):
     f = _get_fundraiser_or_404(fundraiser_id)
     if str(f.owner_user_id) != str(g.user_id):
@@ -309,7 +251,6 @@ def share_public(fundraiser_id):
 
 @fundraisers_bp.route("/<fundraiser_id>/share/audit", methods=["POST"])
 @tenant_required
-@jwt_required()
 def share_audit(fundraiser_id):
     f = _get_fundraiser_or_404(fundraiser_id)
     if str(f.owner_user_id) != str(g.user_id):
@@ -322,9 +263,44 @@ def share_audit(fundraiser_id):
     return jsonify({"audit_token": token, "expires_at": expires_at.isoformat()}), 200
 
 
+def _stats_contribution(c: Contribution):
+    # Valores crus: Decimal/UUID/datetime/enum são convertidos pelo provider JSON (app/json_provider.py)
+    return {
+        "id": c.id,
+        "amount": _dec(c.amount),
+        "message": c.message,
+        "is_anonymous": c.is_anonymous,
+        "contributor_name": (c.contributor.name if (c.contributor and not c.is_anonymous) else None),
+        "created_at": c.created_at,
+    }
+
+
+def _stats_withdrawal(w: Withdrawal):
+    ba = w.bank_account
+    return {
+        "id": w.id,
+        "fundraiser_id": w.fundraiser_id,
+        "bank_account_id": w.bank_account_id,
+        "amount": _dec(w.amount),
+        "description": w.description,
+        "status": w.status,
+        "requested_at": w.requested_at,
+        "processed_at": w.processed_at,
+        "bank_account": {
+            "id": ba.id if ba else None,
+            "bank_name": ba.bank_name if ba else None,
+            "agency": ba.agency if ba else None,
+            "account_number": ba.account_number if ba else None,
+            "account_type": ba.account_type if ba else None,
+            "account_holder_name": ba.account_holder_name if ba else None,
+        },
+    }
+
+
 @fundraisers_bp.route("/<fundraiser_id>/stats", methods=["GET"])
 @tenant_required
-@jwt_required()
+@query_budget(6)
+@db_timeouts("export")
 def fundraiser_stats(fundraiser_id):
     f = Fundraiser.query.get(fundraiser_id)
     if not f or str(f.owner_user_id) != str(g.tenant_id):
@@ -333,6 +309,7 @@ def fundraiser_stats(fundraiser_id):
     # Todas contribuições (para lista "recentes")
     contribs = (
         Contribution.query
+        .options(selectinload(Contribution.contributor))
         .filter(Contribution.fundraiser_id == f.id)
         .order_by(Contribution.created_at.desc())
         .all()
@@ -353,6 +330,7 @@ def fundraiser_stats(fundraiser_id):
     # Saques (listar e calcular saldo)
     withdrawals = (
         Withdrawal.query
+        .options(joinedload(Withdrawal.bank_account))
         .filter(Withdrawal.fundraiser_id == f.id)
         .order_by(Withdrawal.requested_at.desc())
         .all()
@@ -382,51 +360,19 @@ def fundraiser_stats(fundraiser_id):
     # Recentes (últimos 10, qualquer status)
     recent = contribs[:10]
 
-    def _format_contrib(c: Contribution):
-        return {
-            "id": str(c.id),
-            "amount": float(_dec(c.amount)),
-            "message": c.message,
-            "is_anonymous": c.is_anonymous,
-            "contributor_name": (c.contributor.name if (c.contributor and not c.is_anonymous) else None),
-            "created_at": c.created_at.isoformat(),
-        }
-
-    def _serialize_withdrawal(w: Withdrawal):
-        ba = w.bank_account
-        return {
-            "id": str(w.id),
-            "fundraiser_id": str(w.fundraiser_id),
-            "bank_account_id": str(w.bank_account_id),
-            "amount": float(_dec(w.amount)),
-            "description": w.description,
-            "status": w.status.value,
-            "requested_at": w.requested_at.isoformat(),
-            "processed_at": w.processed_at.isoformat() if w.processed_at else None,
-            "bank_account": {
-                "id": str(ba.id) if ba else None,
-                "bank_name": ba.bank_name if ba else None,
-                "agency": ba.agency if ba else None,
-                "account_number": ba.account_number if ba else None,
-                "account_type": ba.account_type.value if (ba and ba.account_type) else None,
-                "account_holder_name": ba.account_holder_name if ba else None,
-            },
-        }
-
     payload = {
         "total_contributions": total_contributions,
         "total_contributors": total_contributors,
-        "recent_contributions": [_format_contrib(c) for c in recent],
-        "withdrawals": [_serialize_withdrawal(w) for w in withdrawals],
+        "recent_contributions": [_stats_contribution(c) for c in recent],
+        "withdrawals": [_stats_withdrawal(w) for w in withdrawals],
         # Saldo disponível **líquido** (com taxas aplicadas)
-        "available_balance": float(available_balance),
-        "total_withdrawn": float(total_withdrawn),
+        "available_balance": available_balance,
+        "total_withdrawn": total_withdrawn,
     }
     return jsonify(payload), 200
 
 @fundraisers_bp.route("/<fundraiser_id>/status", methods=["PATCH"])
 @tenant_required
-@jwt_required()
 def update_status(fundraiser_id):
     f = _get_fundraiser_or_404(fundraiser_id)
     if str(f.owner_user_id) != str(g.user_id):
@@ -455,5 +401,70 @@ def update_status(fundraiser_id):
         setattr(f, "status_changed_at", datetime.utcnow())
 
     db.session.add(f)
+
+    # Aviso de encerramento aos contribuintes, na mesma transação da mudança de status
+    broadcast = None
+    if new_status == FundraiserStatus.FINISHED and data.get("notify_contributors"):
+        try:
+            broadcast = create_broadcast(f, BroadcastKind.FINISHED, user_id=g.user_id, message=reason)
+        except BroadcastError as e:
+            db.session.rollback()
+            return jsonify({"error": e.code, "message": e.message}), e.status
+
+    db.session.commit()
+    body = {"id": str(f.id), "status": f.status.value}
+    if broadcast is not None:
+        body["broadcast"] = broadcast_progress(broadcast)
+    return jsonify(body), 200
+
+
+@fundraisers_bp.route("/<fundraiser_id>/broadcasts", methods=["POST"])
+@rate_limit("broadcast", account="10/day")
+@tenant_required
+def create_fundraiser_broadcast(fundraiser_id):
+    """
+    Enfileira um aviso por e-mail a todos os contribuintes não anônimos
+    (``kind``: goal_reached | finished | thank_you). O envio é feito pelo worker;
+    acompanhe em ``GET /fundraisers/<id>/broadcasts/<broadcast_id>``.
+    """
+    f = _get_fundraiser_or_404(fundraiser_id)
+    if str(f.owner_user_id) != str(g.user_id):
+        return jsonify({"error": "forbidden", "message": "Apenas o proprietário pode enviar avisos"}), 403
+
+    data = request.get_json() or {}
+    try:
+        kind = BroadcastKind((data.get("kind") or "").strip().lower())
+    except ValueError:
+        return jsonify({"error": "invalid_kind", "message": "Use goal_reached, finished ou thank_you."}), 400
+
+    try:
+        bc = create_broadcast(f, kind, user_id=g.user_id, subject=data.get("subject"), message=data.get("message"))
+    except BroadcastError as e:
+        return jsonify({"error": e.code, "message": e.message}), e.status
     db.session.commit()
-    return jsonify({"id": str(f.id), "status": f.status.value}), 200
\ No newline at end of file
+    return jsonify(broadcast_progress(bc)), 202
+
+
+@fundraisers_bp.route("/<fundraiser_id>/broadcasts", methods=["GET"])
+@tenant_required
+@query_budget(3)
+def list_fundraiser_broadcasts(fundraiser_id):
+    f = _get_fundraiser_or_404(fundraiser_id)
+    items = (
+        Broadcast.query.filter(Broadcast.fundraiser_id == f.id)
+        .order_by(Broadcast.created_at.desc())
+        .limit(50)
+        .all()
+    )
+    delivery = delivery_stats([bc.id for bc in items])
+    return jsonify([broadcast_progress(bc, delivery[bc.id]) for bc in items]), 200
+
+
+@fundraisers_bp.route("/<fundraiser_id>/broadcasts/<broadcast_id>", methods=["GET"])
+@tenant_required
+def get_fundraiser_broadcast(fundraiser_id, broadcast_id):
+    f = _get_fundraiser_or_404(fundraiser_id)
+    bc = Broadcast.query.filter(Broadcast.id == broadcast_id, Broadcast.fundraiser_id == f.id).first()
+    if not bc:
+        abort(404)
+    return jsonify(broadcast_progress(bc)), 200
@@ -0,0 +1,276 @@
+"""
+Variantes redimensionadas das imagens enviadas (capas das arrecadações).
+
+Para cada upload ``<nome>.<ext>`` são gerados, ao lado do original (mesmo storage):
+
+    <nome>.card.webp     480px de largura (cards do explorar)
+    <nome>.detail.webp   1200px de largura (página da arrecadação)
+    <nome>.og.jpg        1200x630 recortado (preview em redes sociais / Open Graph)
+    <nome>.<v>.avif      AVIF de card/detail, se o Pillow tiver suporte (pillow-avif-plugin)
+    <nome>.variants.json manifesto com as variantes geradas
+
+A geração roda num pool de threads em segundo plano (o Pillow libera o GIL no
+resize/encode). Ao terminar, o manifesto também é gravado na tabela
+``image_variants``: é dela que os payloads públicos leem, numa consulta por
+página (``cover_variants_many``), nunca do storage na requisição. Manifestos
+prontos não mudam e ficam num LRU por processo (IMAGE_MANIFEST_CACHE_SIZE).
+Enquanto não há linha, ``cover_variants`` devolve a URL original em todas as
+variantes. Imagens anteriores à tabela: ``scripts/build_image_variants.py``.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .extensions import db, logger
+from .models import ImageVariantManifest
+from .storage import Storage, get_storage
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_VARIANTS_AVIF = os.getenv("IMAGE_VARIANTS_AVIF", "true").lower() == "true"
+# Manifestos prontos guardados em memória por processo (entradas)
+IMAGE_MANIFEST_CACHE_SIZE = int(os.getenv("IMAGE_MANIFEST_CACHE_SIZE", "4096"))
+
+# nome -> (largura, altura, recorte)
+VARIANTS: dict[str, tuple[int, Optional[int], bool]] = {
+    "card": (480, None, False),
+    "detail": (1200, None, False),
+    "og": (1200, 630, True),
+}
+MANIFEST_SUFFIX = ".variants.json"
+_CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpg": "image/jpeg", "json": "application/json"}
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+class _ManifestCache:
+    """LRU dos manifestos prontos (imutáveis: nunca expiram, só saem por tamanho)."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            manifest = self._items.get(key)
+            if manifest is not None:
+                self._items.move_to_end(key)
+            return manifest
+
+    def put(self, key: str, manifest: dict) -> None:
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = manifest
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+manifest_cache = _ManifestCache(IMAGE_MANIFEST_CACHE_SIZE)
+
+
+@lru_cache(maxsize=None)
+def _pil():
+    """Pillow só é importado na primeira imagem processada (não pesa no boot)."""
+    from PIL import Image, ImageOps
+
+    try:  # AVIF é opcional: depende do plugin pillow-avif-plugin
+        import pillow_avif  # noqa: F401
+    except ImportError:  # pragma: no cover
+        pass
+    return Image, ImageOps
+
+
+def avif_supported() -> bool:
+    return IMAGE_VARIANTS_AVIF and "AVIF" in _pil()[0].SAVE
+
+
+def _stem(key: str) -> str:
+    return key.rsplit(".", 1)[0]
+
+
+def manifest_key(key: str) -> str:
+    return _stem(key) + MANIFEST_SUFFIX
+
+
+def _resize(img: Image.Image, width: int, height: Optional[int], crop: bool) -> Image.Image:
+    Image, ImageOps = _pil()
+    if crop and height:
+        return ImageOps.fit(img, (width, height), Image.Resampling.LANCZOS)
+    if img.width <= width:
+        return img.copy()
+    ratio = width / img.width
+    return img.resize((width, max(int(img.height * ratio), 1)), Image.Resampling.LANCZOS)
+
+
+def build_variants(key: str, storage: Storage) -> dict:
+    """Gera as variantes de uma imagem do storage e grava o manifesto. Idempotente."""
+    stem = _stem(key)
+    base = stem.rsplit("/", 1)[-1]
+    manifest: dict = {"original": key, "variants": {}}
+    work_dir = tempfile.mkdtemp(dir=storage.temp_dir())
+    try:
+        source = storage.local_path(key)
+        if source is None:
+            source = os.path.join(work_dir, "original")
+            storage.download_to(key, source)
+
+        outputs: list[tuple[str, str]] = []  # (arquivo temporário, chave final)
+
+        def _out(variant: str, ext: str) -> str:
+            path = os.path.join(work_dir, f"{base}.{variant}.{ext}")
+            outputs.append((path, f"{stem}.{variant}.{ext}"))
+            return path
+
+        Image, ImageOps = _pil()
+        with Image.open(source) as src:
+            src = ImageOps.exif_transpose(src)
+            has_alpha = src.mode in ("RGBA", "LA") or (src.mode == "P" and "transparency" in src.info)
+            img = src.convert("RGBA" if has_alpha else "RGB")
+            manifest["width"], manifest["height"] = img.size
+
+            for variant, (width, height, crop) in VARIANTS.items():
+                resized = _resize(img, width, height, crop)
+                entry = {"width": resized.width, "height": resized.height}
+
+                if variant == "og":
+                    # Crawlers de OG nem sempre aceitam WebP
+                    resized.convert("RGB").save(_out(variant, "jpg"), "JPEG", quality=IMAGE_VARIANT_QUALITY, optimize=True, progressive=True)
+                    entry["jpg"] = outputs[-1][1]
+                else:
+                    resized.save(_out(variant, "webp"), "WEBP", quality=IMAGE_VARIANT_QUALITY, method=4)
+                    entry["webp"] = outputs[-1][1]
+                    if avif_supported():
+                        resized.save(_out(variant, "avif"), "AVIF", quality=IMAGE_VARIANT_QUALITY - 20)
+                        entry["avif"] = outputs[-1][1]
+                manifest["variants"][variant] = entry
+
+        for path, out_key in outputs:
+            storage.put_file(out_key, path, _CONTENT_TYPES[out_key.rsplit(".", 1)[-1]], move=True)
+        # O manifesto é gravado por último: a existência dele indica variantes prontas
+        storage.put_bytes(manifest_key(key), json.dumps(manifest).encode(), _CONTENT_TYPES["json"])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return manifest
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(IMAGE_VARIANT_WORKERS, 1), thread_name_prefix="img-variants")
+    return _executor
+
+
+def record_manifest(key: str, manifest: dict) -> None:
+    """Registra as variantes prontas em ``image_variants`` (não faz commit)."""
+    stmt = pg_insert(ImageVariantManifest.__table__).values(key=key, manifest=manifest)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=["key"], set_={"manifest": stmt.excluded.manifest}))
+
+
+def schedule_variants(key: str, storage: Storage | None = None) -> Future:
+    storage = storage or get_storage("public")
+    app = current_app._get_current_object()
+
+    def _run():
+        try:
+            manifest = build_variants(key, storage)
+            with app.app_context():
+                try:
+                    record_manifest(key, manifest)
+                    db.session.commit()
+                finally:
+                    db.session.remove()
+            return manifest
+        except Exception:
+            logger.exception("Falha ao gerar variantes de %s", key)
+            raise
+    return _get_executor().submit(_run)
+
+
+def has_variants(key: str, storage: Storage) -> bool:
+    return storage.exists(manifest_key(key))
+
+
+def _manifests(keys: Iterable[str]) -> dict[str, dict]:
+    """Manifestos das chaves: LRU primeiro, o resto numa única consulta."""
+    found: dict[str, dict] = {}
+    missing = []
+    for key in set(keys):
+        manifest = manifest_cache.get(key)
+        if manifest is not None:
+            found[key] = manifest
+        else:
+            missing.append(key)
+    if missing:
+        rows = db.session.query(ImageVariantManifest.key, ImageVariantManifest.manifest).filter(
+            ImageVariantManifest.key.in_(missing)
+        )
+        for key, manifest in rows:
+            manifest_cache.put(key, manifest)
+            found[key] = manifest
+    return found
+
+
+def _variants_payload(url: str, manifest: Optional[dict], storage: Storage) -> dict:
+    if not manifest:
+        return {"ready": False, "card": url, "detail": url, "og": url, "avif": {}}
+
+    v = manifest["variants"]
+    return {
+        "ready": True,
+        "card": storage.url(v["card"]["webp"]),
+        "detail": storage.url(v["detail"]["webp"]),
+        "og": storage.url(v["og"]["jpg"]),
+        "avif": {k: storage.url(v[k]["avif"]) for k in ("card", "detail") if v.get(k, {}).get("avif")},
+        "width": manifest.get("width"),
+        "height": manifest.get("height"),
+    }
+
+
+def cover_variants_many(urls: Iterable[Optional[str]], storage: Storage) -> dict[str, dict]:
+    """
+    URLs das variantes de várias capas (uma consulta no máximo), por URL original.
+    Imagens externas ou ainda sem variantes devolvem a URL original em todas as chaves.
+    """
+    keys = {url: storage.key_from_url(url) for url in set(urls) if url}
+    manifests = _manifests(k for k in keys.values() if k)
+    return {url: _variants_payload(url, manifests.get(key) if key else None, storage) for url, key in keys.items()}
+
+
+def cover_variants(url: Optional[str], storage: Storage) -> Optional[dict]:
+    if not url:
+        return None
+    return cover_variants_many([url], storage)[url]
+
+
+def cover_image_variants(url: Optional[str]) -> Optional[dict]:
+    """Atalho de ``cover_variants`` usando o storage público da app atual."""
+    return cover_variants(url, get_storage("public"))
+
+
+def cover_images_variants(urls: Iterable[Optional[str]]) -> dict[str, dict]:
+    """Atalho de ``cover_variants_many`` usando o storage público da app atual."""
+    return cover_variants_many(urls, get_storage("public"))
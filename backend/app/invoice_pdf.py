@@ -0,0 +1,169 @@
+"""
+Geração e cache dos PDFs de comprovante de saque (``Invoice``).
+
+- ``render_invoice_pdf`` é uma função pura (dict -> bytes) e roda num
+  ``ProcessPoolExecutor``: o reportlab é CPU-bound e não deve segurar a thread
+  da requisição nem o GIL do worker web;
+- o PDF é gravado por conteúdo (``invoices/<sha256>.pdf``) no storage privado
+  (ver ``app.storage``) e a chave fica em ``Invoice.pdf_url``; o sha256 serve
+  também de ETag forte;
+- ``invariant=1`` deixa a saída do reportlab determinística (sem data de criação
+  nem id aleatório), então o mesmo comprovante gera sempre o mesmo arquivo.
+"""
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from decimal import Decimal
+from io import BytesIO
+from typing import Any, Optional
+
+from .extensions import db, logger
+from .models import Invoice
+from .storage import Storage, get_storage
+
+INVOICE_PDF_WORKERS = int(os.getenv("INVOICE_PDF_WORKERS", "2"))
+INVOICE_PDF_TIMEOUT_SECONDS = float(os.getenv("INVOICE_PDF_TIMEOUT_SECONDS", "30"))
+INVOICE_KEY_PREFIX = "invoices/"
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+# ---------------------- Renderização (processo filho) ----------------------
+
+def invoice_pdf_data(inv: Invoice) -> dict[str, Any]:
+    """Extrai do modelo só o que o PDF precisa (dados simples, serializáveis)."""
+    issued_at = getattr(inv, "issued_at", None)
+    return {
+        "id": str(inv.id),
+        "fundraiser_title": getattr(inv.fundraiser, "title", "") or "-",
+        "issued_txt": issued_at.strftime("%d/%m/%Y %H:%M") if issued_at else "-",
+        "amount": str(getattr(inv, "amount", 0) or 0),
+        "tax_amount": str(getattr(inv, "tax_amount", 0) or 0),
+    }
+
+
+def render_invoice_pdf(data: dict[str, Any]) -> bytes:
+    """Gera o PDF do comprovante. Sem acesso a app/banco: roda no pool de processos."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    amount = Decimal(data["amount"])
+    tax_amount = Decimal(data["tax_amount"])
+    net = amount - tax_amount
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4, invariant=1)
+    w, h = A4
+    y = h - 30 * mm
+
+    def line(txt, size=11, bold=False):
+        nonlocal y
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", size)
+        c.drawString(25 * mm, y, str(txt))
+        y -= 7 * mm
+
+    c.setTitle(f"Comprovante de Saque {data['id']}")
+
+    line("Velório Solidário — Comprovante de Saque", 14, bold=True)
+    line(f"Número: {data['id']}", 10)
+    line(f"Emissão: {data['issued_txt']} (UTC)", 10)
+
+    y -= 3 * mm
+    line("Dados da Campanha", 12, bold=True)
+    line(f"Título: {data['fundraiser_title']}", 10)
+
+    y -= 3 * mm
+    line("Valores", 12, bold=True)
+    line(f"Valor Bruto (R$): {amount:.2f}", 11)
+    line(f"Taxas/Impostos (R$): {tax_amount:.2f}", 11)
+    line(f"Valor Líquido (R$): {net:.2f}", 12, bold=True)
+
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn: não herda conexões do pool do SQLAlchemy nem threads do processo web
+                _executor = ProcessPoolExecutor(
+                    max_workers=max(INVOICE_PDF_WORKERS, 1),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+# ---------------------- Armazenamento por conteúdo ----------------------
+
+def is_invoice_key(key: str | None) -> bool:
+    return bool(key) and key.startswith(INVOICE_KEY_PREFIX) and "/" not in key[len(INVOICE_KEY_PREFIX):]
+
+
+def pdf_etag(key: str) -> str:
+    """O nome do arquivo já é o sha256 do conteúdo."""
+    return key[len(INVOICE_KEY_PREFIX):].rsplit(".", 1)[0]
+
+
+def store_pdf(pdf: bytes, storage: Storage | None = None) -> str:
+    """Grava o PDF no storage privado e devolve a chave. Conteúdo repetido não é regravado."""
+    storage = storage or get_storage("private")
+    key = f"{INVOICE_KEY_PREFIX}{hashlib.sha256(pdf).hexdigest()}.pdf"
+    if not storage.exists(key):
+        storage.put_bytes(key, pdf, "application/pdf")
+    return key
+
+
+def has_stored_pdf(inv: Invoice, storage: Storage | None = None) -> bool:
+    if not is_invoice_key(inv.pdf_url):
+        return False
+    return (storage or get_storage("private")).exists(inv.pdf_url)
+
+
+# ---------------------- API usada pelas rotas ----------------------
+
+def ensure_invoice_pdf(inv: Invoice, timeout: Optional[float] = INVOICE_PDF_TIMEOUT_SECONDS) -> str:
+    """
+    Garante o PDF do comprovante no storage privado e devolve a chave (não faz commit).
+    A renderização roda no pool de processos; a thread atual só espera o resultado.
+    """
+    if has_stored_pdf(inv):
+        return inv.pdf_url
+    pdf = get_executor().submit(render_invoice_pdf, invoice_pdf_data(inv)).result(timeout=timeout)
+    inv.pdf_url = store_pdf(pdf)
+    return inv.pdf_url
+
+
+def schedule_invoice_pdf(app, inv: Invoice) -> Future:
+    """
+    Dispara a geração em segundo plano (pós-commit da Invoice). Quando o PDF fica
+    pronto, grava o arquivo e preenche ``pdf_url`` numa sessão própria.
+    Se algo falhar, o download gera o PDF sob demanda.
+    """
+    invoice_id = inv.id
+    future = get_executor().submit(render_invoice_pdf, invoice_pdf_data(inv))
+
+    def _done(fut: Future):
+        try:
+            with app.app_context():
+                key = store_pdf(fut.result())
+                try:
+                    db.session.query(Invoice).filter(
+                        Invoice.id == invoice_id, Invoice.pdf_url.is_(None)
+                    ).update({Invoice.pdf_url: key}, synchronize_session=False)
+                    db.session.commit()
+                finally:
+                    db.session.remove()
+        except Exception:
+            logger.exception("Falha ao gerar PDF do comprovante %s", invoice_id)
+
+    future.add_done_callback(_done)
+    return future
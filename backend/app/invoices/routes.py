@@ -1,43 +1,41 @@
-from flask import jsonify, Blueprint, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import jsonify, Blueprint, send_file, current_app, redirect, g
 from ..extensions import db
 from ..decorators import tenant_required
-from ..models import Invoice, User, Fundraiser
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from decimal import Decimal
+from ..sql_instrumentation import query_budget
+from ..database import db_timeouts
+from ..replica import read_only
+from sqlalchemy.orm import contains_eager
+from ..models import Invoice, Fundraiser
+from ..invoice_pdf import ensure_invoice_pdf, pdf_etag
+from ..storage import get_storage
 
 invoices_bp = Blueprint("invoices", __name__)
 
 @invoices_bp.get("/invoices")
-@jwt_required()
 @tenant_required
+@query_budget(1)
+@read_only
 def list_invoices():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"error": "not_found", "message": "Usuário não encontrado"}), 404
-
     q = (
         db.session.query(Invoice)
         .join(Invoice.fundraiser)
-        .filter_by(owner_user_id=user.id)
+        .options(contains_eager(Invoice.fundraiser))
+        .filter(Fundraiser.owner_user_id == g.user_id)
         .order_by(Invoice.issued_at.desc())
     )
     items = [inv.to_dict() for inv in q.all()]
     return jsonify(items), 200
 
 @invoices_bp.get("/invoices/<uuid>/download")
-@jwt_required()
 @tenant_required
+@db_timeouts("export")
 def download_invoice(uuid):
-    user_id = get_jwt_identity()
+    user_id = g.user_id
 
     inv = (
         db.session.query(Invoice)
         .join(Invoice.fundraiser)
+        .options(contains_eager(Invoice.fundraiser))
         .filter(
             Invoice.id == uuid,
             Fundraiser.owner_user_id == user_id,
@@ -47,56 +45,31 @@ def download_invoice(uuid):
     if not inv:
         return jsonify({"error": "not_found", "message": "Nota não encontrada"}), 404
 
-    fundraiser_title = getattr(inv.fundraiser, "title", "") or "-"
-    issued_at = getattr(inv, "issued_at", None)
-    issued_txt = issued_at.strftime("%d/%m/%Y %H:%M") if issued_at else "-"
-    amount = Decimal(getattr(inv, "amount", 0) or 0)
-    tax_amount = Decimal(getattr(inv, "tax_amount", 0) or 0)
-    net = amount - tax_amount
-
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-    y = h - 30 * mm
-
-    def line(txt, size=11, bold=False):
-        nonlocal y
-        c.setFont("Helvetica-Bold" if bold else "Helvetica", size)
-        c.drawString(25 * mm, y, str(txt))
-        y -= 7 * mm
-
-    c.setTitle(f"Comprovante de Saque {inv.id}")
-
-    line("Velório Solidário — Comprovante de Saque", 14, bold=True)
-    line(f"Número: {inv.id}", 10)
-    line(f"Emissão: {issued_txt} (UTC)", 10)
-
-    y -= 3 * mm
-    line("Dados da Campanha", 12, bold=True)
-    line(f"Título: {fundraiser_title}", 10)
-
-    y -= 3 * mm
-    line("Valores", 12, bold=True)
-    line(f"Valor Bruto (R$): {amount:.2f}", 11)
-    line(f"Taxas/Impostos (R$): {tax_amount:.2f}", 11)
-    line(f"Valor Líquido (R$): {net:.2f}", 12, bold=True)
-
-    c.showPage()
-    c.save()
-    buf.seek(0)
+    try:
+        key = ensure_invoice_pdf(inv)
+    except Exception:
+        current_app.logger.exception("Falha ao gerar PDF do comprovante %s", inv.id)
+        return jsonify({"error": "pdf_unavailable", "message": "Comprovante indisponível no momento"}), 503
+    if db.session.is_modified(inv):
+        db.session.commit()
 
     filename = f"comprovante_saque_{inv.id}.pdf"
+    storage = get_storage("private")
+    path = storage.local_path(key)
+    if path is None:
+        # Storage remoto: o cliente baixa direto do bucket por uma URL assinada
+        return redirect(storage.download_url(key, filename), code=302)
+
+    # Conteúdo endereçado por hash: ETag forte e respostas 304 em downloads repetidos
     resp = send_file(
-        buf,
+        path,
         mimetype="application/pdf",
         as_attachment=True,
         download_name=filename,
+        conditional=True,
+        etag=pdf_etag(key),
+        last_modified=inv.issued_at,
         max_age=0,
-        conditional=False,
-        etag=False,
-        last_modified=None,
     )
-
-    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["Cache-Control"] = "private, no-cache"
     return resp
-
@@ -0,0 +1,95 @@
+"""
+Provider JSON do Flask (``jsonify``, ``request.get_json``) com orjson.
+
+Os serializers podem devolver os valores crus dos models:
+
+- ``Decimal``: número (o mesmo que o ``float(...)`` feito à mão nas demais rotas);
+- ``UUID``: string; ``datetime``/``date``: ISO 8601 (o mesmo que ``.isoformat()``;
+  para o formato com ``Z`` continue usando ``utils.iso_utc``);
+- enums dos models (``FundraiserStatus`` etc.): o ``.value``;
+- dataclasses e ``Markup``, como no provider padrão do Flask.
+
+A resposta é montada direto em bytes (sem passar por ``str``). Sem o pacote
+``orjson`` o app usa o ``DefaultJSONProvider`` do Flask, só com ``convert``
+no lugar do ``default`` dele (que mandaria Decimal como string e datas no
+formato HTTP) — mesmos valores, velocidade do Flask. Benchmark: scripts/bench_json.py.
+"""
+from __future__ import annotations
+
+import dataclasses
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+
+from flask.json.provider import DefaultJSONProvider
+
+from .extensions import logger
+
+try:  # orjson é opcional: sem ele, o provider padrão do Flask
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# kwargs de json.dumps que têm equivalente no orjson; qualquer outro vai para a stdlib
+_ORJSON_KWARGS = frozenset({"default", "indent", "separators", "sort_keys"})
+
+
+def convert(o):
+    """``default`` dos dois providers: tipos dos models => tipos JSON."""
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, Enum):
+        return o.value
+    if isinstance(o, UUID):
+        return str(o)
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class JSONProvider(DefaultJSONProvider):
+    """``DefaultJSONProvider`` com orjson (exige o pacote)."""
+
+    default = staticmethod(convert)
+
+    def _option(self, kwargs) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumpb(self, obj, kwargs) -> bytes:
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=self._option(kwargs))
+
+    def dumps(self, obj, **kwargs) -> str:
+        if not kwargs.keys() <= _ORJSON_KWARGS:
+            return super().dumps(obj, **kwargs)
+        return self._dumpb(obj, kwargs).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        # JSONDecodeError do orjson herda de ValueError: get_json segue respondendo 400
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = self._dumpb(obj, {"indent": 2} if pretty else {}) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app) -> None:
+    if orjson is not None:
+        app.json = JSONProvider(app)
+        return
+    logger.warning("orjson não instalado: respostas JSON com o provider padrão do Flask")
+    app.json = DefaultJSONProvider(app)
+    app.json.default = convert
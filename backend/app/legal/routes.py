@@ -1,99 +1,38 @@
-import hashlib
-from flask import Blueprint, request, jsonify, current_app, Response
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import desc
+from flask import Blueprint, request, jsonify, current_app, Response, g
 from ..extensions import db
-from ..models import LegalDoc, LegalAcceptance
 from ..decorators import tenant_required
-
-try:
-    import bleach
-    from markdown import markdown as md_to_html
-
-except Exception:
-    bleach = None
-    md_to_html = None
+from ..replica import read_only
+from ..legal_docs import get_cached_legal_doc, missing_acceptances, record_acceptances, required_legal_versions
 
 legal_bp = Blueprint("legal", __name__)
 
 ALLOWED_DOCS = {"privacy", "fees", "terms"}
-
-def _sanitize_html(html: str) -> str:
-    if not html:
-        return ""
-    if not bleach:
-        return html
-    return bleach.clean(
-        html,
-        tags=[
-            "p","ul","ol","li","strong","em","b","i","u","a","h1","h2","h3","h4","h5","h6",
-            "blockquote","code","pre","hr","br","span"
-        ],
-        attributes={"a": ["href", "title", "target", "rel"], "span": ["class"]},
-        protocols=["http","https","mailto"],
-        strip=True,
-    )
-
-def _render_and_sanitize(doc: LegalDoc) -> str:
-    if doc.content_html:
-        return _sanitize_html(doc.content_html)
-    if md_to_html and doc.content_md:
-        html = md_to_html(doc.content_md, extensions=["extra", "sane_lists", "admonition", "toc", "nl2br"])
-        return _sanitize_html(html)
-    return f"<pre>{(doc.content_md or '').replace('<','&lt;').replace('>','&gt;')}</pre>"
-
-def _etag_for(doc: LegalDoc) -> str:
-    payload = f"{doc.key}:{doc.locale}:{doc.version}:{doc.updated_at.isoformat()}:{hashlib.sha256((doc.content_html or doc.content_md or '').encode()).hexdigest()}"
-    return hashlib.sha256(payload.encode()).hexdigest()
+LEGAL_CACHE_CONTROL = "public, max-age=3600"
 
 @legal_bp.get("/public/legal")
+@read_only
 def get_legal_doc():
     key = (request.args.get("doc") or "").lower().strip()
     if key not in ALLOWED_DOCS:
         return jsonify({"error": "invalid_doc"}), 400
 
-    locale = (request.args.get("lang") or "pt-BR").strip()
+    locale = (request.args.get("lang") or "pt-BR").strip()[:16]
 
-    q = (LegalDoc.query
-         .filter(LegalDoc.key == key, LegalDoc.is_active == True)
-         .filter(LegalDoc.locale == locale)
-         .order_by(desc(LegalDoc.published_at), desc(LegalDoc.updated_at)))
-
-    doc = q.first()
-    if not doc and "-" in locale:
-        prefix = locale.split("-", 1)[0]
-        doc = (LegalDoc.query
-               .filter(LegalDoc.key == key, LegalDoc.is_active == True, LegalDoc.locale.ilike(f"{prefix}%"))
-               .order_by(desc(LegalDoc.published_at), desc(LegalDoc.updated_at))
-               .first())
-    if not doc:
-        doc = (LegalDoc.query
-               .filter(LegalDoc.key == key, LegalDoc.is_active == True)
-               .order_by(desc(LegalDoc.published_at), desc(LegalDoc.updated_at))
-               .first())
-
-    if not doc:
+    # HTML já renderizado na publicação; payload e ETag vêm do cache do worker
+    cached = get_cached_legal_doc(key, locale)
+    if not cached:
         return jsonify({"error": "not_found"}), 404
 
-    etag = _etag_for(doc)
-    if request.headers.get("If-None-Match") == etag:
-        return Response(status=304, headers={"ETag": etag, "Cache-Control": "public, max-age=3600"})
-
-    html = _render_and_sanitize(doc)
-    payload = {
-        "key": doc.key,
-        "title": doc.title,
-        "version": doc.version,
-        "updated_at": doc.updated_at.isoformat(),
-        "content_html": html,
-    }
-    return jsonify(payload), 200, {
-        "ETag": etag,
-        "Cache-Control": "public, max-age=3600",
-    }
+    # contains_weak: com compressão o cliente recebe (e devolve) o ETag fraco, ver app/compression.py
+    if request.if_none_match.contains_weak(cached.etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(cached.body, status=200, mimetype="application/json")
+    resp.set_etag(cached.etag)
+    resp.headers["Cache-Control"] = LEGAL_CACHE_CONTROL
+    return resp
 
 @legal_bp.post("/legal/accept")
-@jwt_required()
 @tenant_required
 def accept_legal_doc():
     data = request.get_json() or {}
@@ -103,8 +42,58 @@ def accept_legal_doc():
     if key not in ALLOWED_DOCS or not version:
         return jsonify({"error": "invalid_request"}), 400
 
-    user_id = get_jwt_identity()
-    acc = LegalAcceptance(user_id=user_id, doc_key=key, version=version, locale=locale)
-    db.session.add(acc)
+    user_id = g.user_id
+    record_acceptances(user_id, [(key, version)], locale)
     db.session.commit()
     return jsonify({"ok": True})
+
+@legal_bp.post("/legal/accept/batch")
+@tenant_required
+def accept_legal_docs_batch():
+    """
+    Aceita vários documentos numa única transação.
+    Corpo: { "locale": "pt-BR", "docs": [{"doc_key": "terms", "version": "..."}, ...] }
+    Sem "docs", aceita as versões vigentes de todos os documentos obrigatórios.
+    As versões enviadas precisam ser as vigentes (senão 409 com a lista atual).
+    """
+    data = request.get_json() or {}
+    locale = (data.get("locale") or "pt-BR").strip()[:16]
+    required = required_legal_versions(locale)
+
+    docs = data.get("docs")
+    if docs is None:
+        items = [(k, info["version"]) for k, info in required.items()]
+    elif isinstance(docs, list):
+        items = []
+        for d in docs:
+            d = d if isinstance(d, dict) else {}
+            key = (d.get("doc_key") or "").lower().strip()
+            version = (d.get("version") or "").strip()
+            if key not in ALLOWED_DOCS or not version:
+                return jsonify({"error": "invalid_request"}), 400
+            items.append((key, version))
+    else:
+        return jsonify({"error": "invalid_request"}), 400
+
+    items = list(dict(items).items())
+    if not items:
+        return jsonify({"error": "invalid_request"}), 400
+
+    stale = [k for k, v in items if k in required and required[k]["version"] != v]
+    if stale:
+        return jsonify({
+            "error": "legal_version_outdated",
+            "stale": stale,
+            "required": [{"key": k, **info} for k, info in required.items()],
+        }), 409
+
+    user_id = g.user_id
+    record_acceptances(user_id, items, locale)
+    db.session.commit()
+
+    _, missing = missing_acceptances(user_id, locale)
+    return jsonify({
+        "ok": True,
+        "accepted": [{"doc_key": k, "version": v} for k, v in items],
+        "missing": missing,
+    })
@@ -0,0 +1,218 @@
+"""
+Documentos legais publicados (termos, privacidade, taxas) com cache por worker.
+
+- o HTML sanitizado e o hash do conteúdo são gerados na publicação
+  (``publish_legal_doc`` / ``scripts/init_legal_docs.py``) e ficam na própria linha;
+- a cadeia de fallback de idioma (exato -> mesmo prefixo -> qualquer) é resolvida
+  numa única query ordenada;
+- o resultado (payload JSON já serializado + ETag) fica em memória por (doc, locale).
+  Quem publica incrementa ``cache_versions['legal_docs']``; cada worker confere essa
+  versão no máximo a cada LEGAL_CACHE_CHECK_SECONDS e descarta o cache se mudou;
+- o aceite dos documentos vai para o histórico (``legal_acceptances``) e para
+  ``legal_acceptance_latest`` (uma linha por usuário/doc); a checagem de aceite
+  compara essa linha com as versões vigentes, também em cache.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+from datetime import datetime
+
+from sqlalchemy import case, desc, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .extensions import db
+from .legal_render import legal_content_hash, render_legal_html
+from .models import CacheVersion, LegalAcceptance, LegalAcceptanceLatest, LegalDoc
+
+LEGAL_CACHE_NAMESPACE = "legal_docs"
+LEGAL_CACHE_CHECK_SECONDS = float(os.getenv("LEGAL_CACHE_CHECK_SECONDS", "30"))
+LEGAL_CACHE_MAX_ENTRIES = 256
+REQUIRED_DOC_KEYS = ("terms", "privacy", "fees")
+
+_cache: dict[tuple[str, str], Optional["CachedLegalDoc"]] = {}
+_required_cache: dict[str, dict] = {}
+_cache_lock = threading.Lock()
+_cache_version: Optional[int] = None
+_checked_at = 0.0
+
+
+class CachedLegalDoc:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: str, etag: str):
+        self.body, self.etag = body, etag
+
+
+# ---------------------- Publicação ----------------------
+
+def prerender_legal_doc(doc: LegalDoc) -> None:
+    doc.rendered_html = render_legal_html(doc.content_md, doc.content_html)
+    doc.content_hash = legal_content_hash(doc.title, doc.version, doc.rendered_html)
+
+
+def bump_cache_version(name: str, conn=None) -> None:
+    """Incrementa a versão do namespace (na transação atual; vale após o commit)."""
+    (conn or db.session).execute(text("""
+        INSERT INTO cache_versions (name, version, updated_at)
+        VALUES (:name, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (name) DO UPDATE
+        SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+    """), {"name": name})
+
+
+def publish_legal_doc(doc: LegalDoc) -> LegalDoc:
+    """Pré-renderiza, grava e invalida o cache dos workers (não faz commit)."""
+    prerender_legal_doc(doc)
+    db.session.add(doc)
+    bump_cache_version(LEGAL_CACHE_NAMESPACE)
+    return doc
+
+
+# ---------------------- Leitura ----------------------
+
+def find_legal_doc(key: str, locale: str) -> Optional[LegalDoc]:
+    """Documento ativo mais recente: locale exato, depois mesmo idioma, depois qualquer."""
+    rank = [(LegalDoc.locale == locale, 0)]
+    if "-" in locale:
+        rank.append((LegalDoc.locale.ilike(f"{locale.split('-', 1)[0]}%"), 1))
+    return (LegalDoc.query
+            .filter(LegalDoc.key == key, LegalDoc.is_active == True)
+            .order_by(case(*rank, else_=2), desc(LegalDoc.published_at), desc(LegalDoc.updated_at))
+            .first())
+
+
+def _build_entry(doc: LegalDoc) -> CachedLegalDoc:
+    html = doc.rendered_html
+    etag = doc.content_hash
+    if html is None or not etag:
+        # Linha gravada sem pré-renderização (ex.: editada direto no banco)
+        html = render_legal_html(doc.content_md, doc.content_html)
+        etag = legal_content_hash(doc.title, doc.version, html)
+    body = json.dumps({
+        "key": doc.key,
+        "title": doc.title,
+        "version": doc.version,
+        "updated_at": doc.updated_at.isoformat(),
+        "content_html": html,
+    }, ensure_ascii=False)
+    return CachedLegalDoc(body, etag)
+
+
+def _check_version() -> None:
+    global _cache_version, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < LEGAL_CACHE_CHECK_SECONDS:
+        return
+    version = (db.session.query(CacheVersion.version)
+               .filter(CacheVersion.name == LEGAL_CACHE_NAMESPACE)
+               .scalar()) or 0
+    with _cache_lock:
+        if version != _cache_version:
+            _cache.clear()
+            _required_cache.clear()
+            _cache_version = version
+        _checked_at = now
+
+
+def get_cached_legal_doc(key: str, locale: str) -> Optional[CachedLegalDoc]:
+    _check_version()
+    cache_key = (key, locale)
+    if cache_key in _cache:
+        return _cache[cache_key]
+
+    doc = find_legal_doc(key, locale)
+    entry = _build_entry(doc) if doc else None
+    with _cache_lock:
+        if len(_cache) >= LEGAL_CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[cache_key] = entry
+    return entry
+
+
+def clear_legal_cache() -> None:
+    global _checked_at
+    with _cache_lock:
+        _cache.clear()
+        _required_cache.clear()
+        _checked_at = 0.0
+
+
+# ---------------------- Aceite ----------------------
+
+def required_legal_versions(locale: str) -> dict:
+    """
+    {key: {title, version, updated_at}} da última versão ativa de cada documento
+    obrigatório no locale. Documento sem versão no locale não é exigido.
+    """
+    _check_version()
+    cached = _required_cache.get(locale)
+    if cached is not None:
+        return cached
+
+    docs = (LegalDoc.query
+            .filter(LegalDoc.key.in_(REQUIRED_DOC_KEYS), LegalDoc.locale == locale, LegalDoc.is_active == True)
+            .order_by(desc(LegalDoc.updated_at))
+            .all())
+    result: dict = {}
+    for d in docs:
+        result.setdefault(d.key, {
+            "title": d.title,
+            "version": d.version,
+            "updated_at": d.updated_at.isoformat() if d.updated_at else None,
+        })
+    with _cache_lock:
+        if len(_required_cache) >= LEGAL_CACHE_MAX_ENTRIES:
+            _required_cache.clear()
+        _required_cache[locale] = result
+    return result
+
+
+def user_accepted_versions(user_id) -> dict:
+    """{doc_key: versão} do último aceite do usuário (uma leitura pela PK)."""
+    rows = (db.session.query(LegalAcceptanceLatest.doc_key, LegalAcceptanceLatest.version)
+            .filter(LegalAcceptanceLatest.user_id == user_id)
+            .all())
+    return {k: v for k, v in rows}
+
+
+def missing_acceptances(user_id, locale: str) -> tuple[dict, list]:
+    """Retorna (versões exigidas, pendências) para o usuário no locale."""
+    latest = required_legal_versions(locale)
+    accepted = user_accepted_versions(user_id) if latest else {}
+    missing = [
+        {
+            "key": k,
+            "title": info["title"],
+            "required_version": info["version"],
+            "accepted_version": accepted.get(k),
+        }
+        for k, info in latest.items()
+        if accepted.get(k) != info["version"]
+    ]
+    return latest, missing
+
+
+def record_acceptances(user_id, items: list[tuple[str, str]], locale: str) -> None:
+    """
+    Registra aceites [(doc_key, versão)] no histórico e atualiza
+    ``legal_acceptance_latest`` (na transação atual; não faz commit).
+    """
+    now = datetime.utcnow()
+    db.session.execute(LegalAcceptance.__table__.insert().values([
+        {"id": uuid.uuid4(), "user_id": user_id, "doc_key": k, "version": v, "locale": locale, "accepted_at": now}
+        for k, v in items
+    ]))
+    stmt = pg_insert(LegalAcceptanceLatest).values([
+        {"user_id": user_id, "doc_key": k, "version": v, "locale": locale, "accepted_at": now}
+        for k, v in items
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[LegalAcceptanceLatest.user_id, LegalAcceptanceLatest.doc_key],
+        set_={"version": stmt.excluded.version, "locale": stmt.excluded.locale, "accepted_at": stmt.excluded.accepted_at},
+    ))
@@ -0,0 +1,66 @@
+"""
+Renderização dos documentos legais (markdown/HTML -> HTML sanitizado).
+
+Módulo puro (sem Flask/banco): usado na publicação pela app e também pelo
+``scripts/init_legal_docs.py``, que grava o resultado em ``legal_docs.rendered_html``.
+"""
+from __future__ import annotations
+
+import hashlib
+from functools import lru_cache
+from typing import Optional
+
+ALLOWED_TAGS = [
+    "p","ul","ol","li","strong","em","b","i","u","a","h1","h2","h3","h4","h5","h6",
+    "blockquote","code","pre","hr","br","span"
+]
+ALLOWED_ATTRIBUTES = {"a": ["href", "title", "target", "rel"], "span": ["class"]}
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists", "admonition", "toc", "nl2br"]
+
+
+@lru_cache(maxsize=None)
+def _bleach():
+    """bleach e markdown só são importados na primeira renderização (pesam no boot)."""
+    try:
+        import bleach
+    except Exception:
+        return None
+    return bleach
+
+
+@lru_cache(maxsize=None)
+def _markdown():
+    try:
+        from markdown import markdown
+    except Exception:
+        return None
+    return markdown
+
+
+def sanitize_html(html: str) -> str:
+    if not html:
+        return ""
+    bleach = _bleach()
+    if not bleach:
+        return html
+    return bleach.clean(
+        html,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=["http","https","mailto"],
+        strip=True,
+    )
+
+
+def render_legal_html(content_md: Optional[str], content_html: Optional[str] = None) -> str:
+    if content_html:
+        return sanitize_html(content_html)
+    md_to_html = _markdown()
+    if md_to_html and content_md:
+        return sanitize_html(md_to_html(content_md, extensions=MARKDOWN_EXTENSIONS))
+    return f"<pre>{(content_md or '').replace('<','&lt;').replace('>','&gt;')}</pre>"
+
+
+def legal_content_hash(title: str, version: str, rendered_html: str) -> str:
+    """Hash do que o cliente recebe; serve de ETag."""
+    return hashlib.sha256(f"{title}\n{version}\n{rendered_html}".encode()).hexdigest()
@@ -0,0 +1,214 @@
+"""
+Métricas no formato Prometheus (``GET /api/metrics``).
+
+- HTTP: histograma de latência e contagem por status, por blueprint/rota
+  (a regra da rota, ``/api/fundraisers/<id>``, não a URL — cardinalidade fixa);
+- pool do SQLAlchemy: espera no checkout, conexões em uso e timeouts do pool
+  (``InstrumentedQueuePool``, só no Postgres); atraso e roteamento da réplica
+  de leitura (app/replica.py);
+- chamadas externas (PIX-Module, Mailgun, admin-backend): latência e resultado
+  com ``outbound_call(service, operation)``;
+- negócio: cobranças criadas, webhooks de pagamento, saques pedidos.
+
+Vários processos (Gunicorn): com PROMETHEUS_MULTIPROC_DIR definido (o
+``gunicorn.conf.py`` define e limpa no boot) cada processo grava os valores em
+arquivos mmap e o endpoint soma todos — qualquer worker responde pelo conjunto.
+Sem a variável, cada processo expõe só os próprios números.
+
+Custo por requisição: dois ``perf_counter`` e duas atualizações em memória.
+
+Variáveis: METRICS_ENABLED, METRICS_TOKEN, PROMETHEUS_MULTIPROC_DIR. O endpoint
+exige ``Authorization: Bearer <METRICS_TOKEN>``; sem token configurado responde
+404 (a coleta continua) — as métricas incluem tráfego por rota e contadores de
+negócio, que não podem ficar públicos.
+"""
+from __future__ import annotations
+
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import Response, abort, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+_MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# ---------------------- HTTP ----------------------
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latência das requisições por rota",
+    ["blueprint", "route", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Requisições por rota e status",
+    ["blueprint", "route", "method", "status"],
+)
+
+# ---------------------- Pool do banco ----------------------
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Espera para obter uma conexão do pool (inclui abrir conexão nova)",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Conexões do pool emprestadas no momento",
+    multiprocess_mode="livesum",
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts que estouraram pool_timeout",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Atraso da réplica de leitura na última checagem (-1 = indisponível)",
+    multiprocess_mode="livemax",
+)
+DB_READ_ROUTING = Counter(
+    "db_read_routing_total",
+    "Rotas @read_only por destino (replica/primary) e motivo (read_only/sticky/lagging)",
+    ["target", "reason"],
+)
+
+# ---------------------- Chamadas externas ----------------------
+
+OUTBOUND_LATENCY = Histogram(
+    "outbound_request_duration_seconds",
+    "Latência das chamadas a serviços externos",
+    ["service", "operation"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15),
+)
+OUTBOUND_REQUESTS = Counter(
+    "outbound_requests_total",
+    "Chamadas a serviços externos por resultado (2xx/4xx/5xx/exception)",
+    ["service", "operation", "outcome"],
+)
+
+# ---------------------- Negócio ----------------------
+
+CHARGES_CREATED = Counter("vaquinha_charges_created_total", "Cobranças PIX criadas")
+PAYMENT_WEBHOOKS = Counter(
+    "vaquinha_payment_webhooks_total",
+    "Webhooks de pagamento recebidos por resultado (applied/unchanged/not_found/bad_signature)",
+    ["outcome"],
+)
+WITHDRAWALS_REQUESTED = Counter("vaquinha_withdrawals_requested_total", "Pedidos de saque")
+
+
+class _Call:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status: Optional[int] = None
+
+
+@contextmanager
+def outbound_call(service: str, operation: str):
+    """
+    Mede uma chamada externa. Quem chama preenche ``call.status`` com o HTTP
+    status; exceção dentro do bloco conta como ``exception`` e é propagada.
+    """
+    call = _Call()
+    outcome = "exception"
+    started = time.perf_counter()
+    try:
+        yield call
+        outcome = f"{call.status // 100}xx" if call.status else "ok"
+    finally:
+        OUTBOUND_LATENCY.labels(service, operation).observe(time.perf_counter() - started)
+        OUTBOUND_REQUESTS.labels(service, operation, outcome).inc()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mede a espera no checkout e as conexões em uso."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+        DB_POOL_IN_USE.inc()
+        return conn
+
+    def _do_return_conn(self, conn):
+        DB_POOL_IN_USE.dec()
+        super()._do_return_conn(conn)
+
+
+def _registry():
+    if not _MULTIPROC:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_process_dead(pid: int) -> None:
+    """Descarta os gauges ``live*`` de um worker que morreu (hook do Gunicorn)."""
+    if _MULTIPROC:
+        multiprocess.mark_process_dead(pid)
+
+
+# ---------------------- Integração com o Flask ----------------------
+
+def init_metrics(app) -> None:
+    """Chame antes do ``db.init_app``: a classe do pool entra nas opções da engine."""
+    app.config.setdefault("METRICS_ENABLED", METRICS_ENABLED)
+    app.config.setdefault("METRICS_TOKEN", METRICS_TOKEN)
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI")
+    if uri and make_url(uri).get_backend_name() == "postgresql":
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        options.setdefault("poolclass", InstrumentedQueuePool)
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return response
+        rule = request.url_rule
+        labels = (request.blueprint or "app", rule.rule if rule else "<unmatched>", request.method)
+        HTTP_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(*labels, str(response.status_code)).inc()
+        return response
+
+    @app.get("/api/metrics")
+    def metrics():
+        token = app.config["METRICS_TOKEN"]
+        if not token:
+            abort(404)
+        sent = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            abort(401)
+        return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -4,9 +4,9 @@ from datetime import datetime
 from enum import Enum as PyEnum
 from sqlalchemy import (
     Column, String, DateTime, Boolean, Numeric, ForeignKey, Integer,
-    UniqueConstraint, Text, Enum as SAEnum
+    UniqueConstraint, Index, Text, Enum as SAEnum
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from .extensions import db
 
@@ -68,6 +68,8 @@ class Fundraiser(db.Model):
     public_slug = Column(String(255), unique=True, nullable=True)
     audit_token_hash = Column(String(512), nullable=True)
     audit_token_expires_at = Column(DateTime, nullable=True)
+    # Ocultada da área pública por excesso de denúncias (ver app/report_moderation.py)
+    moderation_hidden_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -97,6 +99,10 @@ class Contribution(db.Model):
     fundraiser = relationship("Fundraiser", back_populates="contributions")
     contributor = relationship("User", back_populates="contributions")
 
+    __table_args__ = (
+        Index("ix_contributions_fundraiser_status", "fundraiser_id", "payment_status"),
+    )
+
     def __repr__(self) -> str:
         return f"<Contribution {self.id} {self.amount}>"
 
@@ -140,7 +146,7 @@ class EmailVerification(db.Model):
     name = Column(String(120), nullable=False)
     password_hash = Column(String(256), nullable=False)
     token = Column(String(128), unique=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     used = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -190,13 +196,74 @@ class FundraiserReport(db.Model):
     reporter_email = Column(String(120), nullable=True)  # pode ser anônimo (sem auth)
     reason = Column(String(64), nullable=False)          # ex: "fraud", "spam", "inappropriate"
     message = Column(String(1024), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # sha256(vaquinha|motivo|denunciante|janela): a mesma denúncia repetida não gera linha nova
+    fingerprint = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     fundraiser = relationship("Fundraiser")
 
+    __table_args__ = (
+        Index("ux_fundraiser_reports_fingerprint", "fingerprint", unique=True),
+    )
+
     def __repr__(self) -> str:
         return f"<FundraiserReport {self.id} fundraiser={self.fundraiser_id}>"
 
+class FundraiserReportStat(db.Model):
+    """
+    Agregado das denúncias por vaquinha e motivo (upsert a cada denúncia). O digest
+    para os administradores lê daqui, não de ``fundraiser_reports``; a ocultação
+    automática usa ``FundraiserReportTotal``. ``digested_count`` é o ``count`` já incluído num digest.
+    """
+    __tablename__ = "fundraiser_report_stats"
+    fundraiser_id = Column(UUID(as_uuid=True), ForeignKey("fundraisers.id", ondelete="CASCADE"), primary_key=True)
+    reason = Column(String(64), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    duplicates = Column(Integer, default=0, nullable=False)
+    digested_count = Column(Integer, default=0, nullable=False)
+    first_reported_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_reported_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<FundraiserReportStat {self.fundraiser_id} {self.reason}={self.count}>"
+
+class FundraiserReportTotal(db.Model):
+    """
+    Agregado por vaquinha (todos os motivos): denúncias distintas e denunciantes
+    distintos. ``reporters`` é a base da ocultação automática.
+    """
+    __tablename__ = "fundraiser_report_totals"
+    fundraiser_id = Column(UUID(as_uuid=True), ForeignKey("fundraisers.id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    reporters = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<FundraiserReportTotal {self.fundraiser_id} count={self.count} reporters={self.reporters}>"
+
+class FundraiserReporter(db.Model):
+    """Quem já denunciou cada vaquinha: sha256(vaquinha|denunciante), sem motivo nem janela."""
+    __tablename__ = "fundraiser_reporters"
+    fundraiser_id = Column(UUID(as_uuid=True), ForeignKey("fundraisers.id", ondelete="CASCADE"), primary_key=True)
+    reporter_hash = Column(String(64), primary_key=True)
+    first_reported_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<FundraiserReporter {self.fundraiser_id} {self.reporter_hash[:8]}>"
+
+class ImageVariantManifest(db.Model):
+    """
+    Variantes prontas de uma imagem do storage público (chave ``<sha256>.<ext>``):
+    os payloads públicos consultam aqui, em lote, em vez de ler o manifesto do
+    storage a cada capa (ver app/image_variants.py).
+    """
+    __tablename__ = "image_variants"
+    key = Column(String(512), primary_key=True)
+    manifest = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ImageVariantManifest {self.key}>"
+
 class Invoice(db.Model):
     __tablename__ = "invoices"
 
@@ -219,7 +286,9 @@ class Invoice(db.Model):
             "amount": float(self.amount),
             "tax_amount": float(self.tax_amount),
             "issued_at": self.issued_at.isoformat(),
-            "pdf_url": self.pdf_url,
+            # pdf_url guarda a chave do arquivo; para o cliente expomos a rota de download
+            "pdf_url": f"/api/invoices/{self.id}/download",
+            "pdf_ready": bool(self.pdf_url),
             "fundraiser": {
                 "id": str(self.fundraiser_id),
                 "title": self.fundraiser.title if self.fundraiser else None,
@@ -235,7 +304,7 @@ class PasswordReset(db.Model):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
     token = Column(String(128), unique=True, nullable=False, index=True)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     used = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -253,6 +322,9 @@ class LegalDoc(db.Model):
     version = Column(String(32), nullable=False)
     content_html = Column(Text, nullable=True)
     content_md = Column(Text, nullable=True)
+    # Pré-renderizados na publicação (ver app/legal_docs.py)
+    rendered_html = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     published_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -271,9 +343,174 @@ class LegalAcceptance(db.Model):
     doc_key = Column(String(32), nullable=False)
     version = Column(String(32), nullable=False)
     locale = Column(String(16), nullable=False, default="pt-BR")
-    accepted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    accepted_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     user = relationship("User")
 
     def __repr__(self) -> str:
         return f"<LegalAcceptance {self.id} user={self.user_id} doc={self.doc_key} v{self.version}>"
+
+class LegalAcceptanceLatest(db.Model):
+    """
+    Última versão aceita por usuário/documento (upsert a cada aceite). O histórico
+    completo continua em ``legal_acceptances``; esta tabela atende a checagem rápida.
+    """
+    __tablename__ = "legal_acceptance_latest"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    doc_key = Column(String(32), primary_key=True)
+    version = Column(String(32), nullable=False)
+    locale = Column(String(16), nullable=False, default="pt-BR")
+    accepted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<LegalAcceptanceLatest user={self.user_id} doc={self.doc_key} v{self.version}>"
+
+class RateLimitBucket(db.Model):
+    """Baldes do rate limiting quando RATE_LIMIT_STORE=postgres (ver app/rate_limit.py)."""
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String(255), primary_key=True)
+    tokens = Column(Numeric(12, 4), nullable=False)
+    allowed = Column(Boolean, default=True, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class ReplicaWriteMark(db.Model):
+    """Última escrita de cada usuário: as leituras @read_only dele ficam no primário por um tempo (ver app/replica.py)."""
+    __tablename__ = "replica_write_marks"
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    written_at = Column(DateTime, nullable=False, index=True)
+
+class CacheVersion(db.Model):
+    """
+    Contador de versão por "namespace" de cache em memória (ex.: ``legal_docs``).
+    Quem altera os dados incrementa a versão; os workers comparam e descartam o cache.
+    """
+    __tablename__ = "cache_versions"
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, default=1, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<CacheVersion {self.name} v{self.version}>"
+
+class DeploymentTask(db.Model):
+    """Tarefas de inicialização que rodam uma vez por deploy (ver app/startup.py)."""
+    __tablename__ = "deployment_tasks"
+    key = Column(String(128), primary_key=True)              # ex.: "psp_webhook@<release>"
+    status = Column(String(16), nullable=False)              # done | failed
+    attempts = Column(Integer, default=0, nullable=False)
+    detail = Column(Text, nullable=True)
+    finished_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<DeploymentTask {self.key} {self.status}>"
+
+class OutboxStatus(PyEnum):
+    PENDING = "PENDING"
+    SENDING = "SENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+class EmailOutbox(db.Model):
+    """
+    Fila persistente de e-mails. As rotas apenas inserem linhas aqui (na mesma
+    transação do evento de negócio); o envio é feito pelo ``email_worker.py``.
+    """
+    __tablename__ = "email_outbox"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    recipients = Column(JSONB, nullable=False)               # ["a@x.com", "b@y.com"]
+    recipient_variables = Column(JSONB, nullable=True)       # {"a@x.com": {...}} (envio em lote do Mailgun)
+    subject = Column(String(255), nullable=False)
+    html = Column(Text, nullable=False)
+    text = Column(Text, nullable=True)
+    tag = Column(String(64), nullable=True)
+
+    status = Column(SAEnum(OutboxStatus, name="outbox_status"), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=8, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    provider_message_id = Column(String(255), nullable=True)
+    # Lote gerado por um aviso em massa (progresso em app/broadcasts.py)
+    broadcast_id = Column(UUID(as_uuid=True), ForeignKey("broadcasts.id", ondelete="SET NULL"), nullable=True, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<EmailOutbox {self.id} {self.status} to={len(self.recipients or [])}>"
+
+class BroadcastKind(PyEnum):
+    GOAL_REACHED = "goal_reached"
+    FINISHED = "finished"
+    THANK_YOU = "thank_you"
+
+class Broadcast(db.Model):
+    """
+    Aviso em massa do dono aos contribuintes de uma vaquinha. A rota grava o HTML
+    já renderizado; o ``email_worker.py`` lê os destinatários com cursor no servidor
+    e enfileira lotes do Mailgun em ``email_outbox`` (retomando de ``last_recipient``).
+    """
+    __tablename__ = "broadcasts"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    fundraiser_id = Column(UUID(as_uuid=True), ForeignKey("fundraisers.id"), nullable=False, index=True)
+    created_by_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    kind = Column(SAEnum(BroadcastKind, name="broadcast_kind"), nullable=False)
+    subject = Column(String(255), nullable=False)
+    message = Column(Text, nullable=True)
+    html = Column(Text, nullable=False)
+    text = Column(Text, nullable=True)
+
+    status = Column(SAEnum(OutboxStatus, name="outbox_status"), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    # Progresso da expansão (destinatários enfileirados / lotes gerados)
+    enqueued_recipients = Column(Integer, default=0, nullable=False)
+    batches = Column(Integer, default=0, nullable=False)
+    last_recipient = Column(String(120), nullable=True)
+    total_recipients = Column(Integer, nullable=True)        # conhecido ao final
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_broadcasts_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<Broadcast {self.id} {self.kind} {self.status}>"
+
+class WebhookOutbox(db.Model):
+    """
+    Eventos para o admin-backend, gravados na mesma transação do evento de negócio
+    e entregues pelo ``webhook_dispatcher.py``.
+    """
+    __tablename__ = "webhook_outbox"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    endpoint = Column(String(255), nullable=False)            # ex.: "/webhooks/withdrawal-requested"
+    payload = Column(JSONB, nullable=False)
+
+    status = Column(SAEnum(OutboxStatus, name="outbox_status"), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=10, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    delivered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_webhook_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<WebhookOutbox {self.id} {self.endpoint} {self.status}>"
@@ -0,0 +1,101 @@
+"""
+Helpers genéricos para tabelas de "outbox" (fila persistente no Postgres).
+
+Padrão usado:
+  1. a rota insere a linha na mesma transação do evento de negócio;
+  2. um worker reivindica lotes com ``FOR UPDATE SKIP LOCKED`` (vários workers
+     podem rodar em paralelo sem processar a mesma linha);
+  3. a entrega acontece fora da transação; o resultado é gravado depois, com
+     backoff exponencial em caso de falha.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import and_, or_
+
+from .extensions import db, logger
+from .models import OutboxStatus
+
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "5"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Backoff exponencial com jitter: base * 2^(n-1), limitado a OUTBOX_BACKOFF_MAX_SECONDS."""
+    delay = OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_due(model, limit: int, *, filters=()) -> list:
+    """
+    Reivindica até ``limit`` linhas prontas para envio e as marca como SENDING.
+    Linhas SENDING cujo lease expirou (worker morreu no meio) voltam a ser elegíveis.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=OUTBOX_LEASE_SECONDS)
+
+    rows = (
+        db.session.query(model)
+        .filter(
+            or_(
+                and_(model.status == OutboxStatus.PENDING, model.next_attempt_at <= now),
+                and_(model.status == OutboxStatus.SENDING, model.locked_at < stale),
+            ),
+            *filters,
+        )
+        .order_by(model.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for row in rows:
+        row.status = OutboxStatus.SENDING
+        row.locked_at = now
+        row.attempts = (row.attempts or 0) + 1
+    db.session.commit()
+    return rows
+
+
+def mark_sent(row, **fields) -> None:
+    row.status = OutboxStatus.SENT
+    row.locked_at = None
+    row.last_error = None
+    for k, v in fields.items():
+        setattr(row, k, v)
+
+
+def schedule_retry(row, error: Exception | str, *, permanent: bool = False) -> None:
+    """Agenda nova tentativa (ou marca FAILED se esgotou as tentativas / erro permanente)."""
+    row.last_error = str(error)[:2000]
+    row.locked_at = None
+    if permanent or (row.attempts or 0) >= (row.max_attempts or 1):
+        row.status = OutboxStatus.FAILED
+        return
+    row.status = OutboxStatus.PENDING
+    row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(row.attempts or 1))
+
+
+def run_worker_loop(app, drain: Callable[[], int], *, poll_interval: float, stop: threading.Event, name: str) -> None:
+    """
+    Loop de um worker: chama ``drain()`` até a fila esvaziar e então dorme
+    ``poll_interval`` segundos. Erros são logados e não derrubam a thread.
+    """
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                processed = drain()
+            except Exception:
+                logger.exception("Falha no worker %s", name)
+                db.session.rollback()
+                processed = 0
+            finally:
+                db.session.remove()
+            if not processed:
+                stop.wait(poll_interval)
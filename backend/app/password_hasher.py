@@ -0,0 +1,129 @@
+"""
+Hash/verificação de senhas (bcrypt) fora da thread da requisição.
+
+O bcrypt é CPU-bound de propósito; rodando na thread do request, um pico de
+logins ocupa todos os núcleos e trava os demais endpoints do worker. Aqui cada
+operação vai para um ``ProcessPoolExecutor`` pequeno (PASSWORD_HASH_WORKERS) e o
+número de operações pendentes por processo web é limitado
+(PASSWORD_HASH_MAX_PENDING): acima disso a requisição espera até
+PASSWORD_HASH_WAIT_SECONDS e então recebe 503 com ``Retry-After``.
+
+BCRYPT_ROUNDS define o custo de novos hashes. Hashes com outro custo continuam
+válidos e são refeitos de forma transparente no próximo login
+(``verify_and_update``).
+
+PASSWORD_HASH_WORKERS=0 executa inline (scripts, testes).
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from passlib.hash import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "5"))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "30"))
+
+
+class PasswordHasherBusy(Exception):
+    """Fila de hashing cheia: a rota deve responder 503."""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Serviço de autenticação sobrecarregado")
+        self.retry_after = retry_after
+
+
+# ---------------------- Funções do processo filho ----------------------
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.verify(password, password_hash)
+    except ValueError:
+        # hash malformado/de outro esquema: trata como senha incorreta
+        return False
+
+
+def _verify_and_rehash(password: str, password_hash: str, rounds: int) -> tuple[bool, Optional[str]]:
+    if not _verify(password, password_hash):
+        return False, None
+    if bcrypt.using(rounds=rounds).needs_update(password_hash):
+        return True, _hash(password, rounds)
+    return True, None
+
+
+# ---------------------- Serviço ----------------------
+
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.rounds = rounds
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: não herda conexões do banco nem threads do processo web
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=PASSWORD_HASH_WAIT_SECONDS):
+            raise PasswordHasherBusy(retry_after=max(int(PASSWORD_HASH_WAIT_SECONDS), 1))
+        try:
+            return self._get_executor().submit(fn, *args).result(timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        if not password_hash:
+            return False
+        return self._run(_verify, password, password_hash)
+
+    def verify_and_update(self, password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+        """
+        Verifica a senha e, se o hash usa outro custo, devolve um hash novo
+        (feito no mesmo job do pool). Retorna (ok, novo_hash_ou_None).
+        """
+        if not password_hash:
+            return False, None
+        return self._run(_verify_and_rehash, password, password_hash, self.rounds)
+
+    def needs_update(self, password_hash: str) -> bool:
+        return bcrypt.using(rounds=self.rounds).needs_update(password_hash)
+
+    def warm_up(self) -> None:
+        """Sobe os processos do pool antes do primeiro login (evita latência do spawn)."""
+        if self.workers > 0:
+            ex = self._get_executor()
+            for f in [ex.submit(_verify, "", "") for _ in range(self.workers)]:
+                f.result()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
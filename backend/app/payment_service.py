@@ -1,7 +1,12 @@
 from __future__ import annotations
-import hmac, hashlib, time
-from typing import Optional
-import requests
+import hmac, hashlib, threading, time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+from .metrics import outbound_call
+
+if TYPE_CHECKING:
+    import requests
 
 
 class PaymentError(Exception):
@@ -14,12 +19,60 @@ class PaymentService:
         self.base_url = os.getenv("PIX_BASE_URL", "http://pix-module:8000").rstrip("/")
         self.api_key = os.getenv("PIX_API_KEY")
         self.webhook_secret = os.getenv("PIX_WEBHOOK_SECRET") or ""
-        self.session = requests.Session()
+        self._session: Optional[requests.Session] = None
         self.timeout = (3.0, 10.0)
+        # Chamadas ao PIX-Module em andamento (o desligamento gracioso espera zerar)
+        self._inflight = 0
+        self._idle = threading.Condition()
 
         if not self.api_key:
             raise RuntimeError("PIX_API_KEY não configurado")
 
+    @property
+    def session(self) -> requests.Session:
+        # requests só é importado na primeira chamada ao PIX-Module (fora do boot)
+        if self._session is None:
+            with self._idle:
+                if self._session is None:
+                    import requests
+
+                    self._session = requests.Session()
+        return self._session
+
+    @contextmanager
+    def _call(self, operation: str):
+        with self._idle:
+            self._inflight += 1
+        try:
+            with outbound_call("pix_module", operation) as call:
+                yield call
+        finally:
+            with self._idle:
+                self._inflight -= 1
+                if not self._inflight:
+                    self._idle.notify_all()
+
+    def reset_after_fork(self) -> None:
+        """
+        Chamado no worker logo após o fork (gunicorn.conf.py). Com ``preload_app``
+        o master pode ter chamado o PSP (registro do webhook, app/startup.py): a
+        conexão keep-alive herdada seria compartilhada com o master e os outros
+        workers, e a Condition pode ter sido copiada travada por outra thread.
+        Só esquece os objetos herdados, sem fechar o socket do master.
+        """
+        self._session = None
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def drain(self, timeout: float) -> bool:
+        """Espera as chamadas em andamento terminarem (até ``timeout`` s). True se zerou."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._inflight == 0, timeout=timeout)
+
     def _headers(self):
         return {
             "Authorization": f"Bearer {self.api_key}",
@@ -47,12 +100,14 @@ class PaymentService:
 
         payload = {"amount": float(amount), "cpf": cpf, "name": name, "email": email}
 
-        r = self.session.post(
-            f"{self.base_url}/api/v1/pix",
-            json=payload,
-            headers=self._headers(),
-            timeout=self.timeout,
-        )
+        with self._call("create_charge") as call:
+            r = self.session.post(
+                f"{self.base_url}/api/v1/pix",
+                json=payload,
+                headers=self._headers(),
+                timeout=self.timeout,
+            )
+            call.status = r.status_code
         if r.status_code >= 400:
             raise PaymentError(f"PIX create failed: {r.text}")
 
@@ -67,11 +122,13 @@ class PaymentService:
         }
 
     def fetch_status(self, txid: str) -> dict:
-        r = self.session.put(
-            f"{self.base_url}/api/v1/pix/{txid}/status",
-            headers=self._headers(),
-            timeout=self.timeout,
-        )
+        with self._call("fetch_status") as call:
+            r = self.session.put(
+                f"{self.base_url}/api/v1/pix/{txid}/status",
+                headers=self._headers(),
+                timeout=self.timeout,
+            )
+            call.status = r.status_code
         if r.status_code == 404:
             return {"not_found": True}
         if r.status_code >= 400:
@@ -118,12 +175,14 @@ class PaymentService:
             webhook_url = f"{self.base_url}/api/v1/webhooks/pix"
 
         payload = {"webhook_url": webhook_url}
-        r = self.session.post(
-            f"{self.base_url}/api/v1/webhooks/config",
-            json=payload,
-            headers=self._headers(),  # Authorization: Bearer <API_KEY>
-            timeout=self.timeout,
-        )
+        with self._call("register_webhook") as call:
+            r = self.session.post(
+                f"{self.base_url}/api/v1/webhooks/config",
+                json=payload,
+                headers=self._headers(),  # Authorization: Bearer <API_KEY>
+                timeout=self.timeout,
+            )
+            call.status = r.status_code
         if r.status_code >= 400:
             raise PaymentError(f"Webhook register failed: {r.text}")
         return r.json()
@@ -1,12 +1,11 @@
 from datetime import datetime
 from flask import Blueprint, jsonify, request, g
-from flask_jwt_extended import jwt_required
 from sqlalchemy.exc import IntegrityError
 
 from ..extensions import db
 from ..models import User, BankAccount, AccountType
 from ..utils import only_digits, validate_cpf, validate_cnpj, is_cpf_in_use, is_cnpj_in_use
-from ..decorators import tenant_required
+from ..decorators import get_current_user, tenant_required
 
 import re
 
@@ -77,17 +76,15 @@ def _is_valid_pix_value(norm: str, key_type: str) -> bool:
     return False
 
 @profile_bp.route("/profile", methods=["GET"])
-@jwt_required()
 @tenant_required
 def get_profile():
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     return jsonify(_serialize_user(u)), 200
 
 @profile_bp.route("/profile", methods=["PATCH"])
-@jwt_required()
 @tenant_required
 def update_profile():
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     data = request.get_json() or {}
 
     if "name" in data:
@@ -144,17 +141,15 @@ def update_profile():
     return jsonify(_serialize_user(u)), 200
 
 @profile_bp.route("/profile/bank-accounts", methods=["GET"])
-@jwt_required()
 @tenant_required
 def list_bank_accounts():
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     return jsonify([_serialize_bank_account(b) for b in u.bank_accounts]), 200
 
 @profile_bp.route("/profile/bank-accounts", methods=["POST"])
-@jwt_required()
 @tenant_required
 def create_bank_account():
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     data = request.get_json() or {}
 
     required = ["bank_code","agency","account_number","account_type","account_holder_name","document_number"]
@@ -213,10 +208,9 @@ def create_bank_account():
     return jsonify(_serialize_bank_account(b)), 201
 
 @profile_bp.route("/profile/bank-accounts/<bank_account_id>", methods=["PATCH"])
-@jwt_required()
 @tenant_required
 def update_bank_account(bank_account_id):
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     b: BankAccount = BankAccount.query.filter_by(id=bank_account_id, owner_user_id=u.id).first()
     if not b:
         return jsonify({"error":"not_found"}), 404
@@ -280,10 +274,9 @@ def update_bank_account(bank_account_id):
     return jsonify(_serialize_bank_account(b)), 200
 
 @profile_bp.route("/profile/bank-accounts/<bank_account_id>", methods=["DELETE"])
-@jwt_required()
 @tenant_required
 def delete_bank_account(bank_account_id):
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     b: BankAccount = BankAccount.query.filter_by(id=bank_account_id, owner_user_id=u.id).first()
     if not b:
         return jsonify({"error":"not_found"}), 404
@@ -301,10 +294,9 @@ def delete_bank_account(bank_account_id):
     return jsonify({"message":"deleted"}), 200
 
 @profile_bp.route("/profile/bank-accounts/<bank_account_id>/set-default", methods=["POST"])
-@jwt_required()
 @tenant_required
 def set_default_bank_account(bank_account_id):
-    u: User = db.session.get(User, g.user_id)
+    u: User = get_current_user()
     b: BankAccount = BankAccount.query.filter_by(id=bank_account_id, owner_user_id=u.id).first()
     if not b:
         return jsonify({"error":"not_found"}), 404
@@ -0,0 +1,321 @@
+"""
+Rate limiting por token bucket para endpoints caros (bcrypt, PSP, e-mail).
+
+Cada rota decorada com ``@rate_limit`` tem até três baldes:
+
+    ip       IP do cliente: o da conexão ou, com RATE_LIMIT_PROXY_HOPS=N proxies
+             confiáveis à frente, o que o N-ésimo acrescentou ao X-Forwarded-For
+             (0 por padrão; o gunicorn.conf.py, atrás do Nginx, usa 1)
+    account  usuário do JWT ou o e-mail enviado no corpo (login, cadastro...)
+    target   o recurso alvo (vaquinha, txid...) — por padrão os argumentos da URL
+
+Limites no formato ``"<N>/<período>"`` (``second``, ``minute``, ``hour``, ``day``,
+ou ``"<N>/<segundos>s"``): o balde comporta N fichas e recarrega N por período.
+Cada limite pode ser sobrescrito no ambiente: ``RATE_LIMIT_<NOME>_<DIMENSÃO>``
+(ex.: ``RATE_LIMIT_LOGIN_ACCOUNT=10/minute``; ``off`` desliga).
+
+RATE_LIMIT_STORE:
+    memory    baldes no processo (cada worker conta separado)
+    postgres  tabela ``rate_limit_buckets`` compartilhada entre workers/instâncias;
+              se o banco falhar, a requisição passa (fail-open) e loga aviso.
+
+Excedido o limite: 429 com ``Retry-After`` (segundos).
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Optional, Union
+
+from flask import current_app, jsonify, request
+from sqlalchemy import text
+
+from .decorators import verify_identity
+from .extensions import db, logger
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "0"))
+RATE_LIMIT_MEMORY_MAX_KEYS = int(os.getenv("RATE_LIMIT_MEMORY_MAX_KEYS", "100000"))
+RATE_LIMIT_PRUNE_AFTER_SECONDS = int(os.getenv("RATE_LIMIT_PRUNE_AFTER_SECONDS", "86400"))
+
+# rate_limit_buckets.key é String(255): valores maiores entram como hash
+_MAX_KEY_VALUE = 128
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_SPEC = re.compile(r"^\s*(\d+)\s*/\s*(?:(\d+)\s*s|(second|minute|hour|day))\s*$")
+
+KeyFunc = Callable[[], Optional[str]]
+LimitArg = Union[str, tuple[str, KeyFunc], None]
+
+
+class Limit:
+    __slots__ = ("capacity", "period", "rate")
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period  # fichas por segundo
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        m = _SPEC.match(spec or "")
+        if not m:
+            raise ValueError(f"Limite inválido: {spec!r} (use '<N>/minute', '<N>/30s'...)")
+        period = int(m.group(2)) if m.group(2) else _PERIODS[m.group(3)]
+        return cls(int(m.group(1)), period)
+
+    def __repr__(self) -> str:
+        return f"<Limit {self.capacity}/{self.period}s>"
+
+
+# ---------------------- Stores ----------------------
+#
+# ``consume`` recebe todos os baldes da requisição de uma vez: a ficha só é
+# debitada se todos permitirem. Negada em um, os outros ficam intactos — senão
+# quem estoura o limite por IP queimaria também as fichas da própria conta.
+
+Bucket = tuple[str, Limit]
+
+
+def _settle(buckets: list[Bucket], levels: list[float], cost: float) -> tuple[bool, float]:
+    """(permitido, segundos_até_haver_fichas) dados os níveis já recarregados."""
+    waits = [(cost - tokens) / limit.rate for (_, limit), tokens in zip(buckets, levels) if tokens < cost]
+    return not waits, max(waits, default=0.0)
+
+
+class MemoryStore:
+    def __init__(self, max_keys: int = RATE_LIMIT_MEMORY_MAX_KEYS):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def consume(self, buckets: list[Bucket], cost: float = 1) -> tuple[bool, float]:
+        """Retorna (permitido, segundos_até_haver_fichas)."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, limit in buckets:
+                tokens, ts = self._buckets.get(key, (limit.capacity, now))
+                levels.append(min(limit.capacity, tokens + (now - ts) * limit.rate))
+            allowed, retry_after = _settle(buckets, levels, cost)
+            for (key, _), tokens in zip(buckets, levels):
+                if len(self._buckets) >= self.max_keys and key not in self._buckets:
+                    self._prune(now)
+                self._buckets[key] = (tokens - cost if allowed else tokens, now)
+        return allowed, retry_after
+
+    def _prune(self, now: float) -> None:
+        # Remove baldes parados há mais tempo (já estariam cheios de novo)
+        cutoff = now - RATE_LIMIT_PRUNE_AFTER_SECONDS
+        stale = [k for k, (_, ts) in self._buckets.items() if ts < cutoff]
+        for k in stale or list(self._buckets)[: len(self._buckets) // 10 or 1]:
+            self._buckets.pop(k, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class PostgresStore:
+    """
+    Baldes na tabela ``rate_limit_buckets`` (modelo ``RateLimitBucket``). Todos os
+    baldes da requisição numa transação só: cria os que faltam, trava as linhas
+    (sempre na ordem da chave, sem deadlock entre requisições), decide e grava.
+    ``allowed`` guarda, por balde, se ele teria deixado passar na última checagem.
+    """
+
+    _INSERT_SQL = text("""
+        INSERT INTO rate_limit_buckets (key, tokens, allowed, updated_at)
+        SELECT r.key, r.capacity, TRUE, clock_timestamp()
+        FROM unnest(CAST(:keys AS text[]), CAST(:capacities AS numeric[])) AS r(key, capacity)
+        ORDER BY r.key
+        ON CONFLICT (key) DO NOTHING
+    """)
+    _LOCK_SQL = text("""
+        SELECT key, tokens, EXTRACT(EPOCH FROM clock_timestamp() - updated_at), clock_timestamp()
+        FROM rate_limit_buckets
+        WHERE key = ANY(CAST(:keys AS text[]))
+        ORDER BY key
+        FOR UPDATE
+    """)
+    _UPDATE_SQL = text("""
+        UPDATE rate_limit_buckets AS b
+        SET tokens = r.tokens, allowed = r.allowed, updated_at = :now
+        FROM unnest(CAST(:keys AS text[]), CAST(:tokens AS numeric[]), CAST(:allowed AS boolean[]))
+          AS r(key, tokens, allowed)
+        WHERE b.key = r.key
+    """)
+    _PRUNE_SQL = text("DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - make_interval(secs => :age)")
+
+    @contextmanager
+    def _connection(self):
+        """
+        A conexão da própria ``db.session`` (o decorator roda antes da rota, com a
+        sessão ainda sem transação), com commit logo após a checagem para os locks
+        não ficarem presos à rota. Se a sessão já estiver em transação, uma conexão
+        curta do pool — nunca uma por balde.
+        """
+        session = db.session
+        if session.in_transaction():
+            with db.engine.begin() as conn:
+                yield conn
+            return
+        conn = session.connection(bind_arguments={"bind": db.engine})
+        try:
+            yield conn
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def consume(self, buckets: list[Bucket], cost: float = 1) -> tuple[bool, float]:
+        buckets = sorted(buckets, key=lambda b: b[0])
+        keys = [key for key, _ in buckets]
+        limits = dict(buckets)
+        with self._connection() as conn:
+            conn.execute(self._INSERT_SQL, {"keys": keys, "capacities": [limits[k].capacity for k in keys]})
+            rows = conn.execute(self._LOCK_SQL, {"keys": keys}).all()
+            levels = [
+                min(limits[key].capacity, float(tokens) + float(elapsed) * limits[key].rate)
+                for key, tokens, elapsed, _ in rows
+            ]
+            checked = [(key, limits[key]) for key, *_ in rows]
+            allowed, retry_after = _settle(checked, levels, cost)
+            conn.execute(self._UPDATE_SQL, {
+                "keys": [key for key, _ in checked],
+                "tokens": [tokens - cost if allowed else tokens for tokens in levels],
+                "allowed": [tokens >= cost for tokens in levels],
+                "now": rows[0][3],
+            })
+            if random.random() < 0.001:
+                conn.execute(self._PRUNE_SQL, {"age": RATE_LIMIT_PRUNE_AFTER_SECONDS})
+        return allowed, retry_after
+
+
+_memory_store = MemoryStore()
+_postgres_store = PostgresStore()
+
+
+def get_store():
+    name = current_app.config.get("RATE_LIMIT_STORE", RATE_LIMIT_STORE)
+    return _postgres_store if name == "postgres" else _memory_store
+
+
+# ---------------------- Chaves ----------------------
+
+def client_ip() -> str:
+    hops = current_app.config.get("RATE_LIMIT_PROXY_HOPS", RATE_LIMIT_PROXY_HOPS)
+    if hops <= 0:
+        return request.remote_addr or "-"
+    # X-Forwarded-For: o último proxy confiável acrescenta o IP de quem o chamou
+    route = [ip.strip() for ip in request.access_route if ip.strip()]
+    if not route:
+        return request.remote_addr or "-"
+    return route[-hops] if len(route) >= hops else route[0]
+
+
+def account_key() -> Optional[str]:
+    """Usuário do JWT (se houver) ou o e-mail informado no corpo."""
+    try:
+        identity = verify_identity(optional=True)
+    except Exception:
+        identity = None
+    if identity:
+        return f"user:{identity}"
+    email = ((request.get_json(silent=True) or {}).get("email") or "").strip().lower()
+    return f"email:{email}" if email else None
+
+
+def target_key() -> Optional[str]:
+    if not request.view_args:
+        return None
+    return ",".join(str(v) for _, v in sorted(request.view_args.items()))
+
+
+def body_field(name: str) -> KeyFunc:
+    """Usa um campo do JSON como chave (ex.: ``fundraiser_id`` das denúncias)."""
+    def _key() -> Optional[str]:
+        value = (request.get_json(silent=True) or {}).get(name)
+        if value is None:
+            return None
+        return str(value).strip() or None
+    return _key
+
+
+_DEFAULT_KEYS: dict[str, KeyFunc] = {"ip": client_ip, "account": account_key, "target": target_key}
+
+
+# ---------------------- Decorator ----------------------
+
+def _resolve(name: str, dimension: str, arg: LimitArg) -> Optional[tuple[Limit, KeyFunc]]:
+    spec, key_fn = (arg if isinstance(arg, tuple) else (arg, _DEFAULT_KEYS[dimension]))
+    spec = os.getenv(f"RATE_LIMIT_{name.upper()}_{dimension.upper()}", spec or "")
+    if not spec or spec.lower() == "off":
+        return None
+    return Limit.parse(spec), key_fn
+
+
+def bucket_key(name: str, dimension: str, value: str) -> str:
+    if len(value) > _MAX_KEY_VALUE:
+        value = "sha256:" + hashlib.sha256(value.encode("utf-8")).hexdigest()
+    return f"{name}:{dimension}:{value}"
+
+
+def _too_many(retry_after: float):
+    seconds = max(int(math.ceil(retry_after)), 1)
+    resp = jsonify({
+        "error": "rate_limited",
+        "message": "Muitas requisições. Tente novamente em instantes.",
+        "retry_after": seconds,
+    })
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(seconds)
+    return resp
+
+
+def rate_limit(name: str, *, ip: LimitArg = None, account: LimitArg = None, target: LimitArg = None):
+    """
+    Aplica os limites ao endpoint. Cada dimensão aceita ``"N/período"`` ou
+    ``("N/período", função_de_chave)``; dimensões sem chave na requisição
+    (ex.: login sem e-mail) são ignoradas.
+    """
+    rules = {
+        dimension: _resolve(name, dimension, arg)
+        for dimension, arg in (("ip", ip), ("account", account), ("target", target))
+    }
+    rules = {d: r for d, r in rules.items() if r}
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not rules or not current_app.config.get("RATE_LIMIT_ENABLED", RATE_LIMIT_ENABLED):
+                return fn(*args, **kwargs)
+
+            buckets = []
+            for dimension, (limit, key_fn) in rules.items():
+                key = key_fn()
+                if key:
+                    buckets.append((bucket_key(name, dimension, key), limit))
+            if not buckets:
+                return fn(*args, **kwargs)
+            try:
+                allowed, retry_after = get_store().consume(buckets)
+            except Exception as exc:
+                logger.warning("Rate limit indisponível (%s): %s", name, exc)
+                return fn(*args, **kwargs)
+            if not allowed:
+                logger.info("Rate limit excedido em %s (ip=%s)", name, client_ip())
+                return _too_many(retry_after)
+            return fn(*args, **kwargs)
+
+        wrapper.rate_limit_rules = rules
+        return wrapper
+    return decorator
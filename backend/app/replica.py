@@ -0,0 +1,236 @@
+"""
+Leituras em réplica (opcional) para rotas marcadas com ``@read_only``.
+
+- REPLICA_DATABASE_URL (ou REPLICA_DATABASE_URL_FILE) vira o bind ``replica``
+  do Flask-SQLAlchemy, com as mesmas opções de pool da engine principal;
+- ``RoutingSession.get_bind`` manda a sessão inteira da requisição para a
+  réplica quando a rota é ``@read_only``. Fora de requisição (workers,
+  scripts) e em qualquer outra rota, tudo continua no primário;
+- read-your-writes: quando um usuário autenticado grava no banco, a mesma
+  transação registra a hora em ``replica_write_marks`` (primário); as leituras
+  ``@read_only`` desse usuário ficam no primário por REPLICA_STICKY_SECONDS.
+  A marca fica no banco, não em cookie (o frontend chama a API de outra origem
+  sem credenciais) nem na memória do processo: vale para qualquer
+  worker/instância. Custa uma consulta por chave primária no primário por
+  leitura autenticada, feita pela própria sessão da requisição (se a leitura for
+  para a réplica, a transação no primário é encerrada logo em seguida); leituras
+  anônimas vão direto para a réplica. Marca e consulta aparecem na
+  instrumentação de SQL, fora do orçamento da rota (``sql_budget_exempt``);
+- o atraso da réplica é medido por uma thread de fundo de cada processo a cada
+  REPLICA_LAG_CHECK_SECONDS (gauge ``db_replica_lag_seconds``) — a requisição só
+  lê o último resultado, nunca espera conexão com a réplica. Acima de
+  REPLICA_MAX_LAG_SECONDS, se a réplica não responder ou antes da primeira
+  medição, as leituras ficam no primário.
+
+Teste local com duas instâncias: qualquer segundo Postgres com o mesmo schema
+serve — sem replicação configurada o atraso é reportado como 0.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session as _FlaskSession
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+
+# Sem import de .extensions no topo: ela importa este módulo (RoutingSession)
+from .metrics import DB_READ_ROUTING, DB_REPLICA_LAG
+
+REPLICA_BIND_KEY = "replica"
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+_ATTR = "_db_read_only"
+_TARGET = "_db_read_target"
+
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_is_in_recovery() IS NOT TRUE"
+    " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_MARK_SQL = text(
+    "INSERT INTO replica_write_marks (user_id, written_at) VALUES (:user_id, :written_at)"
+    " ON CONFLICT (user_id) DO UPDATE SET written_at = excluded.written_at"
+)
+
+_probe_lock = threading.Lock()
+_probe_pid: Optional[int] = None
+_replica_healthy = False
+_installed = False
+
+
+def read_only(fn):
+    """A rota só lê: pode ser atendida pela réplica. Use abaixo dos outros decorators."""
+    setattr(fn, _ATTR, True)
+    return fn
+
+
+def replica_url() -> Optional[str]:
+    path = os.getenv("REPLICA_DATABASE_URL_FILE")
+    if path and Path(path).exists():
+        return Path(path).read_text().strip() or None
+    return os.getenv("REPLICA_DATABASE_URL") or None
+
+
+class RoutingSession(_FlaskSession):
+    """Sessão do Flask-SQLAlchemy que usa o bind ``replica`` nas rotas ``@read_only``."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get(_TARGET) == "replica":
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+# ---------------------- Atraso da réplica ----------------------
+
+def check_replica_lag(engine) -> Optional[float]:
+    """Consulta o atraso (s) na réplica; None se ela não respondeu."""
+    global _replica_healthy
+    try:
+        with engine.connect() as conn:
+            lag = float(conn.execute(_LAG_SQL).scalar() or 0)
+    except Exception as exc:
+        from .extensions import logger
+
+        logger.warning("Réplica indisponível: %s", exc)
+        _replica_healthy = False
+        DB_REPLICA_LAG.set(-1)
+        return None
+    _replica_healthy = lag <= REPLICA_MAX_LAG_SECONDS
+    DB_REPLICA_LAG.set(lag)
+    return lag
+
+
+def _probe_loop(engine) -> None:
+    while True:
+        started = time.monotonic()
+        try:
+            check_replica_lag(engine)
+        except Exception:  # a thread não pode morrer: sem medição a réplica ficaria de fora
+            from .extensions import logger
+
+            logger.exception("Falha ao medir o atraso da réplica")
+        time.sleep(max(REPLICA_LAG_CHECK_SECONDS - (time.monotonic() - started), 0.1))
+
+
+def _replica_usable(engine) -> bool:
+    """Último resultado da thread de medição (iniciada aqui, uma por processo: threads não sobrevivem ao fork)."""
+    global _probe_pid, _replica_healthy
+    if _probe_pid != os.getpid():
+        with _probe_lock:
+            if _probe_pid != os.getpid():
+                _replica_healthy = False  # herdado do master: vale só depois da primeira medição
+                threading.Thread(target=_probe_loop, args=(engine,), name="replica-lag", daemon=True).start()
+                _probe_pid = os.getpid()
+    return _replica_healthy
+
+
+# ---------------------- Read-your-writes ----------------------
+
+def _request_user_id():
+    """user_id do JWT, se houver. Token inválido/expirado: anônimo aqui, a rota decide."""
+    from .decorators import verify_identity
+
+    try:
+        return verify_identity(optional=True)
+    except Exception:
+        return None
+
+
+def _wrote_recently(user_id) -> bool:
+    """Consulta pela sessão da requisição (ainda no primário): mesma conexão que a rota usaria."""
+    from .extensions import db, logger
+    from .models import ReplicaWriteMark
+    from .sql_instrumentation import BUDGET_EXEMPT
+
+    since = datetime.utcnow() - timedelta(seconds=REPLICA_STICKY_SECONDS)
+    try:
+        return db.session.execute(
+            select(ReplicaWriteMark.user_id).where(
+                ReplicaWriteMark.user_id == user_id, ReplicaWriteMark.written_at > since
+            ),
+            execution_options={BUDGET_EXEMPT: True},
+        ).first() is not None
+    except Exception as exc:
+        # Sem a tabela (create_db.py não rodou) ou primário instável: na dúvida, primário
+        db.session.rollback()
+        logger.warning("Falha ao consultar replica_write_marks: %s", exc)
+        return True
+
+
+def _mark_write(session, *_args):
+    if not has_request_context() or REPLICA_STICKY_SECONDS <= 0 or g.get(_TARGET) == "replica":
+        return
+    user_id = g.get("user_id")
+    if user_id is None:
+        return
+    # Uma marca por transação (antes do autobegin get_transaction() ainda é None)
+    transaction = session.get_transaction()
+    if transaction is not None and g.get("_db_write_marked") is transaction:
+        return
+    from .extensions import db
+    from .sql_instrumentation import BUDGET_EXEMPT
+
+    # Na transação da escrita (some junto num rollback); aparece na contagem de
+    # queries, mas não pesa no orçamento da rota
+    session.execute(
+        _MARK_SQL,
+        {"user_id": str(user_id), "written_at": datetime.utcnow()},
+        bind_arguments={"bind": db.engine},
+        execution_options={BUDGET_EXEMPT: True},
+    )
+    g._db_write_marked = session.get_transaction()
+
+
+def _on_orm_execute(state):
+    # text() nunca é is_select: na dúvida conta como escrita (só custa ler do primário)
+    if not state.is_select and state.statement is not _MARK_SQL:
+        _mark_write(state.session)
+
+
+# ---------------------- Integração com o Flask ----------------------
+
+def init_replica(app) -> None:
+    """Chame depois de ``init_database``/``init_metrics`` e antes do ``db.init_app``."""
+    global _installed
+    url = replica_url()
+    app.config.setdefault("REPLICA_ENABLED", bool(url))
+    if not app.config["REPLICA_ENABLED"]:
+        return
+
+    # Binds não herdam SQLALCHEMY_ENGINE_OPTIONS: copia pool/timeouts/poolclass
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    binds.setdefault(REPLICA_BIND_KEY, {**app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}), "url": url})
+
+    if not _installed:
+        event.listen(Session, "after_flush", _mark_write)
+        event.listen(Session, "do_orm_execute", _on_orm_execute)
+        _installed = True
+
+    @app.before_request
+    def _choose_read_target():
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        if not getattr(view, _ATTR, False):
+            return
+        from .extensions import db
+
+        user_id = _request_user_id() if REPLICA_STICKY_SECONDS > 0 else None
+        if user_id is not None and _wrote_recently(user_id):
+            reason = "sticky"
+        elif not _replica_usable(db.engines[REPLICA_BIND_KEY]):
+            reason = "lagging"
+        else:
+            if user_id is not None:
+                # Encerra a transação da consulta acima: a conexão do primário volta ao pool
+                db.session.commit()
+            g._db_read_target = "replica"
+            reason = "read_only"
+        DB_READ_ROUTING.labels(g.get(_TARGET) or "primary", reason).inc()
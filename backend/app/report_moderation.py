@@ -0,0 +1,322 @@
+"""
+Moderação das denúncias de vaquinhas.
+
+- cada denúncia ganha um ``fingerprint`` (vaquinha, motivo, denunciante e janela
+  de REPORT_DEDUPE_HOURS); repetir a mesma denúncia não cria linha nova
+  (``ON CONFLICT DO NOTHING``) e só conta como duplicata no agregado;
+- ``fundraiser_report_stats`` guarda, por vaquinha e motivo, total, duplicatas e
+  primeira/última denúncia (upsert na mesma transação da denúncia);
+- os administradores recebem um digest a cada REPORT_DIGEST_MINUTES com o que
+  entrou desde o anterior (thread do ``email_worker.py``), em vez de um e-mail e
+  um webhook por denúncia. O webhook sai só na primeira denúncia de cada motivo;
+- o motivo precisa ser um de REPORT_REASONS (texto livre geraria "motivos"
+  novos à vontade e cada um contaria de novo);
+- passando de REPORT_AUTO_HIDE_THRESHOLD denunciantes distintos, a vaquinha sai
+  da área pública (``moderation_hidden_at``). Os denunciantes ficam em
+  ``fundraiser_reporters`` (vaquinha + hash do denunciante, sem motivo nem janela)
+  e o contador em ``fundraiser_report_totals``: cada denunciante novo soma 1 uma
+  vez só, e a decisão lê o contador — nunca varre ``fundraiser_reports``.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .email_queue import enqueue_email
+from .extensions import db, logger
+from .models import (
+    Fundraiser,
+    FundraiserReport,
+    FundraiserReporter,
+    FundraiserReportStat,
+    FundraiserReportTotal,
+)
+from .templating import APP_FRONTEND_URL, render
+from .utils import notify_admin_webhook
+
+ADMIN_REPORT_EMAILS = [
+    e.strip() for e in os.getenv("ADMIN_REPORT_EMAILS", "").split(",") if e.strip()
+]
+REPORT_DEDUPE_HOURS = float(os.getenv("REPORT_DEDUPE_HOURS", "24"))
+# Denunciantes distintos para ocultar a vaquinha automaticamente (0 = nunca)
+REPORT_AUTO_HIDE_THRESHOLD = int(os.getenv("REPORT_AUTO_HIDE_THRESHOLD", "25"))
+REPORT_DIGEST_MINUTES = float(os.getenv("REPORT_DIGEST_MINUTES", "15"))
+REPORT_DIGEST_MAX_ROWS = int(os.getenv("REPORT_DIGEST_MAX_ROWS", "500"))
+REPORT_DIGEST_MESSAGES = 3
+# Valores do formulário de denúncia (frontend: ReportRequest["reason"], em minúsculas)
+REPORT_REASONS = frozenset({"fraud", "inappropriate_content", "false_information", "spam", "other"})
+
+
+@dataclass
+class ReportOutcome:
+    created: bool               # False = duplicata dentro da janela
+    total: Optional[int]        # denúncias distintas da vaquinha (None em duplicatas: não lido)
+    reporters: Optional[int]    # denunciantes distintos da vaquinha (base da ocultação)
+    hidden_now: bool            # esta denúncia fez a vaquinha ser ocultada
+
+
+def report_fingerprint(fundraiser_id, reason: str, reporter: str, now: Optional[datetime] = None) -> str:
+    """Mesmo denunciante + vaquinha + motivo dentro da janela de dedupe => mesmo fingerprint."""
+    now = now or datetime.utcnow()
+    window = int(now.timestamp() // max(REPORT_DEDUPE_HOURS * 3600, 1))
+    raw = f"{fundraiser_id}|{reason}|{reporter.strip().lower()}|{window}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def reporter_hash(fundraiser_id, reporter: str) -> str:
+    """Identifica o denunciante dentro da vaquinha, independente de motivo e janela."""
+    raw = f"{fundraiser_id}|{reporter.strip().lower()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _public_url(fundraiser: Fundraiser) -> str:
+    return f"{APP_FRONTEND_URL}/p/{fundraiser.public_slug}" if fundraiser.public_slug else ""
+
+
+def record_report(
+    fundraiser: Fundraiser,
+    reason: str,
+    *,
+    reporter: str,
+    message: Optional[str] = None,
+    reporter_email: Optional[str] = None,
+) -> ReportOutcome:
+    """
+    Grava a denúncia (se não for duplicata), atualiza o agregado e aplica a
+    ocultação automática. Não faz commit — quem chama faz o commit.
+    ``reporter`` identifica o denunciante para o dedupe (e-mail ou IP) e
+    ``reason`` deve estar em REPORT_REASONS (validado na rota).
+    """
+    if reason not in REPORT_REASONS:
+        raise ValueError(f"Motivo de denúncia inválido: {reason}")
+    now = datetime.utcnow()
+    inserted = db.session.execute(
+        pg_insert(FundraiserReport.__table__)
+        .values(
+            fundraiser_id=fundraiser.id,
+            reporter_email=reporter_email,
+            reason=reason,
+            message=message,
+            fingerprint=report_fingerprint(fundraiser.id, reason, reporter, now),
+            created_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=["fingerprint"])
+        .returning(FundraiserReport.__table__.c.id)
+    ).first()
+    created = inserted is not None
+
+    T = FundraiserReportStat
+    upsert = pg_insert(T.__table__).values(
+        fundraiser_id=fundraiser.id,
+        reason=reason,
+        count=int(created),
+        duplicates=int(not created),
+        digested_count=0,
+        first_reported_at=now,
+        last_reported_at=now,
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["fundraiser_id", "reason"],
+        set_={
+            "count": T.count + upsert.excluded.count,
+            "duplicates": T.duplicates + upsert.excluded.duplicates,
+            "last_reported_at": upsert.excluded.last_reported_at,
+        },
+    ).returning(T.__table__.c.count)
+    reason_count = db.session.execute(upsert).scalar_one()
+
+    if not created:
+        return ReportOutcome(created=False, total=None, reporters=None, hidden_now=False)
+
+    # Denunciante novo nesta vaquinha? (PK (fundraiser_id, reporter_hash))
+    new_reporter = db.session.execute(
+        pg_insert(FundraiserReporter.__table__)
+        .values(fundraiser_id=fundraiser.id, reporter_hash=reporter_hash(fundraiser.id, reporter), first_reported_at=now)
+        .on_conflict_do_nothing(index_elements=["fundraiser_id", "reporter_hash"])
+        .returning(FundraiserReporter.__table__.c.fundraiser_id)
+    ).first() is not None
+
+    totals = pg_insert(FundraiserReportTotal.__table__).values(
+        fundraiser_id=fundraiser.id, count=1, reporters=int(new_reporter),
+    )
+    totals = totals.on_conflict_do_update(
+        index_elements=["fundraiser_id"],
+        set_={
+            "count": FundraiserReportTotal.count + 1,
+            "reporters": FundraiserReportTotal.reporters + totals.excluded.reporters,
+        },
+    ).returning(FundraiserReportTotal.__table__.c.count, FundraiserReportTotal.__table__.c.reporters)
+    total, reporters = db.session.execute(totals).one()
+
+    hidden_now = False
+    if new_reporter and REPORT_AUTO_HIDE_THRESHOLD > 0 and reporters >= REPORT_AUTO_HIDE_THRESHOLD:
+        # UPDATE condicional: entre denúncias simultâneas, só uma oculta (e avisa)
+        hidden_now = db.session.query(Fundraiser).filter(
+            Fundraiser.id == fundraiser.id,
+            Fundraiser.moderation_hidden_at.is_(None),
+        ).update({Fundraiser.moderation_hidden_at: now}, synchronize_session=False) == 1
+
+    if reason_count == 1:
+        notify_admin_webhook(
+            "/webhooks/fundraiser-reported",
+            {
+                "fundraiser_id": str(fundraiser.id),
+                "reason": reason,
+                "message": message,
+                "reporter_email": reporter_email,
+                "reported_at": now.isoformat(),
+                "total_reports": int(total),
+                "distinct_reporters": int(reporters),
+            },
+        )
+    if hidden_now:
+        logger.warning("Vaquinha %s ocultada automaticamente após %s denunciantes distintos", fundraiser.id, reporters)
+        notify_admin_webhook(
+            "/webhooks/fundraiser-auto-hidden",
+            {
+                "fundraiser_id": str(fundraiser.id),
+                "total_reports": int(total),
+                "distinct_reporters": int(reporters),
+                "hidden_at": now.isoformat(),
+            },
+        )
+        set_committed_value(fundraiser, "moderation_hidden_at", now)
+        if ADMIN_REPORT_EMAILS:
+            items = _digest_items({fundraiser.id: T.query.filter(T.fundraiser_id == fundraiser.id).all()})
+            enqueue_email(
+                ADMIN_REPORT_EMAILS,
+                f"[VELÓRIO SOLIDÁRIO] Vaquinha ocultada por denúncias: {fundraiser.title}",
+                render("emails/fundraiser_report_digest.html", items=items, auto_hidden=True, generated_at=now),
+                tag="fundraiser_auto_hidden",
+            )
+
+    return ReportOutcome(created=True, total=int(total), reporters=int(reporters), hidden_now=hidden_now)
+
+
+def _recent_messages(fundraiser_ids) -> dict:
+    """Até REPORT_DIGEST_MESSAGES mensagens mais recentes por vaquinha, numa consulta só."""
+    rn = func.row_number().over(
+        partition_by=FundraiserReport.fundraiser_id,
+        order_by=FundraiserReport.created_at.desc(),
+    ).label("rn")
+    sub = (
+        db.session.query(
+            FundraiserReport.fundraiser_id, FundraiserReport.reason,
+            FundraiserReport.message, FundraiserReport.created_at, rn,
+        )
+        .filter(FundraiserReport.fundraiser_id.in_(list(fundraiser_ids)), FundraiserReport.message.isnot(None))
+        .subquery()
+    )
+    out: dict = {}
+    for fid, reason, message, created_at, _ in db.session.query(sub).filter(sub.c.rn <= REPORT_DIGEST_MESSAGES):
+        out.setdefault(fid, []).append({"reason": reason, "message": message, "created_at": created_at})
+    return out
+
+
+def _digest_items(stats_by_fundraiser: dict) -> list[dict]:
+    fundraisers = {
+        f.id: f for f in Fundraiser.query.options(
+            load_only(Fundraiser.id, Fundraiser.title, Fundraiser.public_slug, Fundraiser.moderation_hidden_at)
+        ).filter(Fundraiser.id.in_(list(stats_by_fundraiser)))
+    }
+    messages = _recent_messages(stats_by_fundraiser)
+    items = []
+    for fid, stats in stats_by_fundraiser.items():
+        f = fundraisers.get(fid)
+        if f is None:
+            continue
+        reasons = sorted(
+            ({
+                "reason": s.reason,
+                "count": s.count,
+                "new": max(s.count - s.digested_count, 0),
+                "duplicates": s.duplicates,
+            } for s in stats),
+            key=lambda r: (-r["new"], -r["count"]),
+        )
+        items.append({
+            "fundraiser_id": f.id,
+            "fundraiser_title": (f.title or "").strip(),
+            "public_url": _public_url(f),
+            "hidden_at": f.moderation_hidden_at,
+            "total": sum(r["count"] for r in reasons),
+            "new": sum(r["new"] for r in reasons),
+            "duplicates": sum(r["duplicates"] for r in reasons),
+            "first_reported_at": min(s.first_reported_at for s in stats),
+            "last_reported_at": max(s.last_reported_at for s in stats),
+            "reasons": reasons,
+            "messages": messages.get(fid, []),
+        })
+    items.sort(key=lambda i: (-i["new"], -i["total"]))
+    return items
+
+
+def send_report_digest(limit: int = REPORT_DIGEST_MAX_ROWS) -> int:
+    """
+    Enfileira um digest com as vaquinhas que receberam denúncias desde o último.
+    As linhas do agregado são travadas (SKIP LOCKED) até o commit: com vários
+    workers, cada denúncia entra em um único digest. Retorna quantas linhas entraram.
+    """
+    if not ADMIN_REPORT_EMAILS:
+        return 0
+    T = FundraiserReportStat
+    pending = (
+        db.session.query(T.fundraiser_id)
+        .filter(T.count > T.digested_count)
+        .order_by(T.last_reported_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not pending:
+        db.session.rollback()
+        return 0
+
+    fids = {fid for (fid,) in pending}
+    stats_by_fundraiser: dict = {}
+    for s in T.query.filter(T.fundraiser_id.in_(list(fids))).with_for_update(skip_locked=True):
+        stats_by_fundraiser.setdefault(s.fundraiser_id, []).append(s)
+
+    now = datetime.utcnow()
+    items = _digest_items(stats_by_fundraiser)
+    if items:
+        new_total = sum(i["new"] for i in items)
+        enqueue_email(
+            ADMIN_REPORT_EMAILS,
+            f"[VELÓRIO SOLIDÁRIO] {new_total} nova(s) denúncia(s) em {len(items)} vaquinha(s)",
+            render("emails/fundraiser_report_digest.html", items=items, auto_hidden=False, generated_at=now),
+            tag="fundraiser_report_digest",
+        )
+    rows = 0
+    for stats in stats_by_fundraiser.values():
+        for s in stats:
+            rows += int(s.count > s.digested_count)
+            s.digested_count = s.count
+    db.session.commit()
+    return rows
+
+
+def run_digest_loop(app, *, stop: threading.Event, interval_minutes: float = REPORT_DIGEST_MINUTES) -> None:
+    """Thread periódica do digest (ver ``email_worker.py``)."""
+    if interval_minutes <= 0:
+        return
+    with app.app_context():
+        while not stop.wait(interval_minutes * 60):
+            try:
+                n = send_report_digest()
+                if n:
+                    logger.info("Digest de denúncias enfileirado (%s linha(s) do agregado)", n)
+            except Exception:
+                logger.exception("Falha ao montar o digest de denúncias")
+                db.session.rollback()
+            finally:
+                db.session.remove()
@@ -0,0 +1,299 @@
+"""
+Retenção de dados: expurgo em lotes das tabelas que só crescem.
+
+Cada ``RetentionPolicy`` diz qual tabela limpar, a coluna de corte (indexada) e
+o critério. A limpeza roda em lotes pequenos, cada um na sua transação curta::
+
+    DELETE FROM t WHERE id IN (SELECT id FROM t WHERE ... LIMIT n FOR UPDATE SKIP LOCKED)
+
+com ``lock_timeout``/``statement_timeout`` locais à transação. Linhas travadas
+por uma requisição são puladas (ficam para a próxima rodada) e um lote que não
+consegue lock em ``RETENTION_LOCK_TIMEOUT_MS`` encerra a política sem esperar.
+Entre lotes há uma pausa para não disputar I/O/replicação com o tráfego.
+
+Rodadas: ``scripts/purge_expired.py`` (cron) ou a thread periódica do
+``email_worker.py`` (RETENTION_INTERVAL_MINUTES). Um advisory lock no Postgres
+garante uma única rodada por vez entre todos os processos.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, exists, func, select, text
+from sqlalchemy.exc import DBAPIError
+
+from .extensions import db, logger
+from .models import (
+    EmailOutbox,
+    EmailVerification,
+    FundraiserReport,
+    LegalAcceptance,
+    LegalAcceptanceLatest,
+    OutboxStatus,
+    PasswordReset,
+    RateLimitBucket,
+    ReplicaWriteMark,
+    WebhookOutbox,
+)
+
+BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+BATCH_PAUSE_SECONDS = int(os.getenv("RETENTION_BATCH_PAUSE_MS", "50")) / 1000
+LOCK_TIMEOUT_MS = int(os.getenv("RETENTION_LOCK_TIMEOUT_MS", "2000"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("RETENTION_STATEMENT_TIMEOUT_MS", "15000"))
+# Orçamento de tempo de uma rodada inteira; o que sobrar fica para a próxima
+MAX_RUN_SECONDS = float(os.getenv("RETENTION_MAX_SECONDS", "300"))
+INTERVAL_MINUTES = float(os.getenv("RETENTION_INTERVAL_MINUTES", "60"))
+
+ADVISORY_LOCK_ID = 0x7265_7465  # "rete"
+
+
+def _days(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    ``condition(cutoff)`` devolve o WHERE das linhas expiradas; ``cutoff`` é
+    ``agora - days`` (UTC, naive). ``days <= 0`` desliga a política.
+    """
+    name: str
+    model: type
+    column: str
+    days: int
+    condition: Callable[[datetime], object]
+
+    @property
+    def enabled(self) -> bool:
+        return self.days > 0
+
+    def cutoff(self, now: datetime) -> datetime:
+        return now - timedelta(days=self.days)
+
+
+@dataclass
+class RetentionResult:
+    policy: str
+    deleted: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    stopped: Optional[str] = None   # motivo de parada antes de esgotar (lock_timeout, budget...)
+
+    def as_dict(self) -> dict:
+        return {
+            "policy": self.policy,
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "stopped": self.stopped,
+        }
+
+
+def _acceptance_is_latest():
+    """O aceite ainda é o vigente do usuário (nunca é expurgado)."""
+    return exists().where(and_(
+        LegalAcceptanceLatest.user_id == LegalAcceptance.user_id,
+        LegalAcceptanceLatest.doc_key == LegalAcceptance.doc_key,
+        LegalAcceptanceLatest.version == LegalAcceptance.version,
+    ))
+
+
+def default_policies() -> list[RetentionPolicy]:
+    token_days = _days("RETENTION_TOKEN_GRACE_DAYS", 7)
+    outbox_days = _days("RETENTION_OUTBOX_DAYS", 30)
+    done = (OutboxStatus.SENT, OutboxStatus.FAILED)
+    return [
+        # Tokens usados ou não: depois de expirar + carência, não servem para nada
+        RetentionPolicy(
+            "email_verifications", EmailVerification, "expires_at", token_days,
+            lambda cutoff: EmailVerification.expires_at < cutoff,
+        ),
+        RetentionPolicy(
+            "password_resets", PasswordReset, "expires_at", token_days,
+            lambda cutoff: PasswordReset.expires_at < cutoff,
+        ),
+        RetentionPolicy(
+            "fundraiser_reports", FundraiserReport, "created_at", _days("RETENTION_REPORT_DAYS", 365),
+            lambda cutoff: FundraiserReport.created_at < cutoff,
+        ),
+        # Histórico de aceites: o aceite vigente (legal_acceptance_latest) é preservado
+        RetentionPolicy(
+            "legal_acceptances", LegalAcceptance, "accepted_at", _days("RETENTION_LEGAL_ACCEPTANCE_DAYS", 1825),
+            lambda cutoff: and_(LegalAcceptance.accepted_at < cutoff, ~_acceptance_is_latest()),
+        ),
+        RetentionPolicy(
+            "email_outbox", EmailOutbox, "created_at", outbox_days,
+            lambda cutoff: and_(EmailOutbox.created_at < cutoff, EmailOutbox.status.in_(done)),
+        ),
+        RetentionPolicy(
+            "webhook_outbox", WebhookOutbox, "created_at", outbox_days,
+            lambda cutoff: and_(WebhookOutbox.created_at < cutoff, WebhookOutbox.status.in_(done)),
+        ),
+        # Balde parado há mais de um dia já estaria cheio de novo
+        RetentionPolicy(
+            "rate_limit_buckets", RateLimitBucket, "updated_at", _days("RETENTION_RATE_LIMIT_DAYS", 1),
+            lambda cutoff: RateLimitBucket.updated_at < cutoff.replace(tzinfo=timezone.utc),
+        ),
+        # Marca de escrita só vale por REPLICA_STICKY_SECONDS
+        RetentionPolicy(
+            "replica_write_marks", ReplicaWriteMark, "written_at", _days("RETENTION_REPLICA_MARK_DAYS", 1),
+            lambda cutoff: ReplicaWriteMark.written_at < cutoff,
+        ),
+    ]
+
+
+def _is_postgres(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _expired_ids(policy: RetentionPolicy, cutoff: datetime, limit: int):
+    pk = policy.model.__mapper__.primary_key[0]
+    return (
+        select(pk)
+        .where(policy.condition(cutoff))
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _delete_batch(engine, policy: RetentionPolicy, cutoff: datetime, limit: int) -> int:
+    pk = policy.model.__mapper__.primary_key[0]
+    with engine.begin() as conn:
+        if _is_postgres(engine):
+            conn.execute(
+                text("SELECT set_config('lock_timeout', :lt, true), set_config('statement_timeout', :st, true)"),
+                {"lt": f"{LOCK_TIMEOUT_MS}ms", "st": f"{STATEMENT_TIMEOUT_MS}ms"},
+            )
+        result = conn.execute(
+            delete(policy.model.__table__).where(pk.in_(_expired_ids(policy, cutoff, limit)))
+        )
+        return result.rowcount or 0
+
+
+def count_expired(policy: RetentionPolicy, now: Optional[datetime] = None) -> int:
+    """Quantas linhas a política removeria agora (usado no --dry-run)."""
+    cutoff = policy.cutoff(now or datetime.utcnow())
+    with db.engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(policy.model.__table__).where(policy.condition(cutoff))
+        ).scalar_one()
+
+
+def purge(
+    policy: RetentionPolicy,
+    *,
+    batch_size: int = BATCH_SIZE,
+    deadline: Optional[float] = None,
+    now: Optional[datetime] = None,
+) -> RetentionResult:
+    """Apaga as linhas expiradas da política, lote a lote, até esgotar ou estourar ``deadline``."""
+    result = RetentionResult(policy.name)
+    started = time.perf_counter()
+    cutoff = policy.cutoff(now or datetime.utcnow())
+    engine = db.engine
+
+    while True:
+        if deadline is not None and time.perf_counter() >= deadline:
+            result.stopped = "budget"
+            break
+        try:
+            n = _delete_batch(engine, policy, cutoff, batch_size)
+        except DBAPIError as exc:
+            # lock_timeout / statement_timeout: desiste desta política nesta rodada
+            result.stopped = type(getattr(exc, "orig", exc)).__name__
+            logger.warning("Retenção %s interrompida: %s", policy.name, exc.orig or exc)
+            break
+        result.batches += 1
+        result.deleted += n
+        if n < batch_size:
+            break
+        time.sleep(BATCH_PAUSE_SECONDS)
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _try_lock(conn) -> bool:
+    return bool(conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar())
+
+
+def run_retention(
+    policies: Optional[list[RetentionPolicy]] = None,
+    *,
+    batch_size: int = BATCH_SIZE,
+    max_seconds: float = MAX_RUN_SECONDS,
+) -> Optional[list[RetentionResult]]:
+    """
+    Roda todas as políticas habilitadas e loga o total removido e o tempo de cada uma.
+    Retorna None se outra rodada já estiver em andamento (advisory lock ocupado).
+    """
+    policies = [p for p in (policies or default_policies()) if p.enabled]
+    engine = db.engine
+    lock_conn = engine.connect() if _is_postgres(engine) else None
+    try:
+        if lock_conn is not None and not _try_lock(lock_conn):
+            logger.info("Retenção já em andamento em outro processo; pulando")
+            return None
+
+        deadline = time.perf_counter() + max_seconds if max_seconds > 0 else None
+        now = datetime.utcnow()
+        results = []
+        for policy in policies:
+            res = purge(policy, batch_size=batch_size, deadline=deadline, now=now)
+            results.append(res)
+            logger.info(
+                "Retenção %s: %s linha(s) removida(s) em %s lote(s), %.2fs%s",
+                res.policy, res.deleted, res.batches, res.seconds,
+                f" (parou: {res.stopped})" if res.stopped else "",
+            )
+        return results
+    finally:
+        if lock_conn is not None:
+            try:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+            finally:
+                lock_conn.close()
+
+
+def index_statements(policies: Optional[list[RetentionPolicy]] = None) -> list[str]:
+    """
+    ``CREATE INDEX CONCURRENTLY IF NOT EXISTS`` das colunas de corte, para bancos
+    criados antes dos índices existirem nos models (``create_all`` não os adiciona).
+    """
+    stmts = []
+    for policy in policies or default_policies():
+        table = policy.model.__table__
+        for idx in table.indexes:
+            if [c.name for c in idx.columns] == [policy.column]:
+                stmts.append(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {idx.name} ON {table.name} ({policy.column})"
+                )
+    return stmts
+
+
+def ensure_indexes(policies: Optional[list[RetentionPolicy]] = None) -> None:
+    """Cria os índices sem bloquear escrita (CONCURRENTLY exige autocommit)."""
+    if not _is_postgres(db.engine):
+        return
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for stmt in index_statements(policies):
+            conn.execute(text(stmt))
+
+
+def run_retention_loop(app, *, stop: threading.Event, interval_minutes: float = INTERVAL_MINUTES) -> None:
+    """Thread periódica (ver ``email_worker.py``); a primeira rodada espera um intervalo."""
+    if interval_minutes <= 0:
+        return
+    with app.app_context():
+        while not stop.wait(interval_minutes * 60):
+            try:
+                run_retention()
+            except Exception:
+                logger.exception("Falha na rodada de retenção")
+            finally:
+                db.session.remove()
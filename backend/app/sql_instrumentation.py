@@ -0,0 +1,186 @@
+"""
+Instrumentação de SQL por requisição.
+
+- conta as queries e o tempo gasto no banco em cada requisição; com
+  SQL_DEBUG_HEADERS=true (ou em debug) devolve nos cabeçalhos ``X-DB-Queries`` e
+  ``Server-Timing`` (aparece no DevTools). Desligado por padrão: em produção
+  exporia contagem de queries e tempo de banco a qualquer cliente;
+- detecta o mesmo SQL executado várias vezes na mesma requisição (padrão N+1 de
+  lazy load dentro de loop) e loga o statement com a contagem;
+- orçamento de queries por endpoint com ``@query_budget(n)``; ao estourar,
+  SQL_BUDGET_MODE decide: ``off`` (ignora), ``warn`` (loga) ou ``raise``
+  (erro 500 — útil em testes/CI). Queries de infraestrutura que a rota não
+  controla (marca de read-your-writes, ``set_config`` dos timeouts) passam
+  ``execution_options(sql_budget_exempt=True)``: entram na contagem e no tempo,
+  mas não no orçamento;
+- SQL_RAISELOAD=true faz qualquer lazy load de relacionamento levantar erro
+  durante a requisição (para uso em dev); rotas que dependem de lazy load
+  podem ser liberadas com ``@allow_lazy_load``.
+
+Variáveis: SQL_INSTRUMENTATION, SQL_DEBUG_HEADERS, SQL_BUDGET_MODE,
+SQL_DEFAULT_QUERY_BUDGET, SQL_REPEAT_THRESHOLD, SQL_RAISELOAD.
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .extensions import logger
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() == "true"
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "false").lower() == "true"
+SQL_BUDGET_MODE = os.getenv("SQL_BUDGET_MODE", "warn").lower()
+SQL_DEFAULT_QUERY_BUDGET = int(os.getenv("SQL_DEFAULT_QUERY_BUDGET", "0"))  # 0 = sem limite
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "3"))
+SQL_RAISELOAD = os.getenv("SQL_RAISELOAD", "false").lower() == "true"
+
+# Opção de execução: a query conta, mas fica fora do orçamento da rota
+BUDGET_EXEMPT = "sql_budget_exempt"
+
+_BUDGET_ATTR = "_sql_query_budget"
+_ALLOW_LAZY_ATTR = "_sql_allow_lazy_load"
+_installed = False
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class LazyLoadNotAllowed(RuntimeError):
+    pass
+
+
+class _RequestStats:
+    __slots__ = ("count", "exempt", "db_time", "statements", "_started")
+
+    def __init__(self):
+        self.count = 0
+        self.exempt = 0
+        self.db_time = 0.0
+        self.statements: Counter[str] = Counter()
+        self._started: list[float] = []
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def query_budget(max_queries: int):
+    """Define o máximo de queries esperado para a rota (ver SQL_BUDGET_MODE)."""
+    def decorator(fn):
+        setattr(fn, _BUDGET_ATTR, max_queries)
+        return fn
+    return decorator
+
+
+def allow_lazy_load(fn):
+    """Libera lazy load de relacionamentos nesta rota mesmo com SQL_RAISELOAD ligado."""
+    setattr(fn, _ALLOW_LAZY_ATTR, True)
+    return fn
+
+
+def current_stats() -> _RequestStats | None:
+    if not has_request_context():
+        return None
+    return g.get("_sql_stats")
+
+
+def _view_attr(name: str, default=None):
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(view, name, default) if view else default
+
+
+# ---------------------- Eventos do SQLAlchemy ----------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is not None:
+        stats._started.append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    if stats is None or not stats._started:
+        return
+    stats.db_time += time.perf_counter() - stats._started.pop()
+    stats.count += 1
+    if context is not None and context.execution_options.get(BUDGET_EXEMPT):
+        stats.exempt += 1
+    stats.statements[statement] += 1
+
+
+def _do_orm_execute(orm_execute_state):
+    # is_relationship_load também vale para selectinload/subqueryload (eager, o que
+    # queremos); só o lazy load de verdade preenche lazy_loaded_from
+    if orm_execute_state.lazy_loaded_from is None or not has_request_context():
+        return
+    if g.get("_sql_stats") is None or _view_attr(_ALLOW_LAZY_ATTR, False):
+        return
+    mapper = orm_execute_state.bind_mapper
+    raise LazyLoadNotAllowed(
+        f"Lazy load de relacionamento ({mapper.class_.__name__ if mapper else '?'}) em {request.endpoint}; "
+        "use joinedload/selectinload na query ou marque a rota com @allow_lazy_load"
+    )
+
+
+# ---------------------- Integração com o Flask ----------------------
+
+def init_sql_instrumentation(app) -> None:
+    global _installed
+    app.config.setdefault("SQL_INSTRUMENTATION", SQL_INSTRUMENTATION)
+    app.config.setdefault("SQL_DEBUG_HEADERS", SQL_DEBUG_HEADERS)
+    app.config.setdefault("SQL_BUDGET_MODE", SQL_BUDGET_MODE)
+    app.config.setdefault("SQL_DEFAULT_QUERY_BUDGET", SQL_DEFAULT_QUERY_BUDGET)
+    app.config.setdefault("SQL_REPEAT_THRESHOLD", SQL_REPEAT_THRESHOLD)
+    app.config.setdefault("SQL_RAISELOAD", SQL_RAISELOAD)
+    if not app.config["SQL_INSTRUMENTATION"]:
+        return
+
+    if not _installed:
+        # Eventos globais (todas as engines); só registram algo dentro de uma requisição
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        if app.config["SQL_RAISELOAD"]:
+            event.listen(Session, "do_orm_execute", _do_orm_execute)
+        _installed = True
+
+    def _sql_stats_start():
+        g._sql_stats = _RequestStats()
+
+    # Antes de qualquer outro before_request (réplica, métricas...): o que eles
+    # consultarem no banco também entra na conta da requisição
+    app.before_request_funcs.setdefault(None, []).insert(0, _sql_stats_start)
+
+    @app.after_request
+    def _sql_stats_report(response):
+        stats: _RequestStats | None = g.pop("_sql_stats", None)
+        if stats is None:
+            return response
+
+        db_ms = stats.db_time * 1000
+        if app.config["SQL_DEBUG_HEADERS"] or app.debug:
+            response.headers["X-DB-Queries"] = str(stats.count)
+            timing = f'db;dur={db_ms:.1f};desc="{stats.count} queries"'
+            existing = response.headers.get("Server-Timing")
+            response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        for sql, n in stats.repeated(app.config["SQL_REPEAT_THRESHOLD"]):
+            logger.warning(
+                "Possível N+1 em %s: statement repetido %sx: %s",
+                request.endpoint, n, " ".join(sql.split())[:300],
+            )
+
+        mode = app.config["SQL_BUDGET_MODE"]
+        budget = _view_attr(_BUDGET_ATTR, app.config["SQL_DEFAULT_QUERY_BUDGET"])
+        counted = stats.count - stats.exempt
+        if mode != "off" and budget and counted > budget:
+            msg = f"{request.method} {request.endpoint}: {counted} queries (orçamento {budget}, {db_ms:.1f} ms)"
+            if mode == "raise":
+                raise QueryBudgetExceeded(msg)
+            logger.warning("Orçamento de queries excedido: %s", msg)
+        return response
@@ -0,0 +1,185 @@
+"""
+Tarefas de inicialização fora do caminho crítico do boot.
+
+- ``BootTimer`` mede as fases do ``create_app`` e loga um relatório único
+  (``Boot do app (web) em 180 ms: config=2ms extensions=35ms ...``);
+- ``start_deployment_tasks`` dispara, numa thread daemon, as tarefas que só
+  precisam rodar uma vez por deploy (hoje: registrar o webhook no PSP via
+  PIX-Module). Só o papel ``web`` dispara; workers e scripts nem chegam aqui.
+
+Uma vez por deploy: cada tarefa tem uma chave (nome + ``APP_RELEASE``). Sem
+``APP_RELEASE`` não há como saber o que é "o mesmo deploy": a chave passa a ser
+por boot (host + pid + hora de início do processo que carregou o app — o master
+do Gunicorn, com ``preload_app``), ou seja, cada instância executa a cada
+restart, como antes destas tarefas existirem. Um advisory lock no Postgres
+escolhe um único processo entre todos os workers/instâncias para executar; o
+resultado fica em ``deployment_tasks`` e os próximos boots apenas conferem.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from .extensions import db, logger
+from .models import DeploymentTask
+
+APP_RELEASE = os.getenv("APP_RELEASE", "")
+# Identifica este boot quando não há APP_RELEASE (import no master => igual para todos os workers)
+BOOT_ID = f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}"
+DEPLOYMENT_TASK_ATTEMPTS = int(os.getenv("DEPLOYMENT_TASK_ATTEMPTS", "5"))
+DEPLOYMENT_TASK_BACKOFF_SECONDS = float(os.getenv("DEPLOYMENT_TASK_BACKOFF_SECONDS", "5"))
+
+
+def _truthy(value: Optional[str], default: bool = False) -> bool:
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+
+class BootTimer:
+    """Cronômetro das fases do boot: ``mark("fase")`` fecha a fase atual."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (self._last - self.started) * 1000
+
+    def as_dict(self) -> dict:
+        return {"total_ms": round(self.total_ms, 1), "phases": {k: round(v, 1) for k, v in self.phases}}
+
+    def report(self, role: str) -> None:
+        phases = " ".join(f"{name}={ms:.0f}ms" for name, ms in self.phases)
+        logger.info("Boot do app (%s) em %.0f ms: %s", role, self.total_ms, phases)
+
+
+# ---------------------- Tarefas por deploy ----------------------
+
+def deployment_key(name: str, *config: str) -> str:
+    """
+    ``name@APP_RELEASE[:hash da config]`` ou, sem release definida, ``name@boot-<BOOT_ID>``.
+    A config entra no hash para que mudá-la na mesma release execute de novo.
+    """
+    if not APP_RELEASE:
+        return f"{name}@boot-{BOOT_ID}"[:128]
+    digest = hashlib.sha256("|".join(config).encode("utf-8")).hexdigest()[:16]
+    return f"{name}@{APP_RELEASE}:{digest}"[:128]
+
+
+def _lock_id(key: str) -> int:
+    # advisory lock usa bigint: 8 bytes do sha256 da chave, com sinal
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+def _already_done(key: str) -> bool:
+    row = db.session.get(DeploymentTask, key)
+    return row is not None and row.status == "done"
+
+
+def _record(key: str, status: str, attempts: int, detail: Optional[str]) -> None:
+    row = db.session.get(DeploymentTask, key) or DeploymentTask(key=key)
+    row.status = status
+    row.attempts = (row.attempts or 0) + attempts
+    row.detail = (detail or "")[:2000] or None
+    row.finished_at = datetime.utcnow()
+    db.session.add(row)
+    db.session.commit()
+
+
+def run_once_per_deployment(key: str, fn: Callable[[], Optional[str]]) -> Optional[str]:
+    """
+    Executa ``fn`` se ninguém executou com sucesso para ``key``. Retorna
+    "done", "failed", "skipped" (já feito) ou "busy" (outro processo está rodando).
+    ``fn`` devolve um detalhe opcional para registro; exceções contam como falha.
+    """
+    engine = db.engine
+    lock_conn = engine.connect() if engine.dialect.name == "postgresql" else None
+    try:
+        if lock_conn is not None and not lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {"id": _lock_id(key)}
+        ).scalar():
+            return "busy"
+        if _already_done(key):
+            return "skipped"
+
+        last_error = None
+        for attempt in range(1, DEPLOYMENT_TASK_ATTEMPTS + 1):
+            try:
+                detail = fn()
+            except Exception as exc:
+                last_error = exc
+                logger.warning("Tarefa de deploy %s falhou (tentativa %s): %s", key, attempt, exc)
+                if attempt < DEPLOYMENT_TASK_ATTEMPTS:
+                    time.sleep(DEPLOYMENT_TASK_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+                continue
+            _record(key, "done", attempt, detail)
+            return "done"
+        _record(key, "failed", DEPLOYMENT_TASK_ATTEMPTS, str(last_error))
+        return "failed"
+    finally:
+        db.session.remove()
+        if lock_conn is not None:
+            try:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _lock_id(key)})
+            finally:
+                lock_conn.close()
+
+
+def _register_psp_webhook(app) -> Optional[str]:
+    resp = app.payment_service.register_psp_webhook()
+    status = (resp or {}).get("status", "ok")
+    logger.info("Webhook PSP registrado via PIX-Module: %s", status)
+    return str(status)
+
+
+def _deployment_tasks(app) -> list[tuple[str, Callable[[], Optional[str]]]]:
+    tasks = []
+    if _truthy(os.getenv("PIX_REGISTER_WEBHOOK_ON_STARTUP"), default=True):
+        svc = app.payment_service
+        key = deployment_key(
+            "psp_webhook", svc.base_url, os.getenv("PIX_MODULE_WEBHOOK_PUBLIC_URL", ""),
+        )
+        tasks.append((key, lambda: _register_psp_webhook(app)))
+    return tasks
+
+
+def _run_deployment_tasks(app) -> None:
+    with app.app_context():
+        for key, fn in _deployment_tasks(app):
+            started = time.perf_counter()
+            try:
+                outcome = run_once_per_deployment(key, fn)
+            except Exception as exc:
+                # ex.: tabela deployment_tasks ainda não criada
+                logger.warning("Tarefa de deploy %s não executada: %s", key, exc)
+                continue
+            logger.info("Tarefa de deploy %s: %s (%.0f ms)", key, outcome, (time.perf_counter() - started) * 1000)
+
+
+def start_deployment_tasks(app) -> Optional[threading.Thread]:
+    """Dispara as tarefas de deploy em segundo plano (não bloqueia o boot)."""
+    if not _deployment_tasks(app):
+        return None
+    if not APP_RELEASE:
+        logger.warning(
+            "APP_RELEASE não definido: tarefas de deploy rodam a cada boot de cada instância "
+            "(defina APP_RELEASE=<versão/commit> para executar uma vez por deploy)"
+        )
+    t = threading.Thread(target=_run_deployment_tasks, args=(app,), name="deployment-tasks", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,337 @@
+"""
+Armazenamento de arquivos (uploads, variantes de imagem, PDFs de comprovantes).
+
+Dois "espaços":
+    public   imagens enviadas e variantes — servidas por URL pública
+    private  arquivos gerados que só saem por rota autenticada (comprovantes)
+
+STORAGE_BACKEND:
+    local   diretórios locais (UPLOAD_DIR / INVOICE_PDF_DIR). Upload direto via URL
+            assinada para a própria API (``PUT /api/uploads/direct``).
+    s3      bucket S3 compatível (AWS, MinIO...), via ``boto3``. Upload direto do
+            navegador com presigned POST; o backend só confirma e valida o objeto.
+
+As chaves são relativas ao espaço (ex.: ``<sha256>.png``, ``invoices/<sha256>.pdf``).
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+from flask import current_app, url_for
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None  # ex.: http://minio:9000
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PUBLIC_BASE_URL = os.getenv("S3_PUBLIC_BASE_URL", "")  # CDN ou http://localhost:9000/<bucket>
+S3_PUBLIC_PREFIX = os.getenv("S3_PUBLIC_PREFIX", "uploads/")
+S3_PRIVATE_PREFIX = os.getenv("S3_PRIVATE_PREFIX", "private/")
+PRESIGN_EXPIRES_SECONDS = int(os.getenv("PRESIGN_EXPIRES_SECONDS", "600"))
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectInfo:
+    __slots__ = ("key", "size", "etag")
+
+    def __init__(self, key: str, size: int, etag: Optional[str] = None):
+        self.key, self.size, self.etag = key, size, etag
+
+
+class Storage(ABC):
+    """Interface comum dos backends."""
+
+    public: bool
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        ...
+
+    @abstractmethod
+    def read_bytes(self, key: str, length: Optional[int] = None) -> bytes:
+        """Conteúdo do objeto (só os primeiros ``length`` bytes, se informado)."""
+
+    @abstractmethod
+    def download_to(self, key: str, dest: str) -> None:
+        ...
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None, *, move: bool = False) -> None:
+        """Grava o arquivo local ``path`` na chave; ``move=True`` permite consumir o arquivo."""
+
+    @abstractmethod
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def copy(self, src: str, dest: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """URL pública do objeto (``url("")`` é o prefixo comum)."""
+
+    @abstractmethod
+    def presign_upload(self, key: str, content_type: str, max_bytes: int, expires: int) -> dict:
+        """Dados para o navegador enviar o arquivo direto (``{"method", "url", "fields"...}``)."""
+
+    def download_url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        """URL temporária de download, quando o backend tem uma (S3); None = servir pela rota."""
+        return None
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Caminho no disco, quando o backend é local (permite send_file/X-Accel)."""
+        return None
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = self.url("")
+        if url and url.startswith(prefix):
+            key = url[len(prefix):]
+            return key or None
+        return None
+
+    def temp_dir(self) -> str:
+        """Diretório para arquivos temporários (no mesmo disco, quando local)."""
+        return tempfile.gettempdir()
+
+
+# ---------------------- Local ----------------------
+
+class LocalStorage(Storage):
+    def __init__(self, root: str, public_base: Optional[str], *, public: bool):
+        self.root = Path(root)
+        self.public_base = (public_base or "").rstrip("/")
+        self.public = public
+
+    def _path(self, key: str) -> Path:
+        if not key or key.startswith("/") or any(p in ("", ".", "..") for p in key.split("/")):
+            raise StorageError(f"Chave inválida: {key!r}")
+        return self.root / key
+
+    def local_path(self, key: str) -> Optional[str]:
+        return str(self._path(key))
+
+    def temp_dir(self) -> str:
+        d = self.root / ".tmp"
+        d.mkdir(parents=True, exist_ok=True)
+        return str(d)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            st = self._path(key).stat()
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(key, st.st_size)
+
+    def read_bytes(self, key: str, length: Optional[int] = None) -> bytes:
+        with open(self._path(key), "rb") as fh:
+            return fh.read(length) if length else fh.read()
+
+    def download_to(self, key: str, dest: str) -> None:
+        shutil.copyfile(self._path(key), dest)
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None, *, move: bool = False) -> None:
+        final = self._path(key)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            os.replace(path, final)
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.temp_dir())
+        os.close(fd)
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, final)
+
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.temp_dir())
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        self.put_file(key, tmp, content_type, move=True)
+
+    def copy(self, src: str, dest: str) -> None:
+        self.put_file(dest, str(self._path(src)))
+
+    def delete(self, key: str) -> None:
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def url(self, key: str) -> str:
+        return f"{self.public_base}/{key}"
+
+    def presign_upload(self, key: str, content_type: str, max_bytes: int, expires: int) -> dict:
+        token = _direct_upload_serializer().dumps({"k": key, "ct": content_type, "max": max_bytes})
+        return {
+            "method": "PUT",
+            "url": url_for("uploads.direct_upload", token=token),
+            "headers": {"Content-Type": content_type},
+            "fields": {},
+        }
+
+
+def _direct_upload_serializer() -> URLSafeTimedSerializer:
+    secret = current_app.config.get("SECRET_KEY") or current_app.config["JWT_SECRET_KEY"]
+    return URLSafeTimedSerializer(secret, salt="direct-upload")
+
+
+def load_direct_upload_token(token: str, max_age: int = PRESIGN_EXPIRES_SECONDS) -> Optional[dict]:
+    try:
+        return _direct_upload_serializer().loads(token, max_age=max_age)
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+# ---------------------- S3 compatível ----------------------
+
+class S3Storage(Storage):
+    def __init__(self, bucket: str, prefix: str, *, public: bool, public_base_url: str = ""):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError as exc:  # pragma: no cover
+            raise StorageError("STORAGE_BACKEND=s3 requer o pacote boto3") from exc
+        if not bucket:
+            raise StorageError("Defina S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public = public
+        self.public_base_url = public_base_url.rstrip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL,
+            region_name=S3_REGION,
+            aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID") or None,
+            aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY") or None,
+            config=Config(
+                signature_version="s3v4",
+                s3={"addressing_style": "path" if S3_ENDPOINT_URL else "auto"},
+                retries={"max_attempts": 3, "mode": "standard"},
+                max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20")),
+            ),
+        )
+
+    def _k(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _is_missing(self, exc) -> bool:
+        code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._k(key))
+        except ClientError as exc:
+            if self._is_missing(exc):
+                return None
+            raise
+        return ObjectInfo(key, int(head["ContentLength"]), head.get("ETag", "").strip('"') or None)
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def read_bytes(self, key: str, length: Optional[int] = None) -> bytes:
+        kwargs = {"Range": f"bytes=0-{length - 1}"} if length else {}
+        obj = self.client.get_object(Bucket=self.bucket, Key=self._k(key), **kwargs)
+        return obj["Body"].read()
+
+    def download_to(self, key: str, dest: str) -> None:
+        self.client.download_file(self.bucket, self._k(key), dest)
+
+    def _extra(self, key: str, content_type: Optional[str]) -> dict:
+        extra = {"ContentType": content_type} if content_type else {}
+        if self.public and _is_content_addressed(key):
+            extra["CacheControl"] = "public, max-age=31536000, immutable"
+        return extra
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None, *, move: bool = False) -> None:
+        self.client.upload_file(path, self.bucket, self._k(key), ExtraArgs=self._extra(key, content_type))
+        if move:
+            os.unlink(path)
+
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._k(key), Body=data, **self._extra(key, content_type))
+
+    def copy(self, src: str, dest: str) -> None:
+        head = self.client.head_object(Bucket=self.bucket, Key=self._k(src))
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._k(dest),
+            CopySource={"Bucket": self.bucket, "Key": self._k(src)},
+            MetadataDirective="REPLACE",
+            **self._extra(dest, head.get("ContentType")),
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._k(key))
+
+    def url(self, key: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{self._k(key)}"
+        base = S3_ENDPOINT_URL.rstrip("/") + f"/{self.bucket}" if S3_ENDPOINT_URL else f"https://{self.bucket}.s3.amazonaws.com"
+        return f"{base}/{self._k(key)}"
+
+    def download_url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": self._k(key)}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=PRESIGN_EXPIRES_SECONDS)
+
+    def presign_upload(self, key: str, content_type: str, max_bytes: int, expires: int) -> dict:
+        # presigned POST permite impor o tamanho máximo (content-length-range) no próprio S3
+        post = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self._k(key),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+            ExpiresIn=expires,
+        )
+        return {"method": "POST", "url": post["url"], "fields": post["fields"], "headers": {}}
+
+
+def _is_content_addressed(key: str) -> bool:
+    name = key.rsplit("/", 1)[-1]
+    return len(name) > 64 and all(ch in "0123456789abcdef" for ch in name[:64]) and name[64] == "."
+
+
+# ---------------------- Acesso ----------------------
+
+def init_storage(app) -> None:
+    app.config.setdefault("STORAGE_BACKEND", STORAGE_BACKEND)
+    backend = app.config["STORAGE_BACKEND"]
+    if backend == "s3":
+        stores = {
+            "public": S3Storage(S3_BUCKET, S3_PUBLIC_PREFIX, public=True, public_base_url=S3_PUBLIC_BASE_URL),
+            "private": S3Storage(S3_BUCKET, S3_PRIVATE_PREFIX, public=False),
+        }
+    elif backend == "local":
+        stores = {
+            "public": LocalStorage(app.config["UPLOAD_DIR"], app.config.get("UPLOAD_PUBLIC_BASE", "/files"), public=True),
+            "private": LocalStorage(app.config.get("INVOICE_PDF_DIR", "/app/private"), None, public=False),
+        }
+    else:
+        raise StorageError(f"STORAGE_BACKEND desconhecido: {backend}")
+    app.extensions["storage"] = stores
+
+
+def get_storage(namespace: str = "public", app=None) -> Storage:
+    return (app or current_app).extensions["storage"][namespace]
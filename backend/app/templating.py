@@ -0,0 +1,238 @@
+"""
+Camada de templates (Jinja2) para as páginas HTML e os e-mails.
+
+- os templates ficam em ``app/templates`` e são compilados uma única vez por
+  processo (``auto_reload=False`` + cache ilimitado); com TEMPLATE_BYTECODE_CACHE_DIR
+  o bytecode compilado também é reaproveitado entre processos/reinícios;
+- a paleta (``PALETTE``) e os fragmentos estáticos (rodapé do e-mail, estilos da
+  página) são montados uma vez e expostos como globais;
+- ``render_email`` devolve (html, texto): a alternativa em texto puro é gerada
+  automaticamente a partir do HTML.
+"""
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from html import unescape
+from html.parser import HTMLParser
+from typing import Any, Optional
+
+from flask import make_response
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader, select_autoescape
+from markupsafe import Markup
+
+APP_FRONTEND_URL = os.getenv("APP_FRONTEND_URL", "http://localhost:5199")
+TEMPLATE_BYTECODE_CACHE_DIR = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR", "")
+
+PALETTE: dict[str, str] = {
+    "bg": "hsl(214 19% 94%)",
+    "card": "#ffffff",
+    "border": "hsl(214 19% 85%)",
+    "shadow": "0 8px 30px hsl(200 14% 31% / .15)",
+    "brand": "#1e90a3",
+    "brand_dark": "#186f7e",
+    "success": "hsl(147 23% 46%)",
+    "warning": "hsl(35 100% 45%)",
+    "danger": "#c0392b",
+    "muted": "hsl(200 14% 31%)",
+    "fg": "hsl(0 0% 11%)",
+}
+
+FONT_STACK = Markup("system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,'Helvetica Neue',Arial,'Noto Sans',sans-serif")
+
+
+# ---------------------- Formatação (filtros) ----------------------
+
+def mask(s: Optional[str], keep_last: int = 4) -> str:
+    if not s:
+        return "-"
+    s = re.sub(r"\s+", "", s)
+    if len(s) <= keep_last:
+        return "*" * len(s)
+    return "*" * (len(s) - keep_last) + s[-keep_last:]
+
+
+def fmt_dt_br(dt: datetime | str | None) -> str:
+    if not dt:
+        return "-"
+    if isinstance(dt, str):
+        try:
+            dt = datetime.fromisoformat(dt.replace("Z", "+00:00"))
+        except Exception:
+            return dt
+    return dt.strftime("%d/%m/%Y %H:%M")
+
+
+def brl(value: Any) -> str:
+    try:
+        n = float(value if not isinstance(value, Decimal) else float(value))
+    except Exception:
+        n = 0.0
+    s = f"{n:,.2f}"
+    return "R$ " + s.replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _clean(value: Any) -> str:
+    return (str(value) if value is not None else "").strip() or "-"
+
+
+def bank_view(bank: Any, *, masked: bool = True) -> dict[str, str]:
+    """
+    Dados bancários prontos para exibição, a partir de um ``BankAccount`` ou de um dict.
+    ``masked=True`` mascara agência/conta/documento (e-mails); ``copy_block`` sempre
+    traz os dados completos para copiar/colar.
+    """
+    get = bank.get if isinstance(bank, dict) else (lambda k: getattr(bank, k, None))
+    account_type = get("account_type") if bank else None
+    account_type = getattr(account_type, "value", account_type)
+    data = {k: _clean(get(k) if bank else None) for k in (
+        "bank_name", "bank_code", "agency", "account_number", "account_holder_name", "document_number",
+    )}
+    data["account_type"] = str(account_type).title() if account_type else "-"
+
+    copy_block = "\n".join([
+        f"Banco: {data['bank_name']} ({data['bank_code']})",
+        f"Agência: {data['agency']}",
+        f"Conta: {data['account_number']}",
+        f"Tipo: {data['account_type']}",
+        f"Titular: {data['account_holder_name']}",
+        f"Documento: {data['document_number']}",
+    ])
+    if masked:
+        for key, keep in (("agency", 2), ("account_number", 4), ("document_number", 3)):
+            if data[key] != "-":
+                data[key] = mask(data[key], keep_last=keep)
+    data["copy_block"] = copy_block
+    return data
+
+
+# ---------------------- HTML -> texto ----------------------
+
+class _TextExtractor(HTMLParser):
+    _BLOCK = {"p", "div", "tr", "h1", "h2", "h3", "h4", "li", "pre", "table", "hr"}
+    _SKIP = {"style", "script", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip = 0
+        self._href: list[Optional[str]] = []
+        self._pre = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag == "br":
+            self.parts.append("\n")
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+            if tag == "pre":
+                self._pre += 1
+        elif tag == "td":
+            self.parts.append(" ")
+        elif tag == "a":
+            self._href.append(dict(attrs).get("href"))
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+            if tag == "pre":
+                self._pre = max(self._pre - 1, 0)
+        elif tag == "a" and self._href:
+            href = self._href.pop()
+            if href and not href.startswith("mailto:") and href not in (self.parts[-1] if self.parts else ""):
+                self.parts.append(f" ({href})")
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._pre:
+            self.parts.append(data)
+        else:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+
+def html_to_text(html: str) -> str:
+    """Versão texto puro de um e-mail HTML (multipart/alternative)."""
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    text = unescape("".join(parser.parts))
+    lines = [re.sub(r"[ \t]{2,}", " ", ln).strip() for ln in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+# ---------------------- Ambiente Jinja ----------------------
+
+@lru_cache(maxsize=1)
+def get_env() -> Environment:
+    bytecode_cache = None
+    if TEMPLATE_BYTECODE_CACHE_DIR:
+        os.makedirs(TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(TEMPLATE_BYTECODE_CACHE_DIR)
+
+    env = Environment(
+        loader=PackageLoader("app", "templates"),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+        cache_size=-1,
+        bytecode_cache=bytecode_cache,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    env.filters.update(brl=brl, dt_br=fmt_dt_br, mask=mask)
+    env.globals.update(
+        c=PALETTE,
+        font_stack=FONT_STACK,
+        app_frontend_url=APP_FRONTEND_URL,
+    )
+    # Fragmento 100% estático: renderizado uma vez e injetado pronto
+    env.globals["page_style"] = Markup(env.get_template("partials/page_style.html").render())
+    return env
+
+
+@lru_cache(maxsize=2)
+def _email_footer(year: int) -> Markup:
+    """Rodapé pré-renderizado, um por ano (o © muda na virada; workers vivem meses)."""
+    return Markup(get_env().get_template("partials/email_footer.html").render(year=year))
+
+
+def render(template_name: str, **context) -> str:
+    year = datetime.utcnow().year
+    context.setdefault("year", year)
+    context.setdefault("email_footer", _email_footer(year))
+    return get_env().get_template(template_name).render(**context)
+
+
+def render_email(template_name: str, **context) -> tuple[str, str]:
+    """Renderiza um e-mail e devolve (html, texto_puro)."""
+    html = render(template_name, **context)
+    return html, html_to_text(html)
+
+
+def html_page(template_name: str, status: int = 200, **context):
+    resp = make_response(render(template_name, **context), status)
+    resp.headers["Content-Type"] = "text/html; charset=utf-8"
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+def message_page(msg: str, *, ok: bool = True, title: str = "Velório Solidário", status: Optional[int] = None):
+    """Página simples de mensagem (link inválido/expirado, confirmação etc.)."""
+    if status is None:
+        status = 200 if ok else 400
+    return html_page("pages/message.html", status=status, msg=msg, ok=ok, title=title)
+
+
+def preload_templates() -> int:
+    """Compila todos os templates antecipadamente (ex.: antes do fork dos workers)."""
+    env = get_env()
+    names = [n for n in env.list_templates() if n.endswith(".html")]
+    for name in names:
+        env.get_template(name)
+    return len(names)
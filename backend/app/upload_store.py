@@ -0,0 +1,177 @@
+"""
+Upload de imagens em streaming, com limite de tamanho e deduplicação por conteúdo.
+
+O corpo multipart é lido pelo ``FormDataParser`` do werkzeug com um
+``stream_factory`` próprio: cada bloco recebido é
+
+- conferido contra a assinatura de imagem (primeiros bytes) — não-imagens são
+  recusadas antes de o resto do arquivo chegar;
+- somado ao tamanho: passou de MAX_UPLOAD_BYTES, aborta na hora com 413
+  (inclusive em uploads sem Content-Length / chunked);
+- adicionado ao SHA-256 e gravado num arquivo temporário no mesmo disco.
+
+Ao final o temporário vai para o storage como ``<sha256>.<ext>`` (no backend
+local, um rename atômico); se a chave já existe (mesma imagem enviada de novo),
+o temporário é descartado.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "5")) * 1024 * 1024
+# Folga para boundaries/cabeçalhos do multipart e campos pequenos
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+SNIFF_BYTES = 12
+
+# formato -> extensão canônica
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp"}
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    """Extensão da imagem a partir dos primeiros bytes (jpg/png/gif/webp) ou None."""
+    for magic, ext in _SIGNATURES:
+        if head.startswith(magic):
+            return ext
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class HashingUpload:
+    """Arquivo de destino do stream_factory: valida, conta, faz hash e grava."""
+
+    def __init__(self, tmp_dir: Path, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.ext: Optional[str] = None
+        self._head = b""
+        self._sha = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        self._fh = os.fdopen(fd, "wb")
+
+    # --- interface de arquivo usada pelo werkzeug ---
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Tamanho máximo de {self.max_bytes // (1024 * 1024)}MB excedido")
+        if self.ext is None:
+            self._head += data[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self.ext = sniff_image(self._head)
+                if self.ext is None:
+                    raise BadRequest("Arquivo inválido (não é uma imagem)")
+        self._sha.update(data)
+        self._fh.write(data)
+        return len(data)
+
+    def seek(self, *args):
+        return self._fh.seek(*args)
+
+    def tell(self) -> int:
+        return self._fh.tell()
+
+    def read(self, *args):  # pragma: no cover - não usado no fluxo normal
+        raise OSError("HashingUpload é somente escrita")
+
+    def flush(self):
+        self._fh.flush()
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+    # --- pós-upload ---
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    def finalize_into(self, storage) -> tuple[str, bool]:
+        """
+        Grava o conteúdo como ``<sha256>.<ext>`` no storage (ver ``app.storage``).
+        Retorna (chave, criado_agora); se a chave já existe, só descarta o temporário.
+        """
+        self.close()
+        if self.ext is None:
+            # Arquivo menor que SNIFF_BYTES: decide com o que chegou
+            self.ext = sniff_image(self._head)
+            if self.ext is None:
+                self.discard()
+                raise BadRequest("Arquivo inválido (não é uma imagem)")
+
+        name = f"{self.sha256}.{self.ext}"
+        if storage.exists(name):
+            self.discard()
+            return name, False
+        storage.put_file(name, self.tmp_path, CONTENT_TYPES[self.ext], move=True)
+        return name, True
+
+    def discard(self):
+        self.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def hash_stream(stream, tmp_dir: Path, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = 64 * 1024) -> HashingUpload:
+    """Consome um stream binário bruto (ex.: corpo de um PUT) para um ``HashingUpload``."""
+    upload = HashingUpload(tmp_dir, max_bytes)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            upload.write(chunk)
+    except Exception:
+        upload.discard()
+        raise
+    upload.close()
+    return upload
+
+
+def parse_streaming_upload(request, tmp_dir: Path, field: str = "file", max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Lê o multipart da requisição direto para um ``HashingUpload``.
+    Retorna (upload, nome_original) — ``upload`` é None se o campo não veio.
+    Não acesse ``request.files``/``request.form`` antes: o corpo só pode ser lido uma vez.
+    """
+    if request.content_length and request.content_length > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise RequestEntityTooLarge(f"Tamanho máximo de {max_bytes // (1024 * 1024)}MB excedido")
+
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    created: list[HashingUpload] = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        upload = HashingUpload(tmp_dir, max_bytes)
+        created.append(upload)
+        return upload
+
+    parser = FormDataParser(stream_factory=stream_factory, max_content_length=None, max_form_memory_size=64 * 1024)
+    try:
+        _, _form, files = parser.parse(request.stream, request.mimetype, request.content_length, request.mimetype_params)
+    except Exception:
+        for u in created:
+            u.discard()
+        raise
+
+    file_storage = files.get(field)
+    target = file_storage.stream if file_storage is not None else None
+    for u in created:
+        if u is not target:
+            u.discard()
+    if target is None:
+        return None, None
+    return target, file_storage.filename or ""
@@ -1,86 +1,196 @@
 # app/uploads/routes.py
 import os
-import imghdr
-import secrets
-from datetime import datetime
+import shutil
+import tempfile
+import uuid
 from pathlib import Path
-from werkzeug.utils import secure_filename
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from ..decorators import auth_required
+from ..file_serving import serve_upload
+from ..image_variants import has_variants, schedule_variants
+from ..storage import PRESIGN_EXPIRES_SECONDS, LocalStorage, get_storage, load_direct_upload_token
+from ..upload_store import CONTENT_TYPES, MAX_UPLOAD_BYTES, SNIFF_BYTES, hash_stream, parse_streaming_upload, sniff_image
 
 uploads_bp = Blueprint("uploads", __name__, url_prefix="/api/uploads")
 
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
-MAX_FILE_SIZE_MB = 5
+MAX_FILE_SIZE_MB = MAX_UPLOAD_BYTES // (1024 * 1024)
+# Uploads diretos ainda não confirmados (configure expiração desse prefixo no bucket)
+INCOMING_PREFIX = ".incoming/"
 
 def _allowed_ext(filename: str) -> bool:
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     return ext in ALLOWED_EXTENSIONS
 
-def _validate_image_signature(path: Path) -> bool:
-    # Proteção básica contra uploads não-imagem (checa assinatura)
-    kind = imghdr.what(path)
-    return kind in {"jpeg", "png", "gif", "webp"}
-
 def _ensure_upload_dir() -> Path:
     base = current_app.config.get("UPLOAD_DIR", "/app/uploads")
     Path(base).mkdir(parents=True, exist_ok=True)
     return Path(base)
 
+def _upload_payload(storage, name: str, size: int, sha256: str, created: bool):
+    # Variantes (card/detail/OG) em segundo plano; até lá os payloads usam o original
+    if created or not has_variants(name, storage):
+        schedule_variants(name, storage)
+    return jsonify({
+        "url": storage.url(name),
+        "filename": name,
+        "size_bytes": size,
+        "sha256": sha256,
+        "deduplicated": not created,
+    }), 201
+
 @uploads_bp.route("/image", methods=["POST"])
-@jwt_required()
+@auth_required
 def upload_image():
     """
     Recebe multipart/form-data com campo 'file'.
-    Retorna JSON: { url, filename, size_bytes }
+    Retorna JSON: { url, filename, size_bytes, sha256, deduplicated }
+
+    O corpo é processado em streaming (ver app/upload_store.py): limite de tamanho
+    aplicado durante a leitura, assinatura checada nos primeiros bytes e o arquivo
+    salvo como <sha256>.<ext> — reenviar a mesma imagem não ocupa espaço extra.
     """
-    if "file" not in request.files:
-        return jsonify({"error": "Arquivo não enviado"}), 400
+    storage = get_storage("public")
+    try:
+        upload, original = parse_streaming_upload(request, Path(storage.temp_dir()))
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Tamanho máximo de {MAX_FILE_SIZE_MB}MB excedido"}), 413
+    except BadRequest as exc:
+        return jsonify({"error": exc.description or "Requisição inválida"}), 400
 
-    file = request.files["file"]
-    if file.filename == "":
+    if upload is None:
+        return jsonify({"error": "Arquivo não enviado"}), 400
+    if original == "":
+        upload.discard()
         return jsonify({"error": "Nenhum arquivo selecionado"}), 400
+    if not _allowed_ext(original):
+        upload.discard()
+        return jsonify({"error": "Extensão não permitida"}), 400
+
+    try:
+        safe_name, created = upload.finalize_into(storage)
+    except BadRequest as exc:
+        return jsonify({"error": exc.description}), 400
+
+    return _upload_payload(storage, safe_name, upload.size, upload.sha256, created)
+
+@uploads_bp.route("/presign", methods=["POST"])
+@auth_required
+def presign_upload():
+    """
+    Upload direto (sem passar o arquivo pela API):
+      1) POST /presign { filename, content_type, size_bytes } -> { key, upload }
+      2) o cliente envia o arquivo para upload.url (POST multipart com upload.fields
+         no S3; PUT com o corpo bruto no backend local)
+      3) POST /confirm { key } -> mesmo retorno de /image
+    """
+    data = request.get_json() or {}
+    filename = (data.get("filename") or "").strip()
+    content_type = (data.get("content_type") or "").strip().lower()
+    try:
+        size = int(data.get("size_bytes") or 0)
+    except (TypeError, ValueError):
+        size = 0
 
-    if not _allowed_ext(file.filename):
+    if not _allowed_ext(filename):
         return jsonify({"error": "Extensão não permitida"}), 400
+    if content_type not in CONTENT_TYPES.values():
+        return jsonify({"error": "Tipo de arquivo não permitido"}), 400
+    if size <= 0:
+        return jsonify({"error": "Tamanho do arquivo inválido"}), 400
+    if size > MAX_UPLOAD_BYTES:
+        return jsonify({"error": f"Tamanho máximo de {MAX_FILE_SIZE_MB}MB excedido"}), 413
+
+    ext = filename.rsplit(".", 1)[-1].lower()
+    key = f"{INCOMING_PREFIX}{get_jwt_identity()}/{uuid.uuid4().hex}.{ext}"
+    storage = get_storage("public")
+    return jsonify({
+        "key": key,
+        "upload": storage.presign_upload(key, content_type, MAX_UPLOAD_BYTES, PRESIGN_EXPIRES_SECONDS),
+        "expires_in": PRESIGN_EXPIRES_SECONDS,
+        "max_bytes": MAX_UPLOAD_BYTES,
+    }), 200
 
-    # Limite de tamanho (server-side): se tiver Content-Length, checa rápido
-    content_length = request.content_length or 0
-    if content_length and content_length > MAX_FILE_SIZE_MB * 1024 * 1024:
+@uploads_bp.route("/direct/<token>", methods=["PUT"])
+def direct_upload(token):
+    """Destino das URLs assinadas do backend local (equivalente ao PUT no bucket)."""
+    storage = get_storage("public")
+    if not isinstance(storage, LocalStorage):
+        return jsonify({"error": "Não disponível"}), 404
+    claims = load_direct_upload_token(token)
+    if not claims:
+        return jsonify({"error": "Link de upload inválido ou expirado"}), 403
+    if request.content_length and request.content_length > claims["max"]:
         return jsonify({"error": f"Tamanho máximo de {MAX_FILE_SIZE_MB}MB excedido"}), 413
 
-    # Gera nome seguro e único
-    original = secure_filename(file.filename)
-    rand = secrets.token_urlsafe(8)
-    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    ext = original.rsplit(".", 1)[-1].lower()
-    safe_name = f"{stamp}_{rand}.{ext}"
+    try:
+        upload = hash_stream(request.stream, Path(storage.temp_dir()), claims["max"])
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Tamanho máximo de {MAX_FILE_SIZE_MB}MB excedido"}), 413
+    except BadRequest as exc:
+        return jsonify({"error": exc.description}), 400
+    if upload.size == 0:
+        upload.discard()
+        return jsonify({"error": "Arquivo vazio"}), 400
 
-    upload_dir = _ensure_upload_dir()
-    full_path = upload_dir / safe_name
-    file.save(full_path)
-
-    # Valida assinatura de imagem
-    if not _validate_image_signature(full_path):
-        try:
-            full_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+    storage.put_file(claims["k"], upload.tmp_path, claims["ct"], move=True)
+    return "", 204
+
+@uploads_bp.route("/confirm", methods=["POST"])
+@auth_required
+def confirm_upload():
+    """
+    Valida um upload direto (tamanho, assinatura da imagem), move para a chave
+    definitiva <sha256>.<ext> e dispara as variantes.
+    """
+    data = request.get_json() or {}
+    key = (data.get("key") or "").strip()
+    if not key.startswith(f"{INCOMING_PREFIX}{get_jwt_identity()}/") or ".." in key:
+        return jsonify({"error": "Chave inválida"}), 400
+
+    storage = get_storage("public")
+    info = storage.stat(key)
+    if info is None:
+        return jsonify({"error": "Arquivo não encontrado"}), 404
+    if info.size > MAX_UPLOAD_BYTES:
+        storage.delete(key)
+        return jsonify({"error": f"Tamanho máximo de {MAX_FILE_SIZE_MB}MB excedido"}), 413
+
+    ext = sniff_image(storage.read_bytes(key, SNIFF_BYTES))
+    if ext is None:
+        storage.delete(key)
         return jsonify({"error": "Arquivo inválido (não é uma imagem)"}), 400
 
-    # Monta URL pública
-    public_base = current_app.config.get("UPLOAD_PUBLIC_BASE", "/files")
-    url = f"{public_base}/{safe_name}"
+    tmp_dir = tempfile.mkdtemp(dir=storage.temp_dir())
+    try:
+        source = storage.local_path(key)
+        if source is None:
+            source = os.path.join(tmp_dir, "incoming")
+            storage.download_to(key, source)
+        with open(source, "rb") as fh:
+            upload = hash_stream(fh, Path(tmp_dir), MAX_UPLOAD_BYTES)
+        upload.discard()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-    return jsonify({
-        "url": url,
-        "filename": safe_name,
-        "size_bytes": full_path.stat().st_size
-    }), 201
+    name = f"{upload.sha256}.{ext}"
+    created = not storage.exists(name)
+    if not created:
+        storage.delete(key)
+    elif storage.local_path(key):
+        storage.put_file(name, storage.local_path(key), CONTENT_TYPES[ext], move=True)
+    else:
+        storage.copy(key, name)
+        storage.delete(key)
+
+    return _upload_payload(storage, name, info.size, upload.sha256, created)
 
 # Servir os arquivos (se estiver hospedando estático pelo próprio backend)
 @uploads_bp.route("/file/<path:filename>", methods=["GET"])
 def serve_by_blueprint(filename):
     # Rota alternativa: /api/uploads/file/<filename>
     upload_dir = _ensure_upload_dir()
-    return send_from_directory(upload_dir, filename)
+    return serve_upload(str(upload_dir), filename)
@@ -1,16 +1,15 @@
 import re
 import uuid
 import os
-import requests
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-from passlib.hash import bcrypt
 from flask import current_app
-from .models import User, BankAccount
+from .models import User, BankAccount, WebhookOutbox
 from datetime import timezone
 from sqlalchemy import and_
 from app.extensions import db
+from .password_hasher import password_hasher
 
 def is_document_in_use(document_number: str, document_type: str, *, exclude_user_id: Optional[str] = None, tenant_id: Optional[str] = None) -> bool:
     if not document_number or not document_type:
@@ -45,11 +44,11 @@ def generate_slug(title: str) -> str:
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.hash(password)
+    return password_hasher.hash(password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    return bcrypt.verify(password, password_hash)
+    return password_hasher.verify(password, password_hash)
 
 
 def generate_audit_token(fundraiser_id: str, expires_in: int = 3600) -> Tuple[str, datetime]:
@@ -134,18 +133,21 @@ def iso_utc(dt):
 
 
 def notify_admin_webhook(path: str, payload: dict):
+    """
+    Enfileira um evento para o admin-backend (tabela webhook_outbox).
+    Não faz commit: o evento é confirmado junto com a transação de quem chama
+    e entregue depois pelo webhook_dispatcher.py.
+    """
     base = (os.getenv("ADMIN_BACKEND_URL") or "").rstrip("/")
     if not base:
         current_app.logger.warning("ADMIN_BACKEND_URL não definido; ignorando webhook %s", path)
-        return
-
-    url = f"{base}{path}"
-    headers = {}
-    key = (os.getenv("ADMIN_WEBHOOK_KEY") or "").strip()
-    if key:
-        headers["X-Admin-Api-Key"] = key
+        return None
 
-    try:
-        requests.post(url, json=payload, headers=headers, timeout=5)
-    except Exception as exc:
-        current_app.logger.exception("Falha ao chamar webhook %s: %s", url, exc)
\ No newline at end of file
+    event = WebhookOutbox(
+        endpoint=path,
+        payload=payload,
+        max_attempts=int(os.getenv("ADMIN_WEBHOOK_MAX_ATTEMPTS", "10")),
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(event)
+    return event
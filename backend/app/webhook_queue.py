@@ -0,0 +1,177 @@
+"""
+Entrega dos eventos da tabela ``webhook_outbox`` para o admin-backend.
+
+- conexões keep-alive (uma ``requests.Session`` com pool por processo);
+- limite de requisições simultâneas por endpoint (ADMIN_WEBHOOK_MAX_CONCURRENCY);
+- novas tentativas com backoff exponencial (ver ``app.outbox``);
+- envio em lote opcional: com ADMIN_WEBHOOK_BATCH_MAX > 1, vários eventos do mesmo
+  endpoint vão num único POST para ``<endpoint>/batch``. Se o admin-backend
+  responder 404/405 nessa rota, o endpoint volta ao envio unitário.
+
+Cada evento leva o cabeçalho ``X-Webhook-Event-Id`` para deduplicação no destino.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .extensions import db, logger
+from .metrics import outbound_call
+from .models import WebhookOutbox
+from .outbox import claim_due, mark_sent, schedule_retry
+
+ADMIN_WEBHOOK_TIMEOUT = (3.0, float(os.getenv("ADMIN_WEBHOOK_TIMEOUT_SECONDS", "10")))
+ADMIN_WEBHOOK_MAX_CONCURRENCY = int(os.getenv("ADMIN_WEBHOOK_MAX_CONCURRENCY", "4"))
+ADMIN_WEBHOOK_BATCH_MAX = int(os.getenv("ADMIN_WEBHOOK_BATCH_MAX", "1"))
+WEBHOOK_CLAIM_BATCH = int(os.getenv("WEBHOOK_CLAIM_BATCH", "50"))
+WEBHOOK_DISPATCH_THREADS = int(os.getenv("WEBHOOK_DISPATCH_THREADS", "8"))
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_endpoint_limits: dict[str, threading.BoundedSemaphore] = {}
+_batch_unsupported: set[str] = set()
+
+
+class WebhookDeliveryError(Exception):
+    def __init__(self, message: str, *, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def _admin_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(WEBHOOK_DISPATCH_THREADS, 4))
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def _endpoint_limit(endpoint: str) -> threading.BoundedSemaphore:
+    with _session_lock:
+        sem = _endpoint_limits.get(endpoint)
+        if sem is None:
+            sem = _endpoint_limits[endpoint] = threading.BoundedSemaphore(max(ADMIN_WEBHOOK_MAX_CONCURRENCY, 1))
+        return sem
+
+
+def _headers(event_ids: list[str], attempt: int) -> dict:
+    headers = {"Content-Type": "application/json", "X-Webhook-Attempt": str(attempt)}
+    key = (os.getenv("ADMIN_WEBHOOK_KEY") or "").strip()
+    if key:
+        headers["X-Admin-Api-Key"] = key
+    if len(event_ids) == 1:
+        headers["X-Webhook-Event-Id"] = event_ids[0]
+    return headers
+
+
+def _post(url: str, body, headers: dict, operation: str) -> requests.Response:
+    try:
+        with outbound_call("admin_backend", operation) as call:
+            resp = _admin_session().post(url, json=body, headers=headers, timeout=ADMIN_WEBHOOK_TIMEOUT)
+            call.status = resp.status_code
+        return resp
+    except requests.RequestException as exc:
+        raise WebhookDeliveryError(f"Falha de rede: {exc}") from exc
+
+
+def _raise_for_status(resp: requests.Response) -> None:
+    if resp.status_code < 400:
+        return
+    permanent = 400 <= resp.status_code < 500 and resp.status_code not in (408, 425, 429)
+    raise WebhookDeliveryError(f"HTTP {resp.status_code}: {resp.text[:500]}", permanent=permanent)
+
+
+def _deliver(base: str, endpoint: str, events: list[dict]) -> dict[str, Exception | None]:
+    """
+    Roda numa thread do pool (sem sessão do banco). ``events`` são dicts simples
+    ({id, payload, attempt}); retorna {event_id: erro_ou_None}.
+    """
+    results: dict[str, Exception | None] = {}
+    url = f"{base}{endpoint}"
+    with _endpoint_limit(endpoint):
+        if len(events) > 1 and endpoint not in _batch_unsupported:
+            body = {"events": [{"id": e["id"], "payload": e["payload"]} for e in events]}
+            headers = _headers([e["id"] for e in events], max(e["attempt"] for e in events))
+            try:
+                resp = _post(f"{url}/batch", body, headers, f"{endpoint}/batch")
+                if resp.status_code in (404, 405):
+                    logger.info("Admin-backend sem suporte a lote em %s; usando envio unitário", endpoint)
+                    _batch_unsupported.add(endpoint)
+                else:
+                    _raise_for_status(resp)
+                    return {e["id"]: None for e in events}
+            except WebhookDeliveryError as exc:
+                return {e["id"]: exc for e in events}
+
+        for e in events:
+            try:
+                _raise_for_status(_post(url, e["payload"], _headers([e["id"]], e["attempt"]), endpoint))
+                results[e["id"]] = None
+            except WebhookDeliveryError as exc:
+                results[e["id"]] = exc
+    return results
+
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(WEBHOOK_DISPATCH_THREADS, 1), thread_name_prefix="admin-webhook")
+    return _executor
+
+
+def drain_webhook_outbox(limit: int = WEBHOOK_CLAIM_BATCH) -> int:
+    """Reivindica um lote de eventos e entrega em paralelo. Retorna quantos foram processados."""
+    rows = claim_due(WebhookOutbox, limit)
+    if not rows:
+        return 0
+
+    base = (os.getenv("ADMIN_BACKEND_URL") or "").rstrip("/")
+    by_id = {str(r.id): r for r in rows}
+    if not base:
+        for r in rows:
+            schedule_retry(r, "ADMIN_BACKEND_URL não definido")
+        db.session.commit()
+        return len(rows)
+
+    grouped: dict[str, list[dict]] = defaultdict(list)
+    for r in rows:
+        grouped[r.endpoint].append({"id": str(r.id), "payload": r.payload, "attempt": r.attempts})
+
+    batch_max = max(ADMIN_WEBHOOK_BATCH_MAX, 1)
+    futures = []
+    executor = _get_executor()
+    for endpoint, events in grouped.items():
+        for i in range(0, len(events), batch_max):
+            chunk = events[i:i + batch_max]
+            futures.append((chunk, executor.submit(_deliver, base, endpoint, chunk)))
+
+    now = datetime.utcnow()
+    for chunk, fut in futures:
+        try:
+            results = fut.result()
+        except Exception as exc:
+            logger.exception("Erro inesperado no dispatcher de webhooks")
+            results = {e["id"]: exc for e in chunk}
+        for event_id, err in results.items():
+            row = by_id[event_id]
+            if err is None:
+                mark_sent(row, delivered_at=now)
+            else:
+                logger.warning("Webhook %s %s falhou (tentativa %s): %s", row.endpoint, event_id, row.attempts, err)
+                schedule_retry(row, err, permanent=getattr(err, "permanent", False))
+    db.session.commit()
+    return len(rows)
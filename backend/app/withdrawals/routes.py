@@ -4,23 +4,28 @@ import os, hashlib, secrets
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime, timedelta
 
-from flask import Blueprint, jsonify, request, g, current_app, make_response
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, jsonify, request, g, current_app
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from ..extensions import db
-from ..decorators import tenant_required
+from ..decorators import get_current_user, tenant_required
+from ..sql_instrumentation import query_budget
+from ..replica import read_only
+from ..metrics import WITHDRAWALS_REQUESTED
 from ..models import (
     User, Fundraiser, Contribution, PaymentStatus,
     BankAccount, Withdrawal, WithdrawalStatus,
     Invoice
 )
 from ..email_sender import (
-    send_email_html_mailgun,
     build_withdrawal_email_html_admin,
     build_withdrawal_email_html_user,
 )
+from ..email_queue import enqueue_email
 from ..utils import notify_admin_webhook
+from ..templating import bank_view, html_page, message_page
+from ..invoice_pdf import schedule_invoice_pdf
 
 withdrawals_bp = Blueprint("withdrawals", __name__)
 
@@ -179,13 +184,18 @@ def _ensure_invoice_for_withdrawal(w: Withdrawal) -> Invoice:
     )
     db.session.add(inv)
     db.session.commit()
+
+    # Gera o PDF já na emissão (pool de processos); o download passa a servir o arquivo pronto
+    try:
+        schedule_invoice_pdf(current_app._get_current_object(), inv)
+    except Exception:
+        current_app.logger.exception("Falha ao agendar PDF do comprovante %s", inv.id)
     return inv
 
 
 # ---------------------- END HELPERs ----------------------
 
 @withdrawals_bp.route("/available/<uuid:fundraiser_id>", methods=["GET"])
-@jwt_required()
 @tenant_required
 def get_available_balance(fundraiser_id):
     """
@@ -218,8 +228,7 @@ def get_available_balance(fundraiser_id):
 
 
 @withdrawals_bp.route("", methods=["POST"])
-@jwt_required()
-@tenant_required
+@tenant_required(user_columns=("id", "name", "email"))
 def request_withdrawal():
     """
     Cria um pedido de saque.
@@ -282,82 +291,76 @@ def request_withdrawal():
         requested_at=datetime.utcnow(),
     )
     db.session.add(w)
-    db.session.commit()
+    db.session.flush()
 
     token, token_hash = _new_payout_token()
     w.payout_token_hash = token_hash
     w.payout_token_expires_at = datetime.utcnow() + timedelta(hours=PAYOUT_TOKEN_EXP_HOURS)
     w.payout_token_views = 0
     w.payout_token_max_views = PAYOUT_TOKEN_MAX_VIEWS
-    db.session.add(w)
-    db.session.commit()
 
     payout_url = _payout_url(token)
 
+    # E-mails e webhook vão para as filas na mesma transação do saque
     try:
-        notify_admin_webhook(
-            "/webhooks/withdrawal-requested",
-            {"withdrawal_id": str(w.id)}
-        )
-    except Exception:
-        pass
-
-    try:
-        requester: User | None = db.session.get(User, g.user_id)
-        f_db: Fundraiser | None = db.session.get(Fundraiser, w.fundraiser_id)
-        ba_db: BankAccount | None = db.session.get(BankAccount, w.bank_account_id)
+        requester: User | None = get_current_user()
 
         bank_info = {
-            "bank_name": getattr(ba_db, "bank_name", None),
-            "bank_code": getattr(ba_db, "bank_code", None),
-            "agency": getattr(ba_db, "agency", None),
-            "account_number": getattr(ba_db, "account_number", None),
-            "account_type": ba_db.account_type.value if getattr(ba_db, "account_type", None) else None,
-            "account_holder_name": getattr(ba_db, "account_holder_name", None),
+            "bank_name": ba.bank_name,
+            "bank_code": ba.bank_code,
+            "agency": ba.agency,
+            "account_number": ba.account_number,
+            "account_type": ba.account_type.value if ba.account_type else None,
+            "account_holder_name": ba.account_holder_name,
         }
 
-        public_url = None
-        if f_db and getattr(f_db, "public_slug", None):
-            public_url = f"{APP_FRONTEND_URL}/p/{f_db.public_slug}"
-        control_url = public_url or (f"{APP_FRONTEND_URL}/app/fundraisers/{f_db.id}/control" if f_db else None)
+        public_url = f"{APP_FRONTEND_URL}/p/{f.public_slug}" if f.public_slug else None
+        control_url = public_url or f"{APP_FRONTEND_URL}/app/fundraisers/{f.id}/control"
 
         notify_to = os.getenv("WITHDRAWALS_NOTIFY_TO", "admin").strip()
         if notify_to:
             admin_html = build_withdrawal_email_html_admin(
                 requester_name=requester.name if requester else "Usuário",
                 requester_email=requester.email if requester else "",
-                fundraiser_title=f_db.title if f_db else "(Arrecadação)",
+                fundraiser_title=f.title,
                 amount=w.amount,
                 bank_info=bank_info,
                 requested_at=w.requested_at,
                 control_url=control_url,
                 payout_url=payout_url,
             )
-            for addr in [x.strip() for x in notify_to.split(",") if x.strip()]:
-                send_email_html_mailgun(
-                    addr,
-                    f"[Saque] Novo pedido — {f_db.title if f_db else ''}",
-                    admin_html
-                )
+            enqueue_email(
+                [x.strip() for x in notify_to.split(",") if x.strip()],
+                f"[Saque] Novo pedido — {f.title}",
+                admin_html,
+                tag="withdrawal_admin",
+            )
 
         if os.getenv("SEND_WITHDRAWAL_CONFIRM_TO_USER", "true").lower() in ("1", "true", "yes", "y"):
-            user_html = build_withdrawal_email_html_user(
-                requester_name=requester.name if requester else "Usuário",
-                fundraiser_title=f_db.title if f_db else "(Arrecadação)",
-                amount=w.amount,
-                bank_info=bank_info,
-                requested_at=w.requested_at,
-                control_url=control_url,
-            )
             if requester and requester.email:
-                send_email_html_mailgun(
+                user_html = build_withdrawal_email_html_user(
+                    requester_name=requester.name,
+                    fundraiser_title=f.title,
+                    amount=w.amount,
+                    bank_info=bank_info,
+                    requested_at=w.requested_at,
+                    control_url=control_url,
+                )
+                enqueue_email(
                     requester.email,
-                    f"Recebemos seu pedido de saque — {f_db.title if f_db else ''}",
-                    user_html
+                    f"Recebemos seu pedido de saque — {f.title}",
+                    user_html,
+                    tag="withdrawal_user",
                 )
-
     except Exception:
-        current_app.logger.exception("Falha ao enviar e-mails de saque")
+        current_app.logger.exception("Falha ao montar e-mails de saque")
+
+    notify_admin_webhook(
+        "/webhooks/withdrawal-requested",
+        {"withdrawal_id": str(w.id)}
+    )
+    db.session.commit()
+    WITHDRAWALS_REQUESTED.inc()
 
     resp = _serialize_withdrawal(w)
     resp.update({
@@ -370,11 +373,13 @@ def request_withdrawal():
 
 
 @withdrawals_bp.route("", methods=["GET"])
-@jwt_required()
 @tenant_required
+@query_budget(2)
+@read_only
 def list_withdrawals():
     items = (
         db.session.query(Withdrawal)
+        .options(joinedload(Withdrawal.bank_account))
         .join(Fundraiser, Fundraiser.id == Withdrawal.fundraiser_id)
         .filter(Fundraiser.owner_user_id == g.tenant_id)
         .order_by(Withdrawal.requested_at.desc())
@@ -384,7 +389,6 @@ def list_withdrawals():
 
 
 @withdrawals_bp.route("/<uuid:withdrawal_id>/status", methods=["PATCH"])
-@jwt_required()
 @tenant_required
 def update_withdrawal_status(withdrawal_id):
     """
@@ -478,111 +482,19 @@ def view_payout_token(token: str):
     if not ba:
         return _simple_html("Conta bancária não encontrada.", ok=False), 404
 
-    # Monta bloco copiável com dados COMPLETOS
-    bank_name = (getattr(ba, "bank_name", "") or "").strip() or "-"
-    bank_code = (getattr(ba, "bank_code", "") or "").strip() or "-"
-    agency = (getattr(ba, "agency", "") or "").strip() or "-"
-    account_number = (getattr(ba, "account_number", "") or "").strip() or "-"
-    account_type = getattr(ba, "account_type", None)
-    account_holder_name = (getattr(ba, "account_holder_name", "") or "").strip() or "-"
-    document_number = (getattr(ba, "document_number", "") or "").strip() or "-"
-
-    full_copy_block = "\n".join([
-        f"Banco: {bank_name} ({bank_code})",
-        f"Agência: {agency}",
-        f"Conta: {account_number}",
-        f"Tipo: {str(account_type.value).title() if account_type else '-'}",
-        f"Titular: {account_holder_name}",
-        f"Documento: {document_number}",
-    ])
-
-    title = f"Dados bancários — {f.title if f else 'Arrecadação'}"
-    subtitle = f"Pedido de saque feito em {w.requested_at.strftime('%d/%m/%Y %H:%M')} (UTC)"
-    hint = f"Este link expira em {w.payout_token_expires_at.strftime('%d/%m/%Y %H:%M')} (UTC)" if w.payout_token_expires_at else ""
-    views_info = f"Visualizações: {w.payout_token_views}/{w.payout_token_max_views or '∞'}"
-
-    body = f"""
-<!doctype html><html lang="pt-BR"><meta charset="utf-8">
-<meta name="viewport" content="width=device-width,initial-scale=1">
-<title>{title}</title>
-<style>
-  :root {{
-    --brand:#1e90a3; --border:#e5e7eb; --muted:#6b7280; --danger:#c0392b;
-  }}
-  body {{
-    font-family: system-ui, -apple-system, Segoe UI, Roboto, Ubuntu, 'Helvetica Neue', Arial, 'Noto Sans', sans-serif;
-    background: #f3f4f6; color: #111827; margin: 0; padding: 24px;
-  }}
-  .card {{
-    max-width: 720px; margin: 0 auto; background: #fff; border: 1px solid var(--border);
-    border-radius: 12px; box-shadow: 0 8px 30px rgba(0,0,0,.08); padding: 20px;
-  }}
-  h1 {{ font-size: 18px; margin: 0 0 6px 0; color: var(--brand); }}
-  p  {{ margin: 6px 0; color: #374151; }}
-  .muted {{ color: var(--muted); font-size: 13px; }}
-  .row {{ display:flex; gap: 8px; margin: 6px 0; }}
-  .col {{ flex:1; border:1px solid var(--border); border-radius:10px; padding:10px; background:#fff; }}
-  pre {{ background:#f8fafc; border:1px solid var(--border); border-radius:10px; padding:12px; white-space:pre-wrap; }}
-  .btn {{
-    display:inline-block; padding:10px 14px; border-radius:10px; border:1px solid var(--border);
-    background:#111827; color:#fff; text-decoration:none; font-size:14px; cursor:pointer;
-  }}
-  .btn.secondary {{ background:#fff; color:#111827; }}
-  .grid {{ display:grid; grid-template-columns: 1fr 1fr; gap:10px }}
-  .footer {{ margin-top: 12px; color: var(--muted); font-size: 12px }}
-</style>
-<body>
-  <div class="card">
-    <h1>{title}</h1>
-    <p class="muted">{subtitle}</p>
-    <div class="grid" style="margin:10px 0 6px 0">
-      <div class="col"><strong>Banco</strong><br>{bank_name} {f"({bank_code})" if bank_code and bank_code != "-" else ""}</div>
-      <div class="col"><strong>Agência</strong><br>{agency}</div>
-      <div class="col"><strong>Conta</strong><br>{account_number}</div>
-      <div class="col"><strong>Tipo</strong><br>{str(account_type.value).title() if account_type else "-"}</div>
-      <div class="col"><strong>Titular</strong><br>{account_holder_name}</div>
-      <div class="col"><strong>Documento</strong><br>{document_number}</div>
-    </div>
-
-    <p class="muted">Bloco completo para copiar/colar:</p>
-    <pre id="copyBlock">{full_copy_block}</pre>
-
-    <div class="footer">
-      {hint}<br>{views_info}
-    </div>
-  </div>
-
-<script>
-function copyBlock() {{
-  const el = document.getElementById('copyBlock');
-  const text = el ? el.innerText : '';
-  navigator.clipboard.writeText(text).then(() => {{
-    alert('Copiado!');
-  }}).catch(() => {{
-    alert('Falha ao copiar, selecione o texto manualmente.');
-  }});
-}}
-</script>
-</body></html>
-"""
-    resp = make_response(body, 200)
-    resp.headers["Content-Type"] = "text/html; charset=utf-8"
-    return resp
+    owner: User | None = db.session.get(User, f.owner_user_id) if f else None
+    return html_page(
+        "pages/payout.html",
+        show_full=True,
+        fundraiser_title=f.title if f else None,
+        owner_name=owner.name if owner else None,
+        amount=w.amount,
+        requested_at=w.requested_at,
+        bank=bank_view(ba, masked=False),
+        expires_at=w.payout_token_expires_at,
+        views=w.payout_token_views,
+        max_views=w.payout_token_max_views,
+    )
 
 def _simple_html(msg: str, ok: bool = True):
-    color = "#1e90a3" if ok else "#c0392b"
-    body = f"""
-<!doctype html><html lang="pt-BR"><meta charset="utf-8">
-<title>Link de saque</title>
-<body style="font-family:system-ui,-apple-system,Segoe UI,Roboto,Ubuntu,'Helvetica Neue',Arial,'Noto Sans',sans-serif;
-             background:#f3f4f6;color:#111827;margin:0;padding:24px">
-  <div style="max-width:560px;margin:56px auto;background:white;padding:28px;border-radius:12px;
-              border:1px solid #e5e7eb;box-shadow:0 8px 30px rgba(0,0,0,.08)">
-    <h2 style="margin:0 0 12px 0;color:{color}">Velório Solidário</h2>
-    <p style="font-size:16px;line-height:1.6;margin:0;">{msg}</p>
-  </div>
-</body></html>
-"""
-    resp = make_response(body, 200 if ok else 410)
-    resp.headers["Content-Type"] = "text/html; charset=utf-8"
-    return resp
+    return message_page(msg, ok=ok, title="Link de saque", status=200 if ok else 410)
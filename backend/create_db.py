@@ -1,10 +1,25 @@
 import os
+from sqlalchemy import text
 from app import create_app
 from app.extensions import db
 
-app = create_app()
+app = create_app(role="script")
 
 with app.app_context():
     print(">> Criando todas as tabelas no banco...")
     db.create_all()
+    # create_all não altera tabelas existentes: colunas/índices novos entram aqui
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS broadcast_id uuid NULL REFERENCES broadcasts(id) ON DELETE SET NULL"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_email_outbox_broadcast_id ON email_outbox (broadcast_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_contributions_fundraiser_status ON contributions (fundraiser_id, payment_status)"))
+        conn.execute(text("ALTER TABLE fundraisers ADD COLUMN IF NOT EXISTS moderation_hidden_at timestamp NULL"))
+        conn.execute(text("ALTER TABLE fundraiser_reports ADD COLUMN IF NOT EXISTS fingerprint varchar(64) NULL"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_fundraiser_reports_fingerprint ON fundraiser_reports (fingerprint)"))
+        # Totais por vaquinha a partir do agregado por motivo (denunciantes antigos não são identificáveis)
+        conn.execute(text(
+            "INSERT INTO fundraiser_report_totals (fundraiser_id, count, reporters) "
+            "SELECT fundraiser_id, SUM(count), 0 FROM fundraiser_report_stats GROUP BY fundraiser_id "
+            "ON CONFLICT (fundraiser_id) DO NOTHING"
+        ))
     print(">> Tabelas criadas com sucesso!")
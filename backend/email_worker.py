@@ -0,0 +1,91 @@
+# backend/email_worker.py
+"""
+Worker da fila de e-mails (tabela email_outbox).
+
+Uso:
+    python /app/email_worker.py
+
+Variáveis:
+    EMAIL_WORKER_THREADS        threads drenando a fila em paralelo (padrão 2)
+    EMAIL_WORKER_POLL_SECONDS   intervalo de polling quando a fila está vazia (padrão 2)
+    BROADCAST_POLL_SECONDS      intervalo de polling dos avisos em massa (padrão 5)
+    REPORT_DIGEST_MINUTES       intervalo do digest de denúncias aos administradores; 0 desliga (padrão 15)
+    RETENTION_INTERVAL_MINUTES  intervalo da rodada de expurgo (app/retention.py); 0 desliga (padrão 60)
+
+Vários processos/threads podem rodar ao mesmo tempo: as linhas são reivindicadas
+com FOR UPDATE SKIP LOCKED.
+"""
+import os
+import signal
+import threading
+
+from app import create_app
+from app.broadcasts import drain_broadcasts
+from app.email_queue import drain_email_outbox
+from app.extensions import logger
+from app.outbox import run_worker_loop
+from app.report_moderation import REPORT_DIGEST_MINUTES, run_digest_loop
+from app.retention import INTERVAL_MINUTES as RETENTION_INTERVAL_MINUTES, run_retention_loop
+
+THREADS = int(os.getenv("EMAIL_WORKER_THREADS", "2"))
+POLL_SECONDS = float(os.getenv("EMAIL_WORKER_POLL_SECONDS", "2"))
+BROADCAST_POLL_SECONDS = float(os.getenv("BROADCAST_POLL_SECONDS", "5"))
+
+
+def main():
+    app = create_app(role="worker")
+    stop = threading.Event()
+
+    def _shutdown(signum, _frame):
+        logger.info("Sinal %s recebido; encerrando email worker...", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    threads = [
+        threading.Thread(
+            target=run_worker_loop,
+            args=(app, drain_email_outbox),
+            kwargs={"poll_interval": POLL_SECONDS, "stop": stop, "name": f"email-{i}"},
+            name=f"email-worker-{i}",
+            daemon=True,
+        )
+        for i in range(max(THREADS, 1))
+    ]
+    # Avisos em massa: expande os destinatários em lotes na própria email_outbox
+    threads.append(threading.Thread(
+        target=run_worker_loop,
+        args=(app, drain_broadcasts),
+        kwargs={"poll_interval": BROADCAST_POLL_SECONDS, "stop": stop, "name": "broadcast"},
+        name="broadcast-worker",
+        daemon=True,
+    ))
+    if REPORT_DIGEST_MINUTES > 0:
+        threads.append(threading.Thread(
+            target=run_digest_loop,
+            args=(app,),
+            kwargs={"stop": stop, "interval_minutes": REPORT_DIGEST_MINUTES},
+            name="report-digest",
+            daemon=True,
+        ))
+    if RETENTION_INTERVAL_MINUTES > 0:
+        threads.append(threading.Thread(
+            target=run_retention_loop,
+            args=(app,),
+            kwargs={"stop": stop, "interval_minutes": RETENTION_INTERVAL_MINUTES},
+            name="retention",
+            daemon=True,
+        ))
+    for t in threads:
+        t.start()
+    print(f">> Email worker iniciado com {len(threads)} thread(s)")
+
+    while not stop.is_set():
+        stop.wait(1.0)
+    for t in threads:
+        t.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -109,6 +109,12 @@ elif [ "$(low "${CREATE_DB_ON_START:-}")" = "true" ] || [ "${CREATE_DB_ON_START:
   python /app/create_db.py || true
 fi
 
+# SERVER_MODE=prod sobe o Gunicorn (gunicorn.conf.py); o padrão segue o Flask dev
+if [ "$(low "${SERVER_MODE:-dev}")" = "prod" ]; then
+  echo "Iniciando Gunicorn (${GUNICORN_WORKER_CLASS:-gthread}) em 0.0.0.0:${PORT:-5000}"
+  exec gunicorn -c /app/gunicorn.conf.py
+fi
+
 # Sobe o Flask dev (porta 5000)
 echo "Iniciando Flask dev server em 0.0.0.0:5000"
 exec flask run --host=0.0.0.0 --port=5000
@@ -0,0 +1,151 @@
+"""
+Configuração do Gunicorn (modo de produção: ``SERVER_MODE=prod`` no entrypoint.sh).
+
+    gunicorn -c gunicorn.conf.py
+
+- prefork com ``preload_app``: o app (models, templates compilados, config) é
+  carregado uma vez no master e compartilhado com os workers por copy-on-write;
+  ``gc.freeze()`` antes do fork evita que o coletor de lixo "suje" essas páginas;
+- ``GUNICORN_WORKER_CLASS=gthread`` (padrão) ou ``gevent``. Com gevent o
+  monkey-patch acontece aqui, antes de qualquer import do app, e o psycopg2
+  passa a ceder o loop durante as consultas (``psycogreen``);
+- cada worker descarta as conexões herdadas do master (``engine.dispose``), as
+  sessões HTTP keep-alive (PIX-Module, Mailgun, admin-backend) e os pools de
+  processos/threads criados antes do fork;
+- desligamento gracioso: SIGTERM para de aceitar conexões, espera as
+  requisições em andamento (``GUNICORN_GRACEFUL_TIMEOUT``) e, na saída do worker,
+  as chamadas ao PIX-Module que ainda estiverem no ar;
+- métricas (``/api/metrics``) em modo multiprocesso: ver app/metrics.py.
+
+Dimensionamento (ver DEPLOYMENT.md): cada worker tem o próprio pool do
+SQLAlchemy, então instâncias x workers x (pool_size + max_overflow) precisa
+caber no ``max_connections`` do Postgres.
+"""
+import multiprocessing
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread").strip().lower()
+
+if worker_class == "gevent":
+    # Precisa vir antes de qualquer import que crie sockets, locks ou threads
+    from gevent import monkey
+
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError as exc:  # pragma: no cover - depende do ambiente
+        raise SystemExit("GUNICORN_WORKER_CLASS=gevent exige 'psycogreen' (pip install gevent psycogreen)") from exc
+    patch_psycopg()
+
+import gc  # noqa: E402
+import shutil  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+
+# Métricas somadas entre os workers (app/metrics.py): o diretório precisa estar
+# definido antes do app importar o prometheus_client (o preload_app roda depois
+# deste arquivo). Limpo só no primeiro carregamento — um reload (HUP) relê este
+# arquivo com os workers vivos; arquivos de uma execução anterior somariam
+# contadores de processos mortos
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+if not os.environ.get("_METRICS_DIR_READY"):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    os.environ["_METRICS_DIR_READY"] = "1"
+
+wsgi_app = "app.wsgi:app"
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+preload_app = True
+
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+# gthread: requisições simultâneas por worker — mantenha <= DB_POOL_SIZE + DB_MAX_OVERFLOW
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# gevent: greenlets por worker; as que passarem do pool esperam por conexão (DB_POOL_TIMEOUT_SECONDS)
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "50"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+# O PIX-Module tem timeout de 3s (conexão) + 10s (leitura); a espera precisa cobrir uma chamada inteira
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recicla workers aos poucos (vazamentos de memória de libs nativas); jitter evita reciclar todos juntos
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+# Atrás do Nginx: confia no X-Forwarded-* só do proxy
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# ...e o rate limit usa o IP que o Nginx acrescentou ao X-Forwarded-For (lido no
+# import do app, que vem depois deste arquivo). Fora do Gunicorn o padrão é 0: sem
+# proxy à frente, o cabeçalho vem do próprio cliente
+os.environ.setdefault("RATE_LIMIT_PROXY_HOPS", "1")
+
+
+def _flask_app(server):
+    return server.app.wsgi()
+
+
+def when_ready(server):
+    # Tudo que foi carregado no master vai para a geração permanente: o GC dos
+    # workers não percorre (nem escreve) esses objetos, e as páginas seguem compartilhadas
+    gc.collect()
+    gc.freeze()
+    server.log.info("Gunicorn pronto: %s worker(s) %s", workers, worker_class)
+
+
+def post_fork(server, worker):
+    from app.extensions import db
+    from app.password_hasher import password_hasher
+
+    app = _flask_app(server)
+    # Sessão HTTP (keep-alive) e locks do PaymentService herdados do master
+    app.payment_service.reset_after_fork()
+
+    with app.app_context():
+        # Conexões abertas no master não podem ser usadas por dois processos;
+        # close=False: só esquece o pool herdado, sem fechar o socket do master
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Executores são criados sob demanda; se o master chegou a criar algum, o
+    # worker herda só o objeto (as threads/processos não sobrevivem ao fork).
+    # Só mexe nos módulos já carregados — importar aqui traria Pillow etc. para todo worker
+    password_hasher._executor = None
+    for name in ("app.invoice_pdf", "app.image_variants", "app.webhook_queue"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module._executor = None
+    # Idem para as sessões HTTP por processo (Mailgun, admin-backend): socket herdado = socket compartilhado
+    for name in ("app.email_sender", "app.webhook_queue"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module._session = None
+            module._session_lock = threading.Lock()
+
+
+def worker_exit(server, worker):
+    _drain(server, "worker %s" % worker.pid)
+    from app.password_hasher import password_hasher
+
+    password_hasher.shutdown()
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    # O master também chama o PSP (registro do webhook, ver app/startup.py)
+    _drain(server, "master")
+
+
+def _drain(server, who):
+    svc = getattr(_flask_app(server), "payment_service", None)
+    if svc is None or not svc.inflight:
+        return
+    server.log.info("%s aguardando %s chamada(s) ao PIX-Module", who, svc.inflight)
+    if not svc.drain(timeout=max(graceful_timeout - 1, 1)):
+        server.log.warning("%s saiu com %s chamada(s) ao PIX-Module em andamento", who, svc.inflight)
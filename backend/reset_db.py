@@ -10,7 +10,7 @@ MODE = os.getenv("RESET_MODE", "schema")  # "schema" (mais agressivo) ou "metada
 if not FORCE:
     raise SystemExit("FORCE_RESET_DB não está habilitado. Abortando por segurança.")
 
-app = create_app()
+app = create_app(role="script")
 with app.app_context():
     uri = app.config["SQLALCHEMY_DATABASE_URI"]
     print(f">> Conectando em: {uri}")
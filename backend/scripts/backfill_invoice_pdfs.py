@@ -0,0 +1,68 @@
+"""
+Gera os PDFs dos comprovantes (invoices) que ainda não têm arquivo em disco.
+
+Uso:
+    python scripts/backfill_invoice_pdfs.py [--workers 4] [--batch 200] [--force]
+
+Os PDFs são renderizados em paralelo num pool de processos e gravados por
+conteúdo no storage privado (INVOICE_PDF_DIR ou bucket S3); ``invoices.pdf_url`` recebe a chave do arquivo.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.invoice_pdf import has_stored_pdf, invoice_pdf_data, render_invoice_pdf, store_pdf  # noqa: E402
+from app.models import Invoice  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill dos PDFs de comprovantes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch", type=int, default=200, help="invoices por lote (commit a cada lote)")
+    parser.add_argument("--force", action="store_true", help="regera mesmo quando o arquivo já existe")
+    args = parser.parse_args()
+
+    app = create_app(role="script")
+    done = failed = skipped = 0
+    started = time.perf_counter()
+
+    with app.app_context(), ProcessPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        last_id = None
+        while True:
+            q = db.session.query(Invoice).options(joinedload(Invoice.fundraiser)).order_by(Invoice.id)
+            if last_id is not None:
+                q = q.filter(Invoice.id > last_id)
+            invoices = q.limit(args.batch).all()
+            if not invoices:
+                break
+            last_id = invoices[-1].id
+
+            pending = [inv for inv in invoices if args.force or not has_stored_pdf(inv)]
+            skipped += len(invoices) - len(pending)
+            futures = {pool.submit(render_invoice_pdf, invoice_pdf_data(inv)): inv for inv in pending}
+            for fut in as_completed(futures):
+                inv = futures[fut]
+                try:
+                    inv.pdf_url = store_pdf(fut.result())
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    print(f"!! Falha no comprovante {inv.id}: {exc}")
+            db.session.commit()
+            print(f">> {done} gerados, {skipped} já existentes, {failed} falhas...")
+
+    elapsed = time.perf_counter() - started
+    print(f">> Concluído em {elapsed:.1f}s: {done} gerados, {skipped} já existentes, {failed} falhas")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Micro-benchmark do provider JSON (app/json_provider.py) nos payloads de
+explorar (``GET /api/explore/fundraisers``) e estatísticas da vaquinha
+(``GET /api/fundraisers/<id>/stats``).
+
+Uso:
+    python scripts/bench_json.py [--iterations 2000] [--items 100] [--withdrawals 50]
+
+Os models ficam em memória (sem banco). Cada amostra mede serializer da rota +
+``response``, de ponta a ponta, com:
+
+    flask       DefaultJSONProvider do Flask com ``convert`` como ``default`` —
+                o que o app usa quando o orjson não está instalado;
+    orjson      o nosso provider.
+
+Confere também que as duas saídas decodificam para o mesmo objeto.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("PIX_API_KEY", "bench")
+os.environ["PIX_REGISTER_WEBHOOK_ON_STARTUP"] = "false"
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.explore.routes import _serialize_public_item  # noqa: E402
+from app.fundraisers.routes import _stats_contribution, _stats_withdrawal  # noqa: E402
+from app.json_provider import JSONProvider, convert, orjson  # noqa: E402
+from app.models import (  # noqa: E402
+    AccountType,
+    BankAccount,
+    Contribution,
+    Fundraiser,
+    FundraiserStatus,
+    PaymentStatus,
+    User,
+    Withdrawal,
+    WithdrawalStatus,
+)
+
+NOW = datetime.utcnow()
+
+
+def _fundraisers(n):
+    return [
+        Fundraiser(
+            id=uuid.uuid4(), title=f"Despedida do Sr. João #{i}",
+            description="Ajude a família com as despesas do velório e do sepultamento. " * 4,
+            goal_amount=Decimal("5000.00"), current_amount=Decimal("1234.56") + i,
+            cover_image_url=None, city="Porto Alegre", state="RS", public_slug=f"despedida-{i:04d}",
+            created_at=NOW - timedelta(days=i, microseconds=i), status=FundraiserStatus.ACTIVE, is_public=True,
+        )
+        for i in range(n)
+    ]
+
+
+def _stats_models(n_withdrawals):
+    owner = User(id=uuid.uuid4(), name="Maria da Silva")
+    fundraiser_id = uuid.uuid4()
+    contribs = [
+        Contribution(
+            id=uuid.uuid4(), amount=Decimal("50.00") + i, message="Força, família!" if i % 2 else None,
+            is_anonymous=bool(i % 3 == 0), contributor=owner, payment_status=PaymentStatus.PAID,
+            created_at=NOW - timedelta(hours=i),
+        )
+        for i in range(10)
+    ]
+    bank = BankAccount(
+        id=uuid.uuid4(), bank_name="Banco do Brasil", agency="1234", account_number="123456-7",
+        account_type=AccountType.CHECKING, account_holder_name="Maria da Silva",
+    )
+    withdrawals = [
+        Withdrawal(
+            id=uuid.uuid4(), fundraiser_id=fundraiser_id, bank_account_id=bank.id, bank_account=bank,
+            amount=Decimal("100.00") + i, description="Funerária",
+            status=WithdrawalStatus.COMPLETED if i % 4 else WithdrawalStatus.PENDING,
+            requested_at=NOW - timedelta(days=i), processed_at=NOW if i % 4 else None,
+        )
+        for i in range(n_withdrawals)
+    ]
+    return contribs, withdrawals
+
+
+def _stats(contribs, withdrawals):
+    return {
+        "total_contributions": len(contribs),
+        "total_contributors": 4,
+        "recent_contributions": [_stats_contribution(c) for c in contribs],
+        "withdrawals": [_stats_withdrawal(w) for w in withdrawals],
+        "available_balance": Decimal("987.65"),
+        "total_withdrawn": Decimal("1234.50"),
+    }
+
+
+def _explore(fundraisers):
+    return {
+        "fundraisers": [_serialize_public_item(f, {}) for f in fundraisers],
+        "total": len(fundraisers), "page": 1, "limit": len(fundraisers), "totalPages": 1,
+    }
+
+
+def _time(fn, iterations):
+    fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) >= 20 else max(samples)
+    return statistics.fmean(samples), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider JSON: Flask x orjson")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=100, help="vaquinhas na página de explorar (máx. da rota: 100)")
+    parser.add_argument("--withdrawals", type=int, default=50, help="saques no payload de estatísticas")
+    args = parser.parse_args()
+    if orjson is None:
+        raise SystemExit("!! orjson não instalado (pip install -r requirements.txt)")
+
+    app = create_app(role="script")
+    fast = JSONProvider(app)
+    flask_default = DefaultJSONProvider(app)
+    flask_default.default = convert
+
+    fundraisers = _fundraisers(args.items)
+    contribs, withdrawals = _stats_models(args.withdrawals)
+    payloads = {
+        "explore": lambda: _explore(fundraisers),
+        "stats": lambda: _stats(contribs, withdrawals),
+    }
+
+    with app.app_context():
+        print(f"{'payload':8} {'provider':8} {'bytes':>7} {'média (µs)':>11} {'p95 (µs)':>9} {'x flask':>8}")
+        for name, build in payloads.items():
+            cases = {
+                "flask": lambda: flask_default.response(build()),
+                "orjson": lambda: fast.response(build()),
+            }
+            decoded = {k: json.loads(fn().get_data()) for k, fn in cases.items()}
+            if decoded["orjson"] != decoded["flask"]:
+                raise SystemExit(f"!! {name}: saídas diferentes entre os providers")
+
+            baseline = None
+            for provider, fn in cases.items():
+                mean, p95 = _time(fn, args.iterations)
+                baseline = baseline or mean
+                size = len(fn().get_data())
+                print(f"{name:8} {provider:8} {size:7d} {mean:11.1f} {p95:9.1f} {baseline / mean:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
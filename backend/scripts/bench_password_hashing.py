@@ -0,0 +1,102 @@
+"""
+Benchmark de login (verificação bcrypt) por custo e modo de execução.
+
+Uso:
+    python scripts/bench_password_hashing.py [--rounds 10 11 12 13] [--concurrency 16]
+                                             [--logins 64] [--workers 2]
+
+Para cada custo, dispara ``--logins`` verificações com ``--concurrency`` threads
+(como um worker gthread recebendo um pico de logins), em dois modos:
+
+    inline  bcrypt na thread da requisição (comportamento antigo)
+    pool    PasswordHasher com ``--workers`` processos
+
+Além de logins/s e p50/p95, mede a latência de uma requisição "leve" (laço curto
+de CPU) feita durante o pico: é o que mostra os outros endpoints sendo
+estrangulados no modo inline.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.password_hasher import PasswordHasher, _hash  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+def _light_request() -> float:
+    started = time.perf_counter()
+    sum(i * i for i in range(20000))
+    return time.perf_counter() - started
+
+
+def _p(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+
+def run(hasher: PasswordHasher, password_hash: str, logins: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    light: list[float] = []
+    stop = threading.Event()
+
+    def _login():
+        started = time.perf_counter()
+        assert hasher.verify(PASSWORD, password_hash)
+        latencies.append(time.perf_counter() - started)
+
+    def _light_loop():
+        while not stop.is_set():
+            light.append(_light_request())
+            time.sleep(0.01)
+
+    probe = threading.Thread(target=_light_loop, daemon=True)
+    started = time.perf_counter()
+    probe.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: _login(), range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe.join()
+
+    return {
+        "rate": logins / elapsed,
+        "p50": _p(latencies, 0.50),
+        "p95": _p(latencies, 0.95),
+        "light_p95": _p(light, 0.95) if light else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de hashing de senha")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    baseline = statistics.mean(_light_request() for _ in range(20)) * 1000
+    print(f">> requisição leve isolada: {baseline:.2f}ms")
+    print(f"{'custo':>5} {'modo':>6} {'hash ms':>8} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'leve p95':>9}")
+
+    for rounds in args.rounds:
+        t0 = time.perf_counter()
+        password_hash = _hash(PASSWORD, rounds)
+        hash_ms = (time.perf_counter() - t0) * 1000
+
+        for mode, workers in (("inline", 0), ("pool", args.workers)):
+            hasher = PasswordHasher(rounds=rounds, workers=workers, max_pending=args.concurrency)
+            hasher.warm_up()
+            r = run(hasher, password_hash, args.logins, args.concurrency)
+            hasher.shutdown()
+            print(f"{rounds:>5} {mode:>6} {hash_ms:>8.1f} {r['rate']:>9.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['light_p95']:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
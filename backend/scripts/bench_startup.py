@@ -0,0 +1,163 @@
+"""
+Benchmark de cold start do ``create_app`` por papel (web, worker, script).
+
+Uso:
+    python scripts/bench_startup.py [--runs 5] [--roles web,worker,script]
+                                    [--max-ms 1500] [--max-rss-mb 200] [--json]
+
+Cada rodada é um processo Python novo (sem cache de módulos) que mede o import
+do pacote ``app``, as fases do boot (``app.boot_timings``, ver app/startup.py),
+o RSS do processo e quais dependências pesadas foram carregadas. No Linux mede
+também a memória privada de um worker forkado após ``gc.freeze()`` — o que o
+worker do Gunicorn deixa de compartilhar com o master (ver gunicorn.conf.py).
+
+Regressão: sai com código 1 se a mediana de (import + boot) passar de
+``--max-ms``, se o RSS passar de ``--max-rss-mb`` ou se um papel sem HTTP
+(worker/script) carregar alguma das dependências pesadas.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("reportlab", "PIL", "bleach", "markdown", "requests")
+# Papéis sem HTTP não deveriam carregar nenhuma delas no boot
+LEAN_ROLES = ("worker", "script")
+
+CHILD = r"""
+import gc, json, os, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app(role=sys.argv[1])
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _private_kb():
+    total = 0
+    with open("/proc/self/smaps_rollup") as fh:
+        for line in fh:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+out = {
+    "import_ms": (t1 - t0) * 1000,
+    "boot_ms": app.boot_timings["total_ms"],
+    "phases": app.boot_timings["phases"],
+    "rss_kb": _status_kb("VmRSS"),
+    "heavy": sorted(m for m in json.loads(sys.argv[2]) if m in sys.modules),
+    "worker_private_kb": None,
+}
+if sys.argv[3] == "1" and hasattr(os, "fork") and os.path.exists("/proc/self/smaps_rollup"):
+    gc.collect()
+    gc.freeze()
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        gc.collect()  # o que um worker faz logo no início; não deve tocar o que ficou congelado
+        os.write(w, str(_private_kb()).encode())
+        os._exit(0)
+    os.close(w)
+    data = os.read(r, 64)
+    os.waitpid(pid, 0)
+    out["worker_private_kb"] = int(data or 0)
+print("BENCH" + json.dumps(out))
+"""
+
+
+def _run_once(role: str, fork: bool) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env.setdefault("PIX_API_KEY", "bench")
+    env["PIX_REGISTER_WEBHOOK_ON_STARTUP"] = "false"
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, role, json.dumps(HEAVY_MODULES), "1" if fork else "0"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH"):
+            return json.loads(line[len("BENCH"):])
+    raise SystemExit(f"!! Boot do papel {role} falhou:\n{proc.stderr[-2000:]}")
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start do create_app por papel")
+    parser.add_argument("--runs", type=int, default=5, help="processos novos por papel")
+    parser.add_argument("--roles", default="web,worker,script")
+    parser.add_argument("--max-ms", type=float, default=float(os.getenv("BENCH_STARTUP_MAX_MS", "1500")),
+                        help="limite da mediana de import + boot (0 = sem limite)")
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("BENCH_STARTUP_MAX_RSS_MB", "200")),
+                        help="limite da mediana do RSS (0 = sem limite)")
+    parser.add_argument("--no-fork", action="store_true", help="não mede a memória privada do worker forkado")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for role in [r.strip() for r in args.roles.split(",") if r.strip()]:
+        runs = [_run_once(role, fork=not args.no_fork) for _ in range(max(args.runs, 1))]
+        phases = {}
+        for run in runs:
+            for name, ms in run["phases"].items():
+                phases.setdefault(name, []).append(ms)
+        report[role] = {
+            "import_ms": _median([r["import_ms"] for r in runs]),
+            "boot_ms": _median([r["boot_ms"] for r in runs]),
+            "total_ms": _median([r["import_ms"] + r["boot_ms"] for r in runs]),
+            "rss_mb": _median([r["rss_kb"] / 1024 for r in runs]),
+            "worker_private_mb": _median([
+                r["worker_private_kb"] / 1024 if r["worker_private_kb"] is not None else None for r in runs
+            ]),
+            "phases_ms": {name: statistics.median(v) for name, v in phases.items()},
+            "heavy_modules": sorted({m for r in runs for m in r["heavy"]}),
+        }
+
+    failures = []
+    for role, r in report.items():
+        if args.max_ms and r["total_ms"] > args.max_ms:
+            failures.append(f"{role}: import + boot {r['total_ms']:.0f} ms > {args.max_ms:.0f} ms")
+        if args.max_rss_mb and r["rss_mb"] > args.max_rss_mb:
+            failures.append(f"{role}: RSS {r['rss_mb']:.1f} MB > {args.max_rss_mb:.0f} MB")
+        if role in LEAN_ROLES and r["heavy_modules"]:
+            failures.append(f"{role}: carregou {', '.join(r['heavy_modules'])} no boot")
+
+    if args.json:
+        print(json.dumps({"roles": report, "failures": failures}, indent=2))
+    else:
+        print(f"{'papel':8} {'import':>9} {'boot':>9} {'total':>9} {'RSS':>9} {'worker':>9}  pesados")
+        for role, r in report.items():
+            private = f"{r['worker_private_mb']:.1f}MB" if r["worker_private_mb"] is not None else "-"
+            print(
+                f"{role:8} {r['import_ms']:7.0f}ms {r['boot_ms']:7.0f}ms {r['total_ms']:7.0f}ms "
+                f"{r['rss_mb']:7.1f}MB {private:>9}  {', '.join(r['heavy_modules']) or '-'}"
+            )
+            print("         " + " ".join(f"{k}={v:.0f}ms" for k, v in r["phases_ms"].items()))
+        for msg in failures:
+            print(f"!! {msg}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
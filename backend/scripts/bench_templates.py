@@ -0,0 +1,96 @@
+"""
+Micro-benchmark da camada de templates (app/templating.py).
+
+Uso:
+    python scripts/bench_templates.py [--iterations 2000]
+
+Mede, por template, o tempo da primeira renderização (inclui compilação) e o
+tempo médio/p95 das renderizações seguintes (template já em cache).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.templating import bank_view, get_env, render, render_email  # noqa: E402
+
+BANK = {
+    "bank_name": "Banco do Brasil",
+    "bank_code": "001",
+    "agency": "1234",
+    "account_number": "123456-7",
+    "account_type": "corrente",
+    "account_holder_name": "Maria da Silva",
+    "document_number": "12345678900",
+}
+NOW = datetime.utcnow()
+
+CASES = {
+    "emails/verification.html": dict(name="Maria", confirm_url="https://exemplo/api/auth/confirm/abc"),
+    "emails/password_reset.html": dict(name="Maria", reset_url="https://exemplo/auth/reset?token=abc", expires_hours=2),
+    "emails/withdrawal_admin.html": dict(
+        requester_name="Maria", requester_email="maria@exemplo.com", fundraiser_title="Despedida do Sr. João",
+        amount=Decimal("1234.56"), bank=bank_view(BANK), requested_at=NOW,
+        control_url="https://exemplo/app/fundraisers/1", payout_url="https://exemplo/api/withdrawals/p/abc",
+    ),
+    "emails/withdrawal_user.html": dict(
+        requester_name="Maria", fundraiser_title="Despedida do Sr. João", amount=Decimal("1234.56"),
+        bank=bank_view(BANK), requested_at=NOW, control_url="https://exemplo/app/fundraisers/1",
+    ),
+    "emails/account_deleted_admin.html": dict(
+        user_name="Maria", user_email="maria@exemplo.com", user_id="0000", deleted_at=NOW,
+        total_amount=Decimal("999.90"), bank=bank_view(BANK),
+    ),
+    "emails/fundraiser_report_digest.html": dict(
+        auto_hidden=False, generated_at=NOW, items=[dict(
+            fundraiser_id="0000", fundraiser_title="Despedida do Sr. João", public_url="https://exemplo/p/abc",
+            hidden_at=None, total=12, new=4, duplicates=7, first_reported_at=NOW, last_reported_at=NOW,
+            reasons=[dict(reason="fraude", count=9, new=3, duplicates=6), dict(reason="spam", count=3, new=1, duplicates=1)],
+            messages=[dict(reason="fraude", message="Texto <b>livre</b> do denunciante", created_at=NOW)],
+        )],
+    ),
+    "emails/fundraiser_broadcast.html": dict(
+        kind="goal_reached", fundraiser_title="Despedida do Sr. João", goal_amount=Decimal("5000"),
+        current_amount=Decimal("5230.50"), message="Obrigado a todos!", public_url="https://exemplo/p/abc",
+    ),
+    "pages/message.html": dict(msg="Link inválido ou expirado.", ok=False, title="Velório Solidário"),
+    "pages/payout.html": dict(
+        show_full=True, fundraiser_title="Despedida do Sr. João", owner_name="Maria", amount=Decimal("1234.56"),
+        requested_at=NOW, bank=bank_view(BANK, masked=False), expires_at=NOW, views=1, max_views=5,
+    ),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de renderização por template")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--with-text", action="store_true", help="inclui a geração da versão texto (render_email)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    get_env()
+    print(f"Ambiente Jinja pronto em {(time.perf_counter() - t0) * 1000:.1f} ms\n")
+
+    print(f"{'template':40} {'1ª (ms)':>9} {'média (µs)':>11} {'p95 (µs)':>9}")
+    for name, ctx in CASES.items():
+        fn = render_email if args.with_text and name.startswith("emails/") else render
+        t0 = time.perf_counter()
+        fn(name, **ctx)
+        first = (time.perf_counter() - t0) * 1000
+
+        samples = []
+        for _ in range(args.iterations):
+            t0 = time.perf_counter()
+            fn(name, **ctx)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) >= 20 else max(samples)
+        print(f"{name:40} {first:9.2f} {statistics.fmean(samples):11.1f} {p95:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
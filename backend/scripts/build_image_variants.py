@@ -0,0 +1,81 @@
+"""
+Gera (ou regenera) as variantes card/detail/OG das imagens já enviadas.
+
+Uso:
+    python scripts/build_image_variants.py [--dir /app/uploads] [--workers 4] [--force]
+    python scripts/build_image_variants.py --covers [--workers 4] [--force]
+
+Útil após o deploy do pipeline de variantes, ou ao mudar tamanhos/qualidade.
+Por padrão percorre o diretório local de uploads (STORAGE_BACKEND=local); com
+``--covers`` percorre as capas das vaquinhas no storage configurado (S3 incluso).
+Imagens que já têm manifesto no storage não são reprocessadas (sem ``--force``),
+só registradas na tabela ``image_variants`` — é de lá que os payloads públicos
+leem.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.image_variants import VARIANTS, build_variants, has_variants, manifest_key, record_manifest  # noqa: E402
+from app.models import Fundraiser  # noqa: E402
+from app.storage import LocalStorage, get_storage  # noqa: E402
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+def _is_original(path: Path) -> bool:
+    # <nome>.card.webp etc. são variantes, não originais
+    parts = path.name.split(".")
+    return path.suffix.lower() in IMAGE_EXTS and not (len(parts) >= 3 and parts[-2] in VARIANTS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill das variantes de imagem")
+    parser.add_argument("--dir", default=os.getenv("UPLOAD_DIR", "/app/uploads"))
+    parser.add_argument("--covers", action="store_true", help="capas das vaquinhas no storage configurado")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--force", action="store_true", help="regera mesmo com manifesto existente")
+    args = parser.parse_args()
+
+    app = create_app(role="script")
+    with app.app_context():
+        if args.covers:
+            storage = get_storage("public")
+            urls = [u for (u,) in db.session.query(Fundraiser.cover_image_url).filter(Fundraiser.cover_image_url.isnot(None))]
+            originals = sorted({k for k in map(storage.key_from_url, urls) if k})
+        else:
+            storage = LocalStorage(args.dir, os.getenv("UPLOAD_PUBLIC_BASE", "/files"), public=True)
+            originals = [p.name for p in Path(args.dir).iterdir() if p.is_file() and _is_original(p)]
+        ready = [] if args.force else [k for k in originals if has_variants(k, storage)]
+        pending = [k for k in originals if k not in set(ready)]
+        print(f">> {len(originals)} imagens, {len(pending)} para processar, {len(ready)} só para registrar")
+
+        started = time.perf_counter()
+        done = failed = 0
+        for key in ready:
+            record_manifest(key, json.loads(storage.read_bytes(manifest_key(key))))
+        with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+            futures = {pool.submit(build_variants, k, storage): k for k in pending}
+            for fut in as_completed(futures):
+                try:
+                    record_manifest(futures[fut], fut.result())
+                    done += 1
+                except Exception as exc:
+                    failed += 1
+                    print(f"!! {futures[fut]}: {exc}")
+        db.session.commit()
+
+    print(f">> Concluído em {time.perf_counter() - started:.1f}s: {done} geradas, {len(ready)} registradas, {failed} falhas")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Fake local da API de mensagens do Mailgun, para desenvolvimento e testes.
+
+Uso:
+    python scripts/fake_mailgun.py --port 8025 [--fail-rate 0.2] [--latency-ms 300]
+
+E aponte o backend/worker para ele:
+    MAILGUN_API_BASE=http://localhost:8025 MAILGUN_DOMAIN=fake.local MAILGUN_API_KEY=key-fake
+
+Rotas:
+    POST   /v3/<domain>/messages   aceita o envio (form-urlencoded), como o Mailgun
+    GET    /messages               lista as mensagens recebidas (JSON)
+    DELETE /messages               limpa a caixa
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+_messages: list[dict] = []
+_lock = threading.Lock()
+
+
+def _make_handler(api_key: str | None, fail_rate: float, latency_ms: int):
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, status: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self) -> bool:
+            if not api_key:
+                return True
+            header = self.headers.get("Authorization", "")
+            if not header.startswith("Basic "):
+                return False
+            try:
+                user, _, pwd = base64.b64decode(header[6:]).decode().partition(":")
+            except Exception:
+                return False
+            return user == "api" and pwd == api_key
+
+        def do_POST(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 3 or parts[0] != "v3" or parts[2] != "messages":
+                return self._json(404, {"message": "not found"})
+            if not self._authorized():
+                return self._json(401, {"message": "Invalid private key"})
+
+            length = int(self.headers.get("Content-Length") or 0)
+            form = parse_qs(self.rfile.read(length).decode(), keep_blank_values=True)
+
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if fail_rate and random.random() < fail_rate:
+                return self._json(503, {"message": "simulated failure"})
+
+            if not form.get("to") or not form.get("subject"):
+                return self._json(400, {"message": "'to' e 'subject' são obrigatórios"})
+
+            msg_id = f"<{uuid.uuid4().hex}@{parts[1]}>"
+            with _lock:
+                _messages.append({
+                    "id": msg_id,
+                    "domain": parts[1],
+                    "from": (form.get("from") or [None])[0],
+                    "to": form.get("to"),
+                    "subject": form["subject"][0],
+                    "html": (form.get("html") or [None])[0],
+                    "text": (form.get("text") or [None])[0],
+                    "tag": form.get("o:tag"),
+                    "recipient_variables": json.loads(form["recipient-variables"][0]) if form.get("recipient-variables") else None,
+                    "received_at": time.time(),
+                })
+            self._json(200, {"id": msg_id, "message": "Queued. Thank you."})
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/messages":
+                return self._json(404, {"message": "not found"})
+            with _lock:
+                self._json(200, list(_messages))
+
+        def do_DELETE(self):
+            if self.path.rstrip("/") != "/messages":
+                return self._json(404, {"message": "not found"})
+            with _lock:
+                _messages.clear()
+            self._json(200, {"message": "cleared"})
+
+        def log_message(self, fmt, *args):
+            print(f"[fake-mailgun] {self.address_string()} {fmt % args}")
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake local da API do Mailgun")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--api-key", default=None, help="se definido, exige Basic auth api:<key>")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fração de envios que retornam 503")
+    parser.add_argument("--latency-ms", type=int, default=0, help="latência artificial por envio")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(args.api_key, args.fail_rate, args.latency_ms))
+    print(f"Fake Mailgun ouvindo em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import os
+import sys
 from textwrap import dedent
 from sqlalchemy import create_engine, text
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.legal_render import legal_content_hash, render_legal_html  # noqa: E402
+
 # ===== Conteúdos (MD) =====
 PRIVACY_MD = dedent("""\
 ## 📜 Política de Privacidade e Tratamento de Dados – Velório Solidário
@@ -241,6 +246,19 @@ def main():
         );
         """))
 
+        # HTML sanitizado + hash gerados na publicação (servidos direto pela API)
+        conn.execute(text("ALTER TABLE legal_docs ADD COLUMN IF NOT EXISTS rendered_html text NULL"))
+        conn.execute(text("ALTER TABLE legal_docs ADD COLUMN IF NOT EXISTS content_hash varchar(64) NULL"))
+
+        # Versão do cache em memória dos workers
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+          name varchar(64) PRIMARY KEY,
+          version integer NOT NULL DEFAULT 1,
+          updated_at timestamp NOT NULL DEFAULT now()
+        );
+        """))
+
         # Unique index para ON CONFLICT
         conn.execute(text("""
         DO $$
@@ -277,21 +295,55 @@ def main():
         END $$;
         """))
 
+        # Último aceite por usuário/doc (checagem do gate em uma leitura pela PK)
+        conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS legal_acceptance_latest (
+          user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+          doc_key varchar(32) NOT NULL,
+          version varchar(32) NOT NULL,
+          locale varchar(16) NOT NULL DEFAULT 'pt-BR',
+          accepted_at timestamp NOT NULL DEFAULT now(),
+          PRIMARY KEY (user_id, doc_key)
+        );
+        """))
+
+        # Backfill a partir do histórico (idempotente)
+        conn.execute(text("""
+        INSERT INTO legal_acceptance_latest (user_id, doc_key, version, locale, accepted_at)
+        SELECT DISTINCT ON (user_id, doc_key) user_id, doc_key, version, locale, accepted_at
+          FROM legal_acceptances
+         ORDER BY user_id, doc_key, accepted_at DESC
+        ON CONFLICT (user_id, doc_key) DO NOTHING
+        """))
+
+        docs = [
+            {"key": "privacy", "locale": LOCALE, "title": "Política de Privacidade", "version": VERSION, "content_md": PRIVACY_MD},
+            {"key": "fees",    "locale": LOCALE, "title": "Regras de Taxas",          "version": VERSION, "content_md": FEES_MD},
+            {"key": "terms",   "locale": LOCALE, "title": "Termos de Uso",             "version": VERSION, "content_md": TERMS_MD},
+        ]
+        for d in docs:
+            d["rendered_html"] = render_legal_html(d["content_md"])
+            d["content_hash"] = legal_content_hash(d["title"], d["version"], d["rendered_html"])
+
         # UPSERT dos documentos
         conn.execute(text("""
-        INSERT INTO legal_docs (key, locale, title, version, content_md, is_active)
-        VALUES (:key, :locale, :title, :version, :content_md, TRUE)
+        INSERT INTO legal_docs (key, locale, title, version, content_md, rendered_html, content_hash, is_active)
+        VALUES (:key, :locale, :title, :version, :content_md, :rendered_html, :content_hash, TRUE)
         ON CONFLICT (key, locale, version)
         DO UPDATE SET
           title = EXCLUDED.title,
           content_md = EXCLUDED.content_md,
+          rendered_html = EXCLUDED.rendered_html,
+          content_hash = EXCLUDED.content_hash,
           is_active = TRUE,
           updated_at = now()
-        """), [
-            {"key": "privacy", "locale": LOCALE, "title": "Política de Privacidade", "version": VERSION, "content_md": PRIVACY_MD},
-            {"key": "fees",    "locale": LOCALE, "title": "Regras de Taxas",          "version": VERSION, "content_md": FEES_MD},
-            {"key": "terms",   "locale": LOCALE, "title": "Termos de Uso",             "version": VERSION, "content_md": TERMS_MD},
-        ])
+        """), docs)
+
+        # Invalida o cache de documentos legais dos workers
+        conn.execute(text("""
+        INSERT INTO cache_versions (name, version, updated_at) VALUES ('legal_docs', 1, now())
+        ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1, updated_at = now()
+        """))
 
     print("✅ Tabelas criadas/atualizadas e legal docs seed aplicados.")
 
@@ -0,0 +1,73 @@
+"""
+Expurgo das tabelas de tokens e trilhas de auditoria (ver app/retention.py).
+
+Uso:
+    python scripts/purge_expired.py [--dry-run] [--policy email_verifications ...]
+                                    [--batch 500] [--max-seconds 300] [--create-indexes]
+
+``--create-indexes`` cria (CONCURRENTLY, sem travar escrita) os índices das colunas
+de corte em bancos antigos; rode uma vez antes do primeiro expurgo.
+Sai com código 2 se outra rodada já estiver em andamento.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.retention import (  # noqa: E402
+    BATCH_SIZE,
+    MAX_RUN_SECONDS,
+    count_expired,
+    default_policies,
+    ensure_indexes,
+    run_retention,
+)
+
+
+def main():
+    policies = default_policies()
+    names = [p.name for p in policies]
+
+    parser = argparse.ArgumentParser(description="Expurgo de dados expirados")
+    parser.add_argument("--policy", action="append", choices=names, help="restringe a estas políticas (repetível)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="linhas por lote/transação")
+    parser.add_argument("--max-seconds", type=float, default=MAX_RUN_SECONDS, help="orçamento da rodada (0 = sem limite)")
+    parser.add_argument("--dry-run", action="store_true", help="só conta o que seria removido")
+    parser.add_argument("--create-indexes", action="store_true", help="cria os índices das colunas de corte antes")
+    args = parser.parse_args()
+
+    if args.policy:
+        policies = [p for p in policies if p.name in args.policy]
+
+    app = create_app(role="script")
+    with app.app_context():
+        if args.create_indexes:
+            started = time.perf_counter()
+            ensure_indexes(policies)
+            print(f">> Índices conferidos em {time.perf_counter() - started:.1f}s")
+
+        if args.dry_run:
+            for p in policies:
+                if not p.enabled:
+                    print(f"   {p.name:<22} desligada")
+                    continue
+                print(f"   {p.name:<22} {count_expired(p):>10} linha(s) (> {p.days} dia(s) em {p.column})")
+            return
+
+        started = time.perf_counter()
+        results = run_retention(policies, batch_size=max(args.batch, 1), max_seconds=args.max_seconds)
+        if results is None:
+            print("!! Outra rodada de retenção está em andamento")
+            sys.exit(2)
+        for r in results:
+            stopped = f"  (parou: {r.stopped})" if r.stopped else ""
+            print(f"   {r.policy:<22} {r.deleted:>10} removida(s) {r.batches:>5} lote(s) {r.seconds:>7.2f}s{stopped}")
+        total = sum(r.deleted for r in results)
+        print(f">> Concluído em {time.perf_counter() - started:.1f}s: {total} linha(s) removida(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# backend/webhook_dispatcher.py
+"""
+Dispatcher dos webhooks para o admin-backend (tabela webhook_outbox).
+
+Uso:
+    python /app/webhook_dispatcher.py
+
+Variáveis:
+    WEBHOOK_DISPATCH_POLL_SECONDS   intervalo de polling com a fila vazia (padrão 2)
+    WEBHOOK_DISPATCH_THREADS        entregas simultâneas no total (padrão 8)
+    ADMIN_WEBHOOK_MAX_CONCURRENCY   entregas simultâneas por endpoint (padrão 4)
+    ADMIN_WEBHOOK_BATCH_MAX         eventos por POST em <endpoint>/batch (padrão 1 = sem lote)
+"""
+import os
+import signal
+import threading
+
+from app import create_app
+from app.extensions import logger
+from app.outbox import run_worker_loop
+from app.webhook_queue import drain_webhook_outbox
+
+POLL_SECONDS = float(os.getenv("WEBHOOK_DISPATCH_POLL_SECONDS", "2"))
+
+
+def main():
+    app = create_app(role="worker")
+    stop = threading.Event()
+
+    def _shutdown(signum, _frame):
+        logger.info("Sinal %s recebido; encerrando webhook dispatcher...", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    print(">> Webhook dispatcher iniciado")
+    run_worker_loop(app, drain_webhook_outbox, poll_interval=POLL_SECONDS, stop=stop, name="admin-webhook")
+
+
+if __name__ == "__main__":
+    main()